@@ -0,0 +1,198 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from typing import Iterable, List, Optional, Sequence, Tuple
+import pytz
+
+from app.freetime import FreeGaps
+
+# Planning engine: free time (computed by the vectorized kernel in app.freetime) is
+# kept in epoch minutes, so locating the first gap that fits a request is a bisect
+# plus a tree lookup instead of a rescan of the day's busy list, and a whole batch
+# is allocated earliest-due-first.
+
+@dataclass
+class SlotRequest:
+    key: str          # Notion page id
+    title: str        # full event title
+    minutes: int
+    due: datetime
+    seq: int = 0      # position among the page's subtasks
+
+@dataclass
+class Placement:
+    request: SlotRequest
+    start: datetime
+    end: datetime
+    overflow: bool = False
+
+def to_min(dt: datetime) -> int:
+    return int(dt.timestamp() // 60)
+
+def from_min(m: int, tz) -> datetime:
+    return datetime.fromtimestamp(m * 60, tz)
+
+class _MaxTree:
+    """Max segment tree over gap lengths: point updates and 'first index >= lo with value >= need' in O(log n)."""
+    def __init__(self, values: List[int]):
+        self.size = 1
+        while self.size < max(1, len(values)):
+            self.size *= 2
+        self.t = [-1] * (2 * self.size)
+        self.t[self.size:self.size + len(values)] = values
+        for i in range(self.size - 1, 0, -1):
+            self.t[i] = max(self.t[2 * i], self.t[2 * i + 1])
+
+    def update(self, i: int, value: int) -> None:
+        i += self.size
+        self.t[i] = value
+        while i > 1:
+            i //= 2
+            self.t[i] = max(self.t[2 * i], self.t[2 * i + 1])
+
+    def first_at_least(self, lo: int, need: int, node: int = 1, l: int = 0, r: int = -1) -> int:
+        if r < 0:
+            r = self.size
+        if r <= lo or self.t[node] < need:
+            return -1
+        if r - l == 1:
+            return l
+        m = (l + r) // 2
+        found = self.first_at_least(lo, need, 2 * node, l, m)
+        return found if found >= 0 else self.first_at_least(lo, need, 2 * node + 1, m, r)
+
+class FreeTime:
+    """
+    Free time in epoch minutes. The gaps from the kernel are fixed slots (sorted,
+    disjoint, located by bisect); reservations cut each slot into smaller pieces, and
+    a max tree over each slot's longest piece finds the first slot that can still
+    hold a request without walking every fragment in between.
+    """
+    def __init__(self, starts: List[int], ends: List[int], buffer_min: int = 5):
+        self.buffer_min = buffer_min
+        self.forced: dict[int, int] = {}  # forced day start -> next minute, so forced blocks stack instead of overlapping
+        self._slot_starts: List[int] = []
+        self._slot_ends: List[int] = []
+        self._pieces: List[List[Tuple[int, int]]] = []
+        self._add_slots(starts, ends)
+
+    def _add_slots(self, starts: Iterable[int], ends: Iterable[int]) -> None:
+        for s, e in zip(starts, ends):
+            self._slot_starts.append(s)
+            self._slot_ends.append(e)
+            self._pieces.append([(s, e)])
+        self._tree = _MaxTree([self._longest(i) for i in range(len(self._pieces))])
+
+    def _longest(self, i: int) -> int:
+        return max((e - s for s, e in self._pieces[i]), default=-1)
+
+    @classmethod
+    def from_busy(cls, busy: Iterable[Tuple[datetime, datetime]], start: datetime, end: datetime,
+                  work_start: time, work_end: time, tzname: str, buffer_min: int = 5) -> "FreeTime":
+        # a buffer is kept after each busy block, not before it
+        gaps = FreeGaps.build(busy, start, end, work_start, work_end, tzname, buffer_min)
+        return cls(gaps.starts.tolist(), gaps.ends.tolist(), buffer_min)
+
+    @property
+    def starts(self) -> List[int]:
+        return [s for pieces in self._pieces for s, _ in pieces]
+
+    @property
+    def ends(self) -> List[int]:
+        return [e for pieces in self._pieces for _, e in pieces]
+
+    def extend(self, later: "FreeTime") -> None:
+        """Append free time computed for a later horizon (every gap in `later` starts after ours end)."""
+        self._add_slots(later.starts, later.ends)
+
+    def _candidates(self, earliest: int, latest: int):
+        # first slot that ends after `earliest`; everything before it is useless
+        for i in range(bisect_right(self._slot_ends, earliest), len(self._pieces)):
+            if self._slot_starts[i] >= latest:
+                return
+            for s, e in self._pieces[i]:
+                if s >= latest:
+                    return
+                yield max(s, earliest), min(e, latest)
+
+    def first_fit(self, need: int, earliest: int, latest: int) -> Optional[int]:
+        i = bisect_right(self._slot_ends, earliest)
+        if i >= len(self._pieces):
+            return None
+        # only the slot holding `earliest` can be clipped by it; check its pieces directly
+        for s, e in self._pieces[i]:
+            s = max(s, earliest)
+            if s + need > latest:
+                return None
+            if e - s >= need:
+                return s
+        # every later slot starts after `earliest`: the first whose longest piece fits wins
+        j = self._tree.first_at_least(i + 1, need)
+        if j < 0 or j >= len(self._pieces):
+            return None
+        s = next(s for s, e in self._pieces[j] if e - s >= need)
+        return s if s + need <= latest else None
+
+    def best_fit(self, need: int, earliest: int, latest: int) -> Optional[int]:
+        best, best_slack = None, None
+        for s, e in self._candidates(earliest, latest):
+            slack = e - s - need
+            if slack >= 0 and (best_slack is None or slack < best_slack):
+                best, best_slack = s, slack
+                if slack == 0:
+                    break
+        return best
+
+    def reserve(self, start: int, end: int) -> None:
+        """Remove [start, end + buffer) from free time."""
+        end += self.buffer_min
+        for i in range(bisect_right(self._slot_ends, start), bisect_left(self._slot_starts, end)):
+            kept = []
+            for s, e in self._pieces[i]:
+                if e <= start or s >= end:
+                    kept.append((s, e))
+                    continue
+                if s < start:
+                    kept.append((s, start))
+                if e > end:
+                    kept.append((end, e))
+            self._pieces[i] = kept
+            self._tree.update(i, self._longest(i))
+
+def allocate(requests: Sequence[SlotRequest], free: FreeTime, now: datetime, horizon_end: datetime,
+             work_start: time, tzname: str, strategy: str = "first") -> List[Placement]:
+    """
+    Place every request earliest-due-first. A request that can't finish by its due
+    time overflows into the first free gap after due; if there is none before the
+    horizon, it is forced onto the start of the workday after due (as before).
+    Calling it again on the same FreeTime continues where the last batch left off.
+    """
+    tz = pytz.timezone(tzname)
+    fit = free.best_fit if strategy == "best" else free.first_fit
+    earliest = -(-int(now.timestamp()) // 60)
+    horizon = to_min(horizon_end)
+    out: List[Placement] = []
+    forced = free.forced
+    for req in sorted(requests, key=lambda r: (r.due, r.key, r.seq)):
+        due = to_min(req.due)
+        overflow = False
+        start = fit(req.minutes, earliest, due)
+        if start is None:
+            overflow = True
+            start = free.first_fit(req.minutes, due, horizon)
+        if start is None:
+            day_after = req.due.astimezone(tz) + timedelta(days=1)
+            day_start = to_min(tz.localize(datetime.combine(day_after.date(), work_start)))
+            start = forced.get(day_start, day_start)
+            forced[day_start] = start + req.minutes + free.buffer_min
+        free.reserve(start, start + req.minutes)
+        out.append(Placement(req, from_min(start, tz), from_min(start + req.minutes, tz), overflow))
+    return out
+
+def horizon_for(dues: Iterable[datetime], work_start: time, work_end: time, tzname: str,
+                slack: timedelta = timedelta(days=7)) -> datetime:
+    """End of the planning horizon: the latest due plus room for overflow."""
+    tz = pytz.timezone(tzname)
+    last = max(dues).astimezone(tz) + slack
+    return tz.localize(datetime.combine(last.date(), work_end))
@@ -1,7 +1,7 @@
 from __future__ import annotations
 import os
-import base64, json
-from dataclasses import dataclass
+import base64, json, socket, uuid
+from dataclasses import dataclass, replace
 from datetime import time
 
 def _parse_time(s: str) -> time:
@@ -13,6 +13,7 @@ class Config:
     notion_token: str
     notion_db_id: str
     gcal_id: str
+    block_calendar_ids: tuple[str, ...]  # calendars whose busy time blocks scheduling (includes gcal_id)
     tz: str
     work_start: time
     work_end: time
@@ -22,16 +23,39 @@ class Config:
     token_file: str | None
     oauth_client_json: dict | None
     token_json: dict | None
+    io_workers: int
+    page_concurrency: int
+    plan_concurrency: int
+    notion_sync: str
+    full_sync_interval_sec: int
+    trace_runs: bool
+    notion_write_behind: bool
+    replan: bool
+    push_mode: bool
+    reconcile_interval_sec: int
+    push_debounce_sec: float
+    public_base_url: str | None
+    notion_webhook_secret: str | None
+    gcal_channel_token: str | None
+    multi_tenant: bool
+    tenant_workers: int
+    lease_ttl_sec: int
+    replica_id: str
+    run_history: int
+    tenant_id: str | None = None  # set on configs built from a tenant record
 
 def load_config() -> Config:
     client_b64 = os.getenv("GOOGLE_OAUTH_CLIENT_B64")
     token_b64 = os.getenv("GOOGLE_TOKEN_B64")
     client_json = json.loads(base64.b64decode(client_b64)) if client_b64 else None
     token_json = json.loads(base64.b64decode(token_b64)) if token_b64 else None
+    gcal_id = os.getenv("GOOGLE_CALENDAR_ID","primary")
+    blocking = [c.strip() for c in os.getenv("BLOCKING_CALENDAR_IDS","").split(",") if c.strip()]
     return Config(
         notion_token=os.getenv("NOTION_TOKEN",""),
         notion_db_id=os.getenv("NOTION_DATABASE_ID",""),
-        gcal_id=os.getenv("GOOGLE_CALENDAR_ID","primary"),
+        gcal_id=gcal_id,
+        block_calendar_ids=tuple(dict.fromkeys([gcal_id, *blocking])),
         tz=os.getenv("TIMEZONE","America/Los_Angeles"),
         work_start=_parse_time(os.getenv("WORK_START","09:00")),
         work_end=_parse_time(os.getenv("WORK_END","18:00")),
@@ -41,4 +65,52 @@ def load_config() -> Config:
         token_file=os.getenv("GOOGLE_TOKEN_FILE"),
         oauth_client_json=client_json,
         token_json=token_json,
+        io_workers=int(os.getenv("IO_WORKERS","8")),
+        page_concurrency=int(os.getenv("PAGE_CONCURRENCY","4")),
+        plan_concurrency=int(os.getenv("PLAN_CONCURRENCY","8")),
+        notion_sync=os.getenv("NOTION_SYNC","incremental"),  # "incremental" | "full"
+        full_sync_interval_sec=int(os.getenv("FULL_SYNC_INTERVAL_SEC","3600")),
+        trace_runs=os.getenv("TRACE_RUNS","0").lower() in ("1","true","yes"),
+        notion_write_behind=os.getenv("NOTION_WRITE_BEHIND","1").lower() in ("1","true","yes"),
+        replan=os.getenv("REPLAN","1").lower() in ("1","true","yes"),
+        push_mode=os.getenv("PUSH_MODE","0").lower() in ("1","true","yes"),
+        reconcile_interval_sec=int(os.getenv("RECONCILE_INTERVAL_SEC","1800")),
+        push_debounce_sec=float(os.getenv("PUSH_DEBOUNCE_SEC","2")),
+        public_base_url=os.getenv("PUBLIC_BASE_URL") or None,  # where Google can reach /webhooks/gcal
+        notion_webhook_secret=os.getenv("NOTION_WEBHOOK_SECRET") or None,  # the subscription's verification_token
+        gcal_channel_token=os.getenv("GCAL_CHANNEL_TOKEN") or None,
+        multi_tenant=os.getenv("MULTI_TENANT","0").lower() in ("1","true","yes"),
+        tenant_workers=int(os.getenv("TENANT_WORKERS","8")),
+        lease_ttl_sec=int(os.getenv("LEASE_TTL_SEC","120")),
+        replica_id=os.getenv("REPLICA_ID") or _REPLICA_ID,
+        run_history=int(os.getenv("RUN_HISTORY","500")),  # finished runs kept for GET /runs/{id}
+    )
+
+# stable for the life of the process, unique across replicas
+_REPLICA_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def config_for_tenant(tenant, base: Config | None = None) -> Config:
+    """
+    Per-tenant Config: Notion/Calendar/credentials/work hours from the record, the rest
+    from the environment. Raises ValueError if the record's credentials can't be unsealed.
+    """
+    from app.services.storage import unseal
+    base = base or load_config()
+    oauth_client_json, token_json = unseal(tenant.oauth_client_json), unseal(tenant.token_json)
+    blocking = json.loads(tenant.block_calendar_ids) if tenant.block_calendar_ids else []
+    return replace(
+        base,
+        tenant_id=tenant.id,
+        notion_token=unseal(tenant.notion_token),
+        notion_db_id=tenant.notion_db_id,
+        gcal_id=tenant.gcal_id,
+        block_calendar_ids=tuple(dict.fromkeys([tenant.gcal_id, *blocking])),
+        tz=tenant.tz or base.tz,
+        work_start=_parse_time(tenant.work_start) if tenant.work_start else base.work_start,
+        work_end=_parse_time(tenant.work_end) if tenant.work_end else base.work_end,
+        oauth_client_json=json.loads(oauth_client_json) if oauth_client_json else base.oauth_client_json,
+        oauth_client_file=None if oauth_client_json else base.oauth_client_file,
+        token_json=json.loads(token_json) if token_json else None,
+        token_file=None,  # never fall back to the deployment's own Google account
+        push_mode=False,
     )
@@ -0,0 +1,81 @@
+from __future__ import annotations
+from datetime import datetime, time, timedelta
+from typing import Iterable, Optional, Tuple
+import numpy as np
+import pytz
+
+# Vectorized free-time kernel. All times are int64 epoch minutes, so a multi-week
+# horizon is a handful of array ops instead of per-day datetime arithmetic.
+
+def epoch_minutes(times: Iterable[datetime], ceil: bool = False) -> np.ndarray:
+    secs = np.fromiter((t.timestamp() for t in times), dtype=np.float64)
+    return (np.ceil(secs / 60) if ceil else np.floor(secs / 60)).astype(np.int64)
+
+def work_windows(start: datetime, end: datetime, work_start: time, work_end: time,
+                 tzname: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Daily [work_start, work_end) windows covering start..end as epoch-minute arrays.
+    Local wall-clock minutes are computed for all days at once; only the UTC offset
+    is looked up per day, so windows stay at 09:00 local across DST transitions.
+    """
+    tz = pytz.timezone(tzname)
+    first = start.astimezone(tz).date()
+    last = end.astimezone(tz).date()
+    if last < first:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    days = np.arange(np.datetime64(first), np.datetime64(last) + 1).astype(np.int64)  # days since epoch
+    # the offset at local noon is the one in force for the whole working day
+    offsets = np.fromiter(
+        (tz.utcoffset(datetime(1970, 1, 1) + timedelta(days=int(d), hours=12)).total_seconds() // 60 for d in days),
+        dtype=np.int64, count=len(days),
+    )
+    ws = days * 1440 + (work_start.hour * 60 + work_start.minute) - offsets
+    we = days * 1440 + (work_end.hour * 60 + work_end.minute) - offsets
+    keep = we > ws
+    return ws[keep], we[keep]
+
+def free_gaps(win_starts: np.ndarray, win_ends: np.ndarray,
+              busy_starts: np.ndarray, busy_ends: np.ndarray,
+              buffer_min: int = 5, not_before: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Subtract busy intervals (each extended by `buffer_min` after its end) from the
+    work windows in one sweep: sort every boundary, accumulate window/busy depth,
+    and keep the segments inside a window and outside any busy block.
+    """
+    times = np.concatenate([win_starts, win_ends, busy_starts, busy_ends + buffer_min])
+    n_w, n_b = len(win_starts), len(busy_starts)
+    w_delta = np.concatenate([np.ones(n_w), -np.ones(n_w), np.zeros(2 * n_b)])
+    b_delta = np.concatenate([np.zeros(2 * n_w), np.ones(n_b), -np.ones(n_b)])
+    points, inv = np.unique(times, return_inverse=True)
+    if len(points) < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    depth_w = np.cumsum(np.bincount(inv, weights=w_delta, minlength=len(points)))
+    depth_b = np.cumsum(np.bincount(inv, weights=b_delta, minlength=len(points)))
+    free = (depth_w[:-1] > 0) & (depth_b[:-1] <= 0)
+    # merge runs of adjacent free segments
+    edges = np.diff(np.concatenate([[False], free, [False]]).astype(np.int8))
+    starts = points[:-1][edges[:-1] == 1]
+    ends = points[1:][edges[1:] == -1]
+    if not_before is not None:
+        starts = np.maximum(starts, not_before)
+        keep = ends > starts
+        starts, ends = starts[keep], ends[keep]
+    return starts.astype(np.int64), ends.astype(np.int64)
+
+class FreeGaps:
+    """Free gaps for a horizon as sorted epoch-minute arrays (app.allocator.FreeTime books into them)."""
+    def __init__(self, starts: np.ndarray, ends: np.ndarray):
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def build(cls, busy: Iterable[Tuple[datetime, datetime]], start: datetime, end: datetime,
+              work_start: time, work_end: time, tzname: str, buffer_min: int = 5) -> "FreeGaps":
+        busy = list(busy)
+        ws, we = work_windows(start, end, work_start, work_end, tzname)
+        bs = epoch_minutes((s for s, _ in busy))
+        be = epoch_minutes((e for _, e in busy), ceil=True)
+        lo = int(epoch_minutes([start], ceil=True)[0])
+        return cls(*free_gaps(ws, we, bs, be, buffer_min, not_before=lo))
@@ -0,0 +1,181 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import re
+import pytz
+
+# Just enough iCalendar for busy-time snapshots and plan exports: VEVENT start/end
+# (UTC, TZID, floating or all-day), DURATION, TRANSP/STATUS, EXDATE, and RRULE with
+# FREQ=DAILY/WEEKLY/MONTHLY/YEARLY, INTERVAL, COUNT, UNTIL and plain BYDAY codes.
+
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+_DURATION = re.compile(r"([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+def _unfold(text: str) -> Iterator[str]:
+    line = None
+    for raw in text.splitlines():
+        if raw[:1] in (" ", "\t") and line is not None:
+            line += raw[1:]
+            continue
+        if line is not None:
+            yield line
+        line = raw
+    if line is not None:
+        yield line
+
+def _split(line: str) -> Tuple[str, Dict[str, str], str]:
+    """'DTSTART;TZID=Europe/Paris:20250101T090000' -> ('DTSTART', {'TZID': 'Europe/Paris'}, '2025...')."""
+    head, _, value = line.partition(":")
+    name, *params = head.split(";")
+    return name.upper(), dict(p.split("=", 1) for p in params if "=" in p), value
+
+def _tz(name: Optional[str], default) -> pytz.BaseTzInfo:
+    try:
+        return pytz.timezone(name.strip('"')) if name else default
+    except pytz.UnknownTimeZoneError:  # e.g. Windows zone names from Outlook exports
+        return default
+
+def parse_time(value: str, params: Dict[str, str], default_tz) -> Tuple[datetime, bool]:
+    """(aware datetime, is_all_day) for a DTSTART/DTEND/EXDATE value."""
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        d = datetime.strptime(value[:8], "%Y%m%d")
+        return _tz(params.get("TZID"), default_tz).localize(d), True
+    if value.endswith("Z"):
+        return pytz.utc.localize(datetime.strptime(value[:-1], "%Y%m%dT%H%M%S")), False
+    return _tz(params.get("TZID"), default_tz).localize(datetime.strptime(value[:15], "%Y%m%dT%H%M%S")), False
+
+def parse_duration(value: str) -> timedelta:
+    m = _DURATION.match(value.strip())
+    if not m:
+        raise ValueError(f"bad DURATION {value!r}")
+    sign, w, d, h, mi, s = m.groups()
+    td = timedelta(weeks=int(w or 0), days=int(d or 0), hours=int(h or 0), minutes=int(mi or 0), seconds=int(s or 0))
+    return -td if sign == "-" else td
+
+def _add_months(d: datetime, months: int) -> Optional[datetime]:
+    y, m = divmod(d.month - 1 + months, 12)
+    try:
+        return d.replace(year=d.year + y, month=m + 1)
+    except ValueError:  # e.g. the 31st in a 30-day month: RFC 5545 skips it
+        return None
+
+def _occurrences(start: datetime, rule: Dict[str, str], tz) -> Iterator[datetime]:
+    """Recurrence starts in local wall-clock time (so 09:00 stays 09:00 across DST), unbounded."""
+    local = start.astimezone(tz).replace(tzinfo=None)
+    freq = rule.get("FREQ", "DAILY")
+    interval = max(1, int(rule.get("INTERVAL", "1")))
+    days = [WEEKDAYS[c[-2:]] for c in rule.get("BYDAY", "").split(",") if c[-2:] in WEEKDAYS]
+    k = 0
+    while True:
+        if freq == "WEEKLY":
+            week = local - timedelta(days=local.weekday()) + timedelta(weeks=k * interval)
+            for wd in sorted(days or [local.weekday()]):
+                t = week + timedelta(days=wd)
+                if t >= local:
+                    yield tz.localize(t)
+        elif freq == "DAILY":
+            t = local + timedelta(days=k * interval)
+            if not days or t.weekday() in days:
+                yield tz.localize(t)
+        elif freq in ("MONTHLY", "YEARLY"):
+            t = _add_months(local, k * interval * (12 if freq == "YEARLY" else 1))
+            if t is not None:
+                yield tz.localize(t)
+        else:
+            yield start
+            return
+        k += 1
+
+def _expand(start: datetime, end: datetime, rule: Dict[str, str], exdates: set,
+            window_start: datetime, window_end: datetime, tz) -> Iterator[Tuple[datetime, datetime]]:
+    duration = end - start
+    count = int(rule["COUNT"]) if "COUNT" in rule else None
+    until = parse_time(rule["UNTIL"], {}, tz)[0] if "UNTIL" in rule else None
+    n = 0
+    for s in _occurrences(start, rule, tz):
+        if (count is not None and n >= count) or (until is not None and s > until) or s >= window_end:
+            return
+        n += 1
+        if s in exdates:
+            continue
+        if s + duration > window_start:
+            yield s, s + duration
+
+def parse_busy(text: str, tzname: str, window_start: datetime, window_end: datetime) -> List[Tuple[datetime, datetime]]:
+    """Busy intervals (aware) from an ICS snapshot, recurring events expanded over the window."""
+    default_tz = pytz.timezone(tzname)
+    out: List[Tuple[datetime, datetime]] = []
+    ev: Optional[dict] = None
+    for line in _unfold(text):
+        name, params, value = _split(line)
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            ev = {"exdates": set()}
+        elif ev is None:
+            continue
+        elif name == "END" and value.upper() == "VEVENT":
+            out.extend(_event_busy(ev, default_tz, window_start, window_end))
+            ev = None
+        elif name in ("DTSTART", "DTEND"):
+            ev[name] = parse_time(value, params, default_tz)
+        elif name == "DURATION":
+            ev["DURATION"] = parse_duration(value)
+        elif name == "RRULE":
+            ev["RRULE"] = dict(p.split("=", 1) for p in value.split(";") if "=" in p)
+        elif name == "EXDATE":
+            ev["exdates"].update(parse_time(v, params, default_tz)[0] for v in value.split(",") if v)
+        elif name in ("TRANSP", "STATUS"):
+            ev[name] = value.strip().upper()
+    return out
+
+def _event_busy(ev: dict, tz, window_start: datetime, window_end: datetime) -> Iterable[Tuple[datetime, datetime]]:
+    if "DTSTART" not in ev or ev.get("TRANSP") == "TRANSPARENT" or ev.get("STATUS") == "CANCELLED":
+        return []
+    start, all_day = ev["DTSTART"]
+    if "DTEND" in ev:
+        end = ev["DTEND"][0]
+    else:
+        end = start + ev.get("DURATION", timedelta(days=1) if all_day else timedelta(0))
+    if end <= start:
+        return []
+    if "RRULE" in ev:
+        # expand in the event's own zone so its wall-clock time holds across DST
+        zone = getattr(start.tzinfo, "zone", None)
+        return _expand(start, end, ev["RRULE"], ev["exdates"], window_start, window_end,
+                       pytz.timezone(zone) if zone else tz)
+    return [(start, end)] if start < window_end and end > window_start else []
+
+# --------- writing ---------
+def escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def fold(line: str) -> str:
+    """RFC 5545 line folding at 75 octets, never inside a UTF-8 character."""
+    if len(line.encode()) <= 75:
+        return line
+    parts, cur, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode())
+        if size + n > (75 if not parts else 74):  # continuation lines carry a leading space
+            parts.append(cur)
+            cur, size = "", 0
+        cur += ch
+        size += n
+    parts.append(cur)
+    return "\r\n ".join(parts)
+
+def utc_stamp(dt: datetime) -> str:
+    return dt.astimezone(pytz.utc).strftime("%Y%m%dT%H%M%SZ")
+
+def vevent(uid: str, title: str, start: datetime, end: datetime, description: str = "",
+           stamp: Optional[datetime] = None) -> str:
+    # a fixed DTSTAMP (e.g. the simulation's start) keeps exports byte-for-byte reproducible
+    lines = ["BEGIN:VEVENT", f"UID:{uid}", f"DTSTAMP:{utc_stamp(stamp or datetime.now(pytz.utc))}",
+             f"DTSTART:{utc_stamp(start)}", f"DTEND:{utc_stamp(end)}", f"SUMMARY:{escape(title)}"]
+    if description:
+        lines.append(f"DESCRIPTION:{escape(description)}")
+    lines.append("END:VEVENT")
+    return "".join(fold(l) + "\r\n" for l in lines)
+
+CALENDAR_HEADER = "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//task-to-calendar-agent//simulator//EN\r\n"
+CALENDAR_FOOTER = "END:VCALENDAR\r\n"
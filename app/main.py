@@ -3,19 +3,33 @@ from __future__ import annotations
 from datetime import datetime, timedelta
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 
 from app.scheduler import start_scheduler, run_once
 from app.config import load_config
 from app.services.gcal import build_service, create_event
+from app.services.executor import run_blocking, configure_pools, shutdown_io_pool
+from app.services.outbox import drain_all
+from app.services.storage import get_run
+from app.runs import coordinator_for, close_coordinators
+from app.tenants import close_pool
+from app.push import get_trigger, stop_trigger, verify_notion_signature, notion_page_ids, calendar_for_channel, PUSH_EVENTS
+from app import metrics
+import json, logging
 import pytz
 from datetime import datetime, timedelta, timezone
 
+log = logging.getLogger("main")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Load .env and start background scheduler when the app starts
     load_dotenv()
+    # size the worker pools before any handler or job submits to it
+    cfg = load_config()
+    configure_pools(cfg.io_workers, cfg.plan_concurrency)
     scheduler = start_scheduler()
     try:
         yield
@@ -26,6 +40,12 @@ async def lifespan(app: FastAPI):
                 scheduler.shutdown(wait=False)
             except Exception:
                 pass
+        await stop_trigger()
+        await close_coordinators(timeout=10)  # finish the in-flight run; a queued one is marked cancelled
+        await close_pool()  # let running tenant cycles finish, then hand their leases back
+        # Flush queued Notion updates; whatever is left stays in the outbox for the next start
+        await drain_all(timeout=10)
+        shutdown_io_pool()
 
 app = FastAPI(
     title="Notion → Google Calendar Scheduler",
@@ -36,27 +56,139 @@ app = FastAPI(
 async def healthz():
     return {"ok": True}
 
-@app.post("/trigger")
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+async def traces():
+    """Span lists of the most recent cycles (only recorded with TRACE_RUNS=1)."""
+    return list(metrics.RECENT_TRACES)
+
+@app.post("/trigger", status_code=202)
 async def trigger():
+    """Queue a cycle, or join the one already queued; poll GET /runs/{run_id} for progress."""
+    if load_config().multi_tenant:
+        # tenants are polled by whichever replica holds their lease; a run here would use the .env setup
+        raise HTTPException(status_code=409, detail="manual runs are not available with MULTI_TENANT=1")
+    run_id, joined = await coordinator_for().submit("trigger")
+    return {"run_id": run_id, "status": "joined" if joined else "queued", "url": f"/runs/{run_id}"}
+
+
+def _iso(dt: datetime | None) -> str | None:
+    return dt.replace(tzinfo=timezone.utc).isoformat() if dt else None
+
+@app.get("/runs/{run_id}")
+async def run_status(run_id: str):
+    run, pages = await run_blocking(get_run, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="unknown run")
+    return {
+        "run_id": run.id, "status": run.status, "source": run.source, "requests": run.requests,
+        "created_at": _iso(run.created_at), "started_at": _iso(run.started_at), "finished_at": _iso(run.finished_at),
+        "pages_fetched": run.pages_fetched, "pages_done": run.pages_done, "events_created": run.events_created,
+        "skipped": run.skipped, "error": run.error,
+        "pages": [{"page_id": p.page_id, "title": p.title, "events": json.loads(p.event_ids or "[]"),
+                   "errors": json.loads(p.errors) if p.errors else None, "recovered": p.recovered} for p in pages],
+    }
+
+
+@app.post("/webhooks/notion")
+async def notion_webhook(request: Request):
+    """Notion webhook subscription endpoint: schedule the pages the event touches."""
+    cfg = load_config()
+    if not cfg.push_mode:
+        raise HTTPException(status_code=404, detail="push mode is off")
+    body = await request.body()
+    # check the signature on the raw bytes before parsing anything an unknown sender posted
+    if cfg.notion_webhook_secret and not verify_notion_signature(
+            body, request.headers.get("X-Notion-Signature"), cfg.notion_webhook_secret):
+        PUSH_EVENTS.inc(source="notion", outcome="bad_signature")
+        raise HTTPException(status_code=401, detail="bad signature")
     try:
-        result = await run_once()  # make run_once() return a dict summary
-        return {"status": "ok", **(result or {})}
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        PUSH_EVENTS.inc(source="notion", outcome="bad_request")
+        raise HTTPException(status_code=400, detail="body must be a JSON object")
+    if "verification_token" in payload:
+        # one-time handshake (sent before NOTION_WEBHOOK_SECRET can be set): paste this
+        # token into the Notion UI and NOTION_WEBHOOK_SECRET
+        log.warning("Notion webhook verification_token: %s", payload["verification_token"])
+        return {"ok": True}
+    page_ids = notion_page_ids(payload, cfg.notion_db_id)
+    PUSH_EVENTS.inc(source="notion", outcome="queued" if page_ids else "ignored")
+    if page_ids:
+        get_trigger(cfg).pages_changed(page_ids)
+    return {"ok": True, "pages": page_ids}
+
+
+@app.post("/webhooks/gcal")
+async def gcal_webhook(request: Request):
+    """Calendar events.watch notifications (headers only, no body)."""
+    cfg = load_config()
+    if not cfg.push_mode:
+        raise HTTPException(status_code=404, detail="push mode is off")
+    headers = request.headers
+    if cfg.gcal_channel_token and headers.get("X-Goog-Channel-Token") != cfg.gcal_channel_token:
+        PUSH_EVENTS.inc(source="gcal", outcome="bad_token")
+        raise HTTPException(status_code=401, detail="bad channel token")
+    state = headers.get("X-Goog-Resource-State")
+    calendar_id = await run_blocking(calendar_for_channel, cfg, headers.get("X-Goog-Channel-ID", ""))
+    if state == "sync" or calendar_id is None:
+        # "sync" confirms a new channel; unknown ids are channels we already replaced
+        PUSH_EVENTS.inc(source="gcal", outcome="ignored")
+        return Response(status_code=200)
+    PUSH_EVENTS.inc(source="gcal", outcome="queued")
+    get_trigger(cfg).calendars_changed([calendar_id])
+    return Response(status_code=200)
+
+
+@app.get("/plan")
+async def plan():
+    """Dry run: what the next poll would book, without creating events or touching Notion."""
+    try:
+        return await run_once(dry_run=True)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/simulate")
+async def simulate_plan(request: Request):
+    """
+    What-if placement of a Notion export around an ICS busy snapshot; nothing is written.
+    Body: {"pages": [...] or {"results": [...]}, "busy_ics": "...", "format": "jsonl"|"ics", "start": ISO}
+    """
+    from app.simulate import simulate, load_pages, iter_jsonl, iter_ics
+    from dateutil import parser as dtparser
+    body = await request.json()
+    cfg = load_config()
+    try:
+        start = dtparser.isoparse(body["start"]) if body.get("start") else None
+        if start is not None and start.tzinfo is None:
+            start = pytz.timezone(cfg.tz).localize(start)
+        sim = await run_blocking(simulate, load_pages(body.get("pages", [])), body.get("busy_ics"), cfg, start,
+                                 bool(body.get("include_planned")))
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if body.get("format") == "ics":
+        return StreamingResponse(iter_ics(sim), media_type="text/calendar")
+    return StreamingResponse(iter_jsonl(sim), media_type="application/x-ndjson")
+
+
 @app.post("/test-event")
 async def test_event():
     try:
         cfg = load_config()
-        service = build_service(
-            cfg.oauth_client_file, cfg.token_file, cfg.oauth_client_json, cfg.token_json
+        service = await run_blocking(
+            build_service, cfg.oauth_client_file, cfg.token_file, cfg.oauth_client_json, cfg.token_json
         )
         tz = pytz.timezone(cfg.tz)
         start_local = tz.localize(datetime.now() + timedelta(minutes=5))
         end_local = start_local + timedelta(minutes=10)
-        eid = create_event(service, cfg.gcal_id, "MVP Test Event", start_local, end_local,
-                        "Created by /test-event", tz=cfg.tz)
+        eid = await run_blocking(create_event, service, cfg.gcal_id, "MVP Test Event", start_local, end_local,
+                                 "Created by /test-event", tz=cfg.tz)
         return {"event_id": eid, "start": start_local.isoformat(), "end": end_local.isoformat()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
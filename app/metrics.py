@@ -0,0 +1,146 @@
+from __future__ import annotations
+import contextvars, threading, time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Minimal in-process metrics with Prometheus text exposition (served at /metrics),
+# plus optional per-run trace spans. No client library needed.
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        k = _key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return super().render() + [f"{self.name}{_fmt_labels(k)} {v}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_key(labels)] = float(value)
+
+class Histogram(_Metric):
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = buckets
+        self._values: Dict[LabelKey, List[float]] = {}  # per-bucket counts + [sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        k = _key(labels)
+        with self._lock:
+            row = self._values.setdefault(k, [0.0] * (len(self.buckets) + 2))
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = super().render()
+        for k, row in items:
+            for b, n in zip(self.buckets, row):
+                out.append(f"{self.name}_bucket{_fmt_labels(k, (('le', repr(b)),))} {n}")
+            out.append(f"{self.name}_bucket{_fmt_labels(k, (('le', '+Inf'),))} {row[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(k)} {row[-2]}")
+            out.append(f"{self.name}_count{_fmt_labels(k)} {row[-1]}")
+        return out
+
+REGISTRY: List[_Metric] = []
+
+UPSTREAM_SECONDS = Histogram("upstream_request_seconds", "Latency of calls to Notion, Google Calendar and Gemini")
+UPSTREAM_CALLS = Counter("upstream_requests_total", "Calls to external APIs")
+UPSTREAM_ERRORS = Counter("upstream_errors_total", "Failed calls to external APIs")
+PLANNER_FALLBACKS = Counter("planner_fallback_total", "Breakdowns that fell back to heuristics")
+PLAN_CACHE = Counter("plan_cache_total", "Plan cache lookups by result")
+CYCLE_SECONDS = Histogram("poll_cycle_seconds", "Wall time of one run_once cycle")
+CYCLES = Counter("poll_cycles_total", "run_once cycles by outcome")
+BACKLOG = Gauge("poll_backlog_pages", "Unplanned pages fetched in the last cycle")
+EVENTS_CREATED = Counter("poll_events_created_total", "Calendar events created by the poller")
+PIPELINE_QUEUE = Gauge("pipeline_queue_depth", "Items waiting in front of each run_once pipeline stage")
+
+def render() -> str:
+    return "\n".join(line for m in REGISTRY for line in m.render()) + "\n"
+
+# --------- Trace spans ---------
+_trace: contextvars.ContextVar[Optional[List[dict]]] = contextvars.ContextVar("trace", default=None)
+_trace_t0: contextvars.ContextVar[float] = contextvars.ContextVar("trace_t0", default=0.0)
+RECENT_TRACES: deque = deque(maxlen=20)
+
+@contextmanager
+def trace_run() -> Iterator[List[dict]]:
+    """Collect spans from this task (and the threads/tasks it spawns) into a list."""
+    spans: List[dict] = []
+    tok, tok0 = _trace.set(spans), _trace_t0.set(time.perf_counter())
+    try:
+        yield spans
+    finally:
+        _trace.reset(tok)
+        _trace_t0.reset(tok0)
+        RECENT_TRACES.append(spans)
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[None]:
+    spans = _trace.get()
+    if spans is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append({"name": name, "start_ms": round((start - _trace_t0.get()) * 1000, 2),
+                      "duration_ms": round((time.perf_counter() - start) * 1000, 2), **attrs})
+
+@contextmanager
+def observe(upstream: str, op: str) -> Iterator[None]:
+    """Time one external call: latency histogram, call/error counters and a trace span."""
+    start = time.perf_counter()
+    try:
+        with span(f"{upstream}.{op}"):
+            yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(upstream=upstream, op=op)
+        raise
+    finally:
+        UPSTREAM_CALLS.inc(upstream=upstream, op=op)
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, upstream=upstream, op=op)
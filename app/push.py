@@ -0,0 +1,172 @@
+from __future__ import annotations
+import asyncio, hashlib, hmac, json, logging, time, uuid, weakref
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.config import Config, load_config
+from app.services.executor import run_blocking
+from app.services.gcal import build_service, watch_events, stop_channel, WATCH_TTL_SEC
+from app.services.storage import get_state, set_state
+from app.metrics import Counter
+
+# Push mode: Notion webhooks and Calendar watch notifications feed a debounced trigger
+# that runs the cycle for just the pages that changed. The interval job drops to a
+# slow reconciliation poll that also keeps the Calendar watch channels alive.
+
+log = logging.getLogger("push")
+
+PUSH_EVENTS = Counter("push_notifications_total", "Webhook/watch notifications received by source and outcome")
+
+# --------- Notion webhooks ---------
+def verify_notion_signature(body: bytes, signature: Optional[str], secret: str) -> bool:
+    """X-Notion-Signature is "sha256=" + HMAC-SHA256(body) keyed by the subscription's verification_token."""
+    if not signature:
+        return False
+    expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+def notion_page_ids(payload: Dict[str, Any], database_id: str) -> List[str]:
+    """Page ids a webhook event touches; events for other databases (or non-pages) are ignored."""
+    entity = payload.get("entity") or {}
+    if entity.get("type") != "page" or not str(payload.get("type", "")).startswith("page."):
+        return []
+    parent = ((payload.get("data") or {}).get("parent") or {}).get("id")
+    if parent and database_id and parent.replace("-", "") != database_id.replace("-", ""):
+        return []
+    return [entity["id"]] if entity.get("id") else []
+
+# --------- Debounced trigger ---------
+class PushTrigger:
+    """
+    Collects changed page ids and calendar ids, waits `debounce` seconds so bursts
+    collapse into one run, then runs the cycle for those pages only. Changes that
+    arrive while a run is in flight are picked up by the next round.
+    """
+    def __init__(self, debounce: float, run_pages: Callable[[List[str]], Awaitable[Any]],
+                 on_calendars: Optional[Callable[[List[str]], Awaitable[Any]]] = None):
+        self.debounce = debounce
+        self.run_pages = run_pages
+        self.on_calendars = on_calendars
+        self._pages: set[str] = set()
+        self._calendars: set[str] = set()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def pages_changed(self, page_ids: Iterable[str]) -> None:
+        self._pages.update(page_ids)
+        self._kick()
+
+    def calendars_changed(self, calendar_ids: Iterable[str]) -> None:
+        self._calendars.update(calendar_ids)
+        self._kick()
+
+    def _kick(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="push-trigger")
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.debounce)
+            self._wake.clear()
+            pages, self._pages = sorted(self._pages), set()
+            calendars, self._calendars = sorted(self._calendars), set()
+            try:
+                if pages:
+                    await self.run_pages(pages)
+                if calendars:
+                    if self.on_calendars is not None:
+                        await self.on_calendars(calendars)
+                    else:
+                        log.debug("Calendars changed: %s", calendars)
+            except Exception:
+                log.exception("Push-triggered run failed for pages=%s calendars=%s", pages, calendars)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+_triggers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, PushTrigger] = weakref.WeakKeyDictionary()
+
+def get_trigger(cfg: Config | None = None) -> PushTrigger:
+    """The running loop's trigger, wired to run_once(page_ids=...)."""
+    loop = asyncio.get_running_loop()
+    trigger = _triggers.get(loop)
+    if trigger is None:
+        from app.scheduler import run_once
+        from app.replan import replan
+        cfg = cfg or load_config()
+        trigger = _triggers[loop] = PushTrigger(
+            cfg.push_debounce_sec, lambda ids: run_once(page_ids=ids),
+            (lambda ids: replan(calendar_ids=ids)) if cfg.replan else None,
+        )
+    return trigger
+
+async def stop_trigger() -> None:
+    trigger = _triggers.pop(asyncio.get_running_loop(), None)
+    if trigger is not None:
+        await trigger.stop()
+
+# --------- Calendar watch channels ---------
+def _channel_key(calendar_id: str) -> str:
+    return f"gcal_channel:{calendar_id}"
+
+def load_channels(calendar_ids: Iterable[str]) -> Dict[str, dict]:
+    """calendar_id -> stored channel ({"id", "resourceId", "expiration"})."""
+    out = {}
+    for cid in calendar_ids:
+        raw = get_state(_channel_key(cid))
+        if raw:
+            out[cid] = json.loads(raw)
+    return out
+
+def calendar_for_channel(cfg: Config, channel_id: str) -> Optional[str]:
+    for cid, ch in load_channels(cfg.block_calendar_ids).items():
+        if ch["id"] == channel_id:
+            return cid
+    return None
+
+def ensure_watches(cfg: Config, service=None) -> Dict[str, dict]:
+    """
+    Open a watch channel for every blocking calendar that has none, or whose channel
+    expires before the next reconciliation could renew it; the old one is stopped.
+    """
+    if not cfg.public_base_url:
+        log.warning("PUSH_MODE is on but PUBLIC_BASE_URL is unset; Calendar changes won't be pushed")
+        return {}
+    service = service or build_service(cfg.oauth_client_file, cfg.token_file, cfg.oauth_client_json, cfg.token_json)
+    address = cfg.public_base_url.rstrip("/") + "/webhooks/gcal"
+    renew_before_ms = (time.time() + 2 * cfg.reconcile_interval_sec + 3600) * 1000
+    channels = load_channels(cfg.block_calendar_ids)
+    for cid in cfg.block_calendar_ids:
+        old = channels.get(cid)
+        if old and old["expiration"] > renew_before_ms:
+            continue
+        try:
+            ch = watch_events(service, cid, uuid.uuid4().hex, address, cfg.gcal_channel_token, WATCH_TTL_SEC)
+        except Exception as e:
+            log.warning("Could not watch calendar %s: %s", cid, e)
+            continue
+        set_state(_channel_key(cid), json.dumps(ch))
+        channels[cid] = ch
+        if old:
+            try:
+                stop_channel(service, old["id"], old["resourceId"])
+            except Exception as e:
+                log.info("Stopping expired channel %s failed: %s", old["id"], e)
+    return channels
+
+async def reconcile(cfg: Config | None = None) -> dict:
+    """Low-frequency fallback in push mode: renew watch channels, catch up on calendar changes, then a normal cycle."""
+    from app.scheduler import run_once
+    from app.replan import replan
+    cfg = cfg or load_config()
+    await run_blocking(ensure_watches, cfg)
+    if cfg.replan:
+        await replan(cfg)
+    return await run_once(cfg=cfg)
@@ -0,0 +1,167 @@
+from __future__ import annotations
+import asyncio, logging
+from datetime import datetime, timedelta, time
+from typing import List, Optional, Sequence, Tuple
+
+import pytz
+from dateutil import parser as dtparser
+
+from app.config import Config, load_config
+from app.allocator import SlotRequest, FreeTime, allocate, horizon_for
+from app.scheduler import _cycle_lock, _parse_due
+from app.services.executor import run_blocking
+from app.services.gcal import (build_service, freebusy, list_changes, patch_event, is_ours, merge_intervals,
+                               subtract_intervals, SyncTokenExpired)
+from app.services.storage import (get_state, set_state, ledger_events, events_overlapping, record_move,
+                                  mark_deleted, load_items, booked_between)
+from app.services.ratelimit import is_retryable
+from app.metrics import span, Counter
+
+# Incremental re-planning: pull only the events that changed on the blocking calendars
+# (events.list with a stored syncToken), find blocks of ours that a new or moved meeting
+# now overlaps, and re-time just those blocks with events.patch. Blocks of ours that were
+# deleted are marked so in the ledger, which stops counting their time as busy.
+# The new syncTokens are stored only once every displaced block has moved; until then
+# the next run pulls the same changes again and retries the blocks that didn't.
+
+log = logging.getLogger("replan")
+
+BLOCKS_MOVED = Counter("replan_blocks_moved_total", "Booked blocks re-timed by outcome")
+
+def _sync_key(calendar_id: str) -> str:
+    return f"gcal_sync:{calendar_id}"
+
+def pull_changes(service, calendar_id: str, now: datetime) -> Tuple[List[dict], str]:
+    """
+    Events changed since the stored token, plus the next token. A missing or expired
+    token falls back to a full listing from now. Nothing is stored: pass the token to
+    save_sync_tokens once the changes are handled.
+    """
+    token = get_state(_sync_key(calendar_id))
+    try:
+        return list_changes(service, calendar_id, token, time_min=now)
+    except SyncTokenExpired:
+        log.info("Sync token for %s expired; doing a full sync", calendar_id)
+        return list_changes(service, calendar_id, None, time_min=now)
+
+def save_sync_tokens(calendar_ids: Sequence[str], tokens: Sequence[str]) -> None:
+    for cid, token in zip(calendar_ids, tokens):
+        set_state(_sync_key(cid), token)
+
+def _event_time(when: dict, tz) -> Optional[datetime]:
+    if "dateTime" in when:
+        return dtparser.isoparse(when["dateTime"])
+    if "date" in when:
+        return tz.localize(datetime.combine(dtparser.isoparse(when["date"]).date(), time()))
+    return None
+
+def _interval(event: dict, tz) -> Optional[Tuple[datetime, datetime]]:
+    s, e = _event_time(event.get("start", {}), tz), _event_time(event.get("end", {}), tz)
+    return (s, e) if s and e and e > s else None
+
+def _same_minute(a: datetime, b: datetime) -> bool:
+    return int(a.timestamp() // 60) == int(b.timestamp() // 60)
+
+async def replan(cfg: Config | None = None, service=None, calendar_ids: Sequence[str] | None = None) -> dict:
+    """Move our blocks off meetings that appeared since the last sync; returns what moved."""
+    cfg = cfg or load_config()
+    if service is None:
+        service = await run_blocking(build_service, cfg.oauth_client_file, cfg.token_file,
+                                     cfg.oauth_client_json, cfg.token_json)
+    async with _cycle_lock(cfg):
+        return await _replan(cfg, service, list(calendar_ids or cfg.block_calendar_ids))
+
+async def _replan(cfg: Config, service, calendar_ids: List[str]) -> dict:
+    tz = pytz.timezone(cfg.tz)
+    now = datetime.now(tz)
+
+    with span("replan.pull", calendars=len(calendar_ids)):
+        deltas = await asyncio.gather(*(run_blocking(pull_changes, service, cid, now) for cid in calendar_ids))
+    changed = [ev for items, _ in deltas for ev in items]
+    tokens = [token for _, token in deltas]
+    known = await run_blocking(ledger_events, [ev["id"] for ev in changed])
+
+    foreign: List[Tuple[datetime, datetime]] = []
+    cancelled: List[str] = []
+    user_moves = 0
+    for ev in changed:
+        if ev.get("status") == "cancelled":
+            if ev["id"] in known:
+                cancelled.append(ev["id"])  # one of our blocks was deleted: its time is free again
+            continue
+        interval = _interval(ev, tz)
+        if interval is None:
+            continue
+        mine = known.get(ev["id"])
+        if mine is not None or is_ours(ev):
+            # the user dragged one of our blocks: keep the ledger in step, don't fight it
+            if mine is not None and not (_same_minute(interval[0], mine.start.replace(tzinfo=pytz.utc))
+                                         and _same_minute(interval[1], mine.end.replace(tzinfo=pytz.utc))):
+                await run_blocking(record_move, ev["id"], interval[0], interval[1], "user")
+                user_moves += 1
+            continue
+        if ev.get("transparency") == "transparent" or interval[1] <= now:
+            continue
+        foreign.append(interval)
+
+    deleted = await run_blocking(mark_deleted, cancelled)
+
+    displaced = [ev for ev in await run_blocking(events_overlapping, cfg.gcal_id, foreign)
+                 if ev.start.replace(tzinfo=pytz.utc) > now]  # leave blocks already under way
+    result = {"changed": len(changed), "user_moves": user_moves, "deleted": deleted, "moved": [], "errors": []}
+    if not displaced:
+        await run_blocking(save_sync_tokens, calendar_ids, tokens)
+        return result
+
+    items = await run_blocking(load_items, {ev.page_id for ev in displaced})
+    dues = {pid: _parse_due(it.due, tz) if it.due else now + timedelta(days=7) for pid, it in items.items()}
+    requests, by_request = [], {}
+    for seq, ev in enumerate(displaced):
+        start, end = ev.start.replace(tzinfo=pytz.utc), ev.end.replace(tzinfo=pytz.utc)
+        req = SlotRequest(ev.page_id, ev.title, int((end - start).total_seconds() // 60),
+                          dues.get(ev.page_id, now + timedelta(days=7)), seq)
+        requests.append(req)
+        by_request[(req.key, seq)] = ev
+
+    horizon_end = horizon_for([r.due for r in requests], cfg.work_start, cfg.work_end, cfg.tz)
+    busy, booked = await asyncio.gather(
+        run_blocking(freebusy, service, cfg.block_calendar_ids, now, horizon_end, tz=cfg.tz),
+        run_blocking(booked_between, cfg.gcal_id, now, horizon_end),
+    )
+    # the displaced blocks are about to move, so their time is free again, except where
+    # the colliding meetings sit (subtracting a block also cut the meeting out of the merge)
+    moving = [(ev.start.replace(tzinfo=pytz.utc), ev.end.replace(tzinfo=pytz.utc)) for ev in displaced]
+    busy = merge_intervals(subtract_intervals(merge_intervals(busy + booked), moving) + foreign)
+
+    with span("replan.allocate", blocks=len(requests)):
+        free = FreeTime.from_busy(busy, now, horizon_end, cfg.work_start, cfg.work_end, cfg.tz)
+        placements = allocate(requests, free, now, horizon_end, cfg.work_start, cfg.tz)
+
+    limit = asyncio.Semaphore(cfg.page_concurrency)
+    retry_later = False
+
+    async def move(p) -> None:
+        nonlocal retry_later
+        ev = by_request[(p.request.key, p.request.seq)]
+        async with limit:
+            try:
+                await run_blocking(patch_event, service, cfg.gcal_id, ev.event_id, p.start, p.end, cfg.tz)
+            except Exception as e:
+                log.warning("Moving event %s failed: %s", ev.event_id, e)
+                BLOCKS_MOVED.inc(outcome="error")
+                result["errors"].append({"event_id": ev.event_id, "error": str(e)})
+                # a rejected patch (say the block is gone) won't go better next time; anything else might
+                retry_later = retry_later or is_retryable(e)
+                return
+            await run_blocking(record_move, ev.event_id, p.start, p.end, "collision")
+            BLOCKS_MOVED.inc(outcome="overflow" if p.overflow else "ok")
+            result["moved"].append({"event_id": ev.event_id, "page_id": ev.page_id, "title": ev.title,
+                                    "from": ev.start.replace(tzinfo=pytz.utc).isoformat(),
+                                    "to": p.start.isoformat(), "overflow": p.overflow})
+
+    await asyncio.gather(*(move(p) for p in placements))
+    if retry_later:
+        log.warning("Keeping the old sync tokens so %d unmoved blocks are retried", len(result["errors"]))
+    else:
+        await run_blocking(save_sync_tokens, calendar_ids, tokens)
+    return result
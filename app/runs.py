@@ -0,0 +1,136 @@
+from __future__ import annotations
+import asyncio, logging, uuid, weakref
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import Config, load_config
+from app.services.executor import run_blocking
+from app.services.storage import create_run, join_run, start_run, add_run_pages, finish_run, prune_runs
+from app.metrics import Counter
+
+# Manual /trigger calls and the poll job go through one coordinator per tenant and event
+# loop. At most one run is in flight with at most one queued behind it; requests that
+# arrive while a run is queued join it, so a burst of N triggers costs one extra cycle.
+# Runs and their per-page results are persisted (runs / run_pages) for GET /runs/{id}.
+
+log = logging.getLogger("runs")
+
+RUN_REQUESTS = Counter("run_requests_total", "Run requests by source and whether they joined a queued run")
+
+Runner = Callable[[Config, Callable[[List[dict]], Awaitable[None]]], Awaitable[dict]]
+
+async def _run_cycle(cfg: Config, progress) -> dict:
+    from app.scheduler import run_once
+    return await run_once(cfg=cfg, progress=progress)
+
+class RunCoordinator:
+    """Coalesces run requests for one tenant into a single in-flight run plus one queued run."""
+    def __init__(self, cfg: Config, runner: Runner = _run_cycle):
+        self.cfg = cfg
+        self.runner = runner
+        self.queued: str | None = None   # accepting joins until it starts
+        self.current: str | None = None
+        self._lock = asyncio.Lock()
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._task: asyncio.Task | None = None
+
+    async def submit(self, source: str = "trigger") -> Tuple[str, bool]:
+        """Queue a run, or join the one already queued; returns (run_id, joined)."""
+        async with self._lock:  # the row exists before anyone can join or start it
+            joined = self.queued is not None
+            if joined:
+                run_id = self.queued
+                await run_blocking(join_run, run_id)
+            else:
+                run_id = uuid.uuid4().hex
+                await run_blocking(create_run, run_id, source, self.cfg.tenant_id)
+                self.queued = run_id
+        RUN_REQUESTS.inc(source=source, joined=str(joined).lower())
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="run-coordinator")
+        return run_id, joined
+
+    async def run(self, source: str = "poll") -> dict:
+        """Submit and wait for the run's result (the poll job, which keeps its max_instances=1)."""
+        run_id, _ = await self.submit(source)
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(run_id, []).append(fut)
+        return await fut
+
+    async def _loop(self) -> None:
+        while self.queued is not None:
+            run_id, self.queued = self.queued, None
+            self.current = run_id
+            try:
+                result, error = await self._execute(run_id), None
+            except asyncio.CancelledError:
+                self._resolve(run_id, None, RuntimeError("run cancelled at shutdown"))
+                raise
+            except Exception as e:
+                result, error = None, e
+            finally:
+                self.current = None
+            self._resolve(run_id, result, error)
+
+    def _resolve(self, run_id: str, result: Optional[dict], error: Optional[BaseException]) -> None:
+        for fut in self._waiters.pop(run_id, []):
+            if fut.done():
+                continue
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
+
+    async def _execute(self, run_id: str) -> dict:
+        await run_blocking(start_run, run_id)
+
+        async def progress(results: List[dict]) -> None:
+            await run_blocking(add_run_pages, run_id, results)
+
+        try:
+            result = await self.runner(self.cfg, progress)
+        except asyncio.CancelledError:
+            await asyncio.shield(run_blocking(finish_run, run_id, "cancelled"))
+            raise
+        except Exception as e:
+            log.exception("Run %s failed", run_id)
+            await run_blocking(finish_run, run_id, "error", error=str(e))
+            raise
+        await run_blocking(finish_run, run_id, "ok", result.get("pages_fetched"), result.get("skipped"))
+        await run_blocking(prune_runs, self.cfg.run_history)
+        return result
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Cancel the queued run, give the in-flight one `timeout` seconds, then cancel it."""
+        async with self._lock:
+            if self.queued is not None:
+                run_id, self.queued = self.queued, None
+                await run_blocking(finish_run, run_id, "cancelled")
+                self._resolve(run_id, None, RuntimeError("run cancelled at shutdown"))
+        if self._task is not None and not self._task.done():
+            done, _ = await asyncio.wait([self._task], timeout=timeout)
+            if not done:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+
+_coordinators: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, RunCoordinator]] = weakref.WeakKeyDictionary()
+
+def coordinator_for(cfg: Config | None = None) -> RunCoordinator:
+    """The running loop's coordinator for cfg's tenant (the .env setup when cfg is None)."""
+    per_loop = _coordinators.setdefault(asyncio.get_running_loop(), {})
+    key = (cfg.tenant_id or "") if cfg is not None else ""
+    coordinator = per_loop.get(key)
+    if coordinator is None:
+        coordinator = per_loop[key] = RunCoordinator(cfg or load_config())
+    return coordinator
+
+async def poll() -> dict:
+    """APScheduler job: the regular cycle, joining a manually triggered run if one is queued."""
+    return await coordinator_for().run("poll")
+
+async def close_coordinators(timeout: float = 10.0) -> None:
+    for coordinator in list(_coordinators.pop(asyncio.get_running_loop(), {}).values()):
+        await coordinator.close(timeout)
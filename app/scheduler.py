@@ -1,128 +1,465 @@
 from __future__ import annotations
+import asyncio
+from contextlib import nullcontext
 from datetime import datetime, timedelta, time
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import heapq, logging, weakref
+import time as _time
+from typing import TYPE_CHECKING
 import pytz
 
-from app.config import load_config
-from app.services.notion import NotionTasks
-from app.services.planner import breakdown
-from app.services.gcal import build_service, freebusy, create_event
-from app.services.storage import make_session, Item, Event
+from app.config import Config, load_config
+from app.services.executor import run_blocking
+from app.services.notion import AsyncNotionTasks
+from app.services.outbox import writer_for
+from app.services.planner import abreakdown
+from app.services.storage import (get_state, set_state, load_items, page_event_ids, booked_seqs, pending_events,
+                                  booked_between, begin_booking, settle_booking, mark_synced)
+from app.services.gcal import (build_service, freebusy, create_events, existing_events, new_event_id, EventSlot,
+                               merge_intervals, BATCH_LIMIT)
+from app.services.ratelimit import is_retryable
+from app.metrics import trace_run, span, CYCLES, CYCLE_SECONDS, BACKLOG, EVENTS_CREATED, PIPELINE_QUEUE
+
+if TYPE_CHECKING:
+    from app.allocator import Placement, FreeTime
 
 from dateutil import parser as dtparser
 
-def within_workday(dt: datetime, start: time, end: time, tzname: str) -> tuple[datetime, datetime]:
-    tz = pytz.timezone(tzname)
-    # ensure dt is tz-aware in your local tz
-    if dt.tzinfo is None:
-        local = tz.localize(dt)
-    else:
-        local = dt.astimezone(tz)
-    day_start = local.replace(hour=start.hour, minute=start.minute, second=0, microsecond=0)
-    day_end   = local.replace(hour=end.hour, minute=end.minute, second=0, microsecond=0)
-    return day_start, day_end
-
-def find_gap(busy, day_start, day_end, minutes, buffer_min=5):
-    cur = day_start
-    need = timedelta(minutes=minutes)
-    buf = timedelta(minutes=buffer_min)
-    for b_start, b_end in busy:
-        if b_end <= cur:
-            continue
-        if b_start - cur >= need:
-            return cur, cur + need
-        cur = max(cur, b_end + buf)
-        if cur >= day_end:
-            return None
-    if day_end - cur >= need:
-        return cur, cur + need
-    return None
-
-async def run_once():
-    cfg = load_config()
-    tz = pytz.timezone(cfg.tz)
+log = logging.getLogger("scheduler")
 
-    notion = NotionTasks(cfg.notion_token, cfg.notion_db_id)
-    service = build_service(cfg.oauth_client_file, cfg.token_file, cfg.oauth_client_json, cfg.token_json)
-    session = make_session()
+def _parse_due(due_iso: str, tz) -> datetime:
+    # Parse due; if Notion gives naive date, localize it
+    due = dtparser.isoparse(due_iso)
+    if due.tzinfo is None:
+        return tz.localize(due)
+    return due.astimezone(tz)
 
-    pages = notion.fetch_new()
-    created_total = 0
-    processed = []
+def _notes(notion, page) -> str | None:
+    try:
+        return notion.notes_of(page)
+    except Exception:
+        return None
 
-    # cursor starts NOW in your local tz
-    cursor = datetime.now(tz)
+def _ledger_state(item, edited: str | None) -> str:
+    """
+    "done": we booked and synced this page and it hasn't been edited since, so the
+    query result is stale; "recover": events exist but Notion was never updated;
+    "resume": an earlier booking created only some of the events, so book the rest;
+    "new": plan it (first time, or the user cleared Planned? after we synced).
+    """
+    if item is None:
+        return "new"
+    if not item.planned:
+        return "resume"
+    if not item.synced:
+        return "recover"
+    if edited and item.synced_at and dtparser.isoparse(edited) <= item.synced_at.replace(tzinfo=pytz.utc):
+        return "done"
+    return "new"
 
-    for page in pages:
-        page_id = page["id"]
-        title = notion.title_of(page)
-        due_iso = notion.due_of(page)
-        if not due_iso:
-            continue
+def _sync_window(cfg, now: datetime) -> tuple[str | None, bool]:
+    """Return (since, is_full) for this poll: incremental from the watermark, or a periodic full pass."""
+    if cfg.notion_sync != "incremental":
+        return None, True
+    last_full = get_state(f"notion_full_sync:{cfg.notion_db_id}")
+    if not last_full or now - datetime.fromisoformat(last_full) >= timedelta(seconds=cfg.full_sync_interval_sec):
+        return None, True
+    return get_state(f"notion_watermark:{cfg.notion_db_id}"), False
 
-        # Parse due; if Notion gives naive date, localize it
-        due = dtparser.isoparse(due_iso)
-        if due.tzinfo is None:
-            due = tz.localize(due)
-        else:
-            due = due.astimezone(tz)
+def _save_watermark(cfg, now: datetime, is_full: bool, seen: str | None, failed: str | None, since: str | None) -> None:
+    # Never move past a page that still needs another attempt
+    watermark = failed or seen or since
+    if watermark:
+        set_state(f"notion_watermark:{cfg.notion_db_id}", watermark)
+    if is_full and cfg.notion_sync == "incremental":
+        set_state(f"notion_full_sync:{cfg.notion_db_id}", now.isoformat())
 
-        notes = None
+# Cycles that book events for the same tenant must not overlap (poll job, push trigger and /trigger share these)
+_cycle_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Lock]]" = weakref.WeakKeyDictionary()
+
+def _cycle_lock(cfg: Config) -> asyncio.Lock:
+    per_loop = _cycle_locks.setdefault(asyncio.get_running_loop(), {})
+    return per_loop.setdefault(cfg.tenant_id or "", asyncio.Lock())
+
+class CycleAborted(RuntimeError):
+    """The cycle's guard said no: stop before writing anything more (e.g. the tenant lease was lost)."""
+
+async def run_once(dry_run: bool = False, *, page_ids: list[str] | None = None,
+                   cfg: Config | None = None, notion=None, service=None, progress=None, guard=None):
+    """
+    One poll: stream unplanned pages from Notion through the plan/allocate/commit
+    pipeline (see _run_cycle); subtasks are allocated earliest-due-first across the whole poll.
+    With dry_run=True the plan is returned and nothing is written anywhere.
+    page_ids limits the cycle to those pages (push mode) instead of querying the database.
+    cfg/notion/service default to the environment's; pass stand-ins to run offline.
+    progress, if given, is awaited with each batch of per-page results as it is committed.
+    guard, if given, is awaited before each Calendar write; a false answer raises CycleAborted.
+    With TRACE_RUNS=1 the result carries the cycle's trace spans.
+    """
+    cfg = cfg or load_config()
+    start = _time.perf_counter()
+    with (trace_run() if cfg.trace_runs else nullcontext()) as spans:
         try:
-            notes = notion.notes_of(page)
+            async with (nullcontext() if dry_run else _cycle_lock(cfg)):
+                result = await _run_cycle(cfg, dry_run, notion, service, page_ids, progress, guard)
         except Exception:
-            pass
-        subs = breakdown(title, notion.needs_breakdown(page), notion.est_of(page), notes=notes)
-
-        created_ids = []
-
-        for s in subs:
-            # Search day-by-day until due
-            window = cursor
-            scheduled = False
-            while window <= due:
-                day_start, day_end = within_workday(window, cfg.work_start, cfg.work_end, cfg.tz)
-                # Ensure we start no earlier than 'cursor'
-                start_from = max(cursor, day_start)
-
-                # Free/busy in local tz
-                busy = freebusy(service, cfg.gcal_id, day_start, day_end, tz=cfg.tz)
-                gap = find_gap(busy, start_from, day_end, s.minutes)
-
-                if gap:
-                    start, end = gap
-                    eid = create_event(service, cfg.gcal_id, f"{title} — {s.title}", start, end,
-                                       description="Auto-scheduled from Notion", tz=cfg.tz)
-                    created_ids.append(eid)
-                    created_total += 1
-                    cursor = end + timedelta(minutes=5)
-                    scheduled = True
+            CYCLES.inc(outcome="error")
+            raise
+        finally:
+            CYCLE_SECONDS.observe(_time.perf_counter() - start, dry_run=str(dry_run).lower())
+    CYCLES.inc(outcome="dry_run" if dry_run else "ok")
+    BACKLOG.set(result["pages_fetched"])
+    EVENTS_CREATED.inc(result.get("events_created", 0))
+    if spans is not None:
+        result["trace"] = spans
+    return result
+
+ALLOC_BATCH = 64  # most pages the allocator places per call
+PIPELINE_WINDOW = 256  # most pages fetched but not yet placed, so memory doesn't grow with the backlog
+
+class _StageQueue(asyncio.Queue):
+    """Bounded hand-off between two pipeline stages; its depth is exported per stage."""
+    def __init__(self, stage: str, maxsize: int):
+        super().__init__(maxsize)
+        self.stage = stage
+
+    def put_nowait(self, item) -> None:
+        super().put_nowait(item)
+        PIPELINE_QUEUE.set(self.qsize(), stage=self.stage)
+
+    def get_nowait(self):
+        item = super().get_nowait()
+        PIPELINE_QUEUE.set(self.qsize(), stage=self.stage)
+        return item
+
+class _Window:
+    """
+    Free time for one cycle: FreeBusy for every blocking calendar plus our ledger,
+    loaded on first use and extended when a batch brings a later due date.
+    """
+    def __init__(self, cfg: Config, service, now: datetime):
+        self.cfg, self.service, self.now = cfg, service, now
+        self.free: FreeTime | None = None
+        self.end: datetime | None = None
+        self._lock = asyncio.Lock()
+
+    async def _free(self, start: datetime, end: datetime) -> FreeTime:
+        from app.allocator import FreeTime  # NumPy is loaded with the first cycle, not at startup
+        cfg = self.cfg
+        busy, booked = await asyncio.gather(
+            run_blocking(freebusy, self.service, cfg.block_calendar_ids, start, end, tz=cfg.tz),
+            # our own blocks from the ledger, in case FreeBusy hasn't caught up with them yet
+            run_blocking(booked_between, cfg.gcal_id, start, end),
+        )
+        return FreeTime.from_busy(merge_intervals(busy + booked), start, end, cfg.work_start, cfg.work_end, cfg.tz)
+
+    async def cover(self, dues: list[datetime]) -> FreeTime:
+        from app.allocator import horizon_for
+        end = horizon_for(dues, self.cfg.work_start, self.cfg.work_end, self.cfg.tz)
+        async with self._lock:
+            if self.free is None:
+                self.free, self.end = await self._free(self.now, end), end
+            elif end > self.end:
+                self.free.extend(await self._free(self.end, end))
+                self.end = end
+            return self.free
+
+async def _run_stages(*coros) -> None:
+    """Run pipeline stages together; the first failure cancels the rest (so nobody waits on a dead queue)."""
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for t in done:
+            if t.exception() is not None:
+                raise t.exception()
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def _run_cycle(cfg: Config, dry_run: bool, notion, service, page_ids: list[str] | None = None,
+                     progress=None, guard=None) -> dict:
+    """
+    fetch -> plan (plan_concurrency workers) -> allocate (one task, pages released in due order)
+    -> commit (page_concurrency workers, several pages per Calendar batch), joined by
+    bounded queues so a slow stage holds back the ones before it.
+    """
+    tz = pytz.timezone(cfg.tz)
+
+    notion = notion or AsyncNotionTasks(cfg.notion_token, cfg.notion_db_id)
+    if service is None:
+        service = await run_blocking(build_service, cfg.oauth_client_file, cfg.token_file,
+                                     cfg.oauth_client_json, cfg.token_json)
+
+    now = datetime.now(tz)
+    started = datetime.now(pytz.utc)
+    if page_ids is None:
+        since, is_full = await run_blocking(_sync_window, cfg, started)
+        source = notion.iter_new(since)
+    else:
+        # targeted run: nothing was scanned, so the watermark must not move
+        since, is_full = None, False
+        source = notion.iter_pages(page_ids)
+
+    planners = cfg.plan_concurrency
+    committers = 1 if dry_run else cfg.page_concurrency
+    plan_q = _StageQueue("plan", 2 * planners)
+    alloc_q = _StageQueue("allocate", ALLOC_BATCH)
+    commit_q = _StageQueue("commit", 2 * committers)
+    window = _Window(cfg, service, now)
+    writer = writer_for(cfg.notion_token, notion, cfg.tenant_id) if cfg.notion_write_behind and not dry_run else None
+
+    counts = {"pages_fetched": 0, "skipped": 0}
+    seen: str | None = None
+    prefetch: list[asyncio.Task] = []
+    processed: list[dict] = []
+    failed: list[str] = []   # last_edited_time of pages whose booking failed
+    synced: list[str] = []
+    planned_out: list[dict] = []
+    resumed: dict[str, dict[int, str]] = {}  # page_id -> seq -> event_id already booked
+
+    waiting: list[tuple[datetime, str]] = []  # heap of fetched, not yet placed pages by (due, id)
+    window_slots = asyncio.Semaphore(PIPELINE_WINDOW)
+    fetched_ids: set[str] = set()
+
+    async def fetch() -> None:
+        nonlocal seen
+        latest: datetime | None = None
+        with span("stage.fetch"):
+            async for page in source:
+                if page["id"] in fetched_ids:
+                    continue  # re-listed by a later result page (e.g. its due date changed mid-scan)
+                fetched_ids.add(page["id"])
+                counts["pages_fetched"] += 1
+                edited = notion.edited_of(page)
+                if edited and (seen is None or edited > seen):
+                    seen = edited
+                due_iso = notion.due_of(page)
+                if not due_iso:
+                    continue
+                item = (await run_blocking(load_items, [page["id"]])).get(page["id"])
+                state = _ledger_state(item, edited)
+                if state == "done":
+                    counts["skipped"] += 1
+                elif state == "recover":
+                    if not dry_run:  # booked in the ledger, but Notion was never told
+                        await commit_q.put(("recover", page, edited, None))
+                else:
+                    if state == "resume":
+                        resumed[page["id"]] = await resume(page["id"])
+                    due = _parse_due(due_iso, tz)
+                    latest = due if latest is None else max(latest, due)
+                    await window_slots.acquire()  # released once the page is placed
+                    heapq.heappush(waiting, (due, page["id"]))
+                    # breakdown starts as soon as the page is streamed in from Notion
+                    await plan_q.put((page, due, edited))
+        if latest is not None:
+            # every due is known now: load busy time for the whole horizon while the plans finish
+            prefetch.append(asyncio.create_task(window.cover([latest])))
+        for _ in range(planners):
+            await plan_q.put(None)
+
+    async def plan() -> None:
+        while (item := await plan_q.get()) is not None:
+            page, due, edited = item
+            subs = await abreakdown(notion.title_of(page), notion.needs_breakdown(page), notion.est_of(page),
+                                    notes=_notes(notion, page), dry_run=dry_run)
+            await alloc_q.put((page, due, edited, subs))
+        await alloc_q.put(None)
+
+    async def allocate_stage() -> None:
+        # Plans finish in whatever order the LLM returns them, but placement stays
+        # earliest-due-first: a page is placed once every page fetched so far that is due
+        # before it has its plan, or a fast later-due page could take the slot an urgent
+        # one needed. Notion returns pages sorted by due date, so a page fetched later is
+        # seldom due sooner; if one is (its due date was edited mid-scan, or a push run's
+        # page list), it goes after the later-due pages already placed. Waiting for the
+        # whole backlog instead would hold every page back until the last one is fetched.
+        ready: dict[str, tuple] = {}
+        finished = 0
+        while finished < planners:
+            item = await alloc_q.get()
+            while True:
+                if item is None:
+                    finished += 1
+                else:
+                    ready[item[0]["id"]] = item
+                if alloc_q.empty():
                     break
+                item = alloc_q.get_nowait()
+            while waiting and waiting[0][1] in ready:
+                batch = []
+                while waiting and len(batch) < ALLOC_BATCH and waiting[0][1] in ready:
+                    batch.append(ready.pop(heapq.heappop(waiting)[1]))
+                await place(batch)
+                for _ in batch:
+                    window_slots.release()
+        for _ in range(committers):
+            await commit_q.put(None)
 
-                # go to next day
-                window = day_start + timedelta(days=1)
+    async def place(batch: list[tuple]) -> None:
+        from app.allocator import SlotRequest, allocate
+        free = await window.cover([due for _, due, _, _ in batch])
+        requests = []
+        for page, due, _, subs in batch:
+            title = notion.title_of(page)
+            booked = resumed.get(page["id"], {})
+            for seq, s in enumerate(subs):
+                if seq in booked:
+                    continue
+                requests.append(SlotRequest(page["id"], f"{title} — {s.title}", s.minutes, due, seq))
+        with span("allocate", subtasks=len(requests)):
+            placements = allocate(requests, free, now, window.end, cfg.work_start, cfg.tz)
+        by_page: dict[str, list[Placement]] = {}
+        for p in placements:
+            by_page.setdefault(p.request.key, []).append(p)
+        for page, _, edited, _ in batch:
+            slots = sorted(by_page.get(page["id"], []), key=lambda p: p.request.seq)
+            await commit_q.put(("book", page, edited, slots))
 
-            if not scheduled:
-                # overflow: place first slot the day after due
-                day_start, day_end = within_workday(due + timedelta(days=1), cfg.work_start, cfg.work_end, cfg.tz)
-                busy = freebusy(service, cfg.gcal_id, day_start, day_end, tz=cfg.tz)
-                gap = find_gap(busy, day_start, day_end, s.minutes) or (day_start, day_start + timedelta(minutes=s.minutes))
-                start, end = gap
-                eid = create_event(service, cfg.gcal_id, f"⚠️ {title} — {s.title}", start, end,
-                                   description="Auto-scheduled (overflow) from Notion", tz=cfg.tz)
-                created_ids.append(eid)
-                created_total += 1
-                cursor = end + timedelta(minutes=5)
+    async def resume(page_id: str) -> dict[int, str]:
+        if dry_run:
+            return await run_blocking(booked_seqs, page_id, True)
+        unsettled = await run_blocking(pending_events, page_id)
+        if unsettled:
+            # the last run never learned whether these inserts went through: ask the calendar
+            found = await run_blocking(existing_events, service, cfg.gcal_id, unsettled)
+            await run_blocking(settle_booking, page_id, found, [e for e in unsettled if e not in found], False)
+        return await run_blocking(booked_seqs, page_id)
+
+    async def tell_notion(page_id: str, event_ids: list[str]) -> None:
+        if writer is not None:
+            # queued; the outbox flusher marks the item synced once Notion accepts it
+            await writer.enqueue(page_id, notion.planned_properties(event_ids))
+        else:
+            await notion.mark_planned(page_id, event_ids)
+            synced.append(page_id)
 
-        notion.mark_planned(page_id, created_ids)
-        processed.append({"page_id": page_id, "title": title, "events": created_ids})
+    async def resync(page) -> dict:
+        # a previous run created the events but Notion was never told (crash, or update still queued)
+        event_ids = await run_blocking(page_event_ids, page["id"])
+        await tell_notion(page["id"], event_ids)
+        return {"page_id": page["id"], "title": notion.title_of(page), "events": event_ids, "recovered": True}
 
-    return {"pages_fetched": len(pages), "events_created": created_total, "processed": processed}
+    async def book(group: list[tuple]) -> list[dict]:
+        # one Calendar batch round trip for every page in the group
+        placed = [p for _, _, _, placements in group for p in placements]
+        slots = [
+            EventSlot(f"⚠️ {p.request.title}" if p.overflow else p.request.title, p.start, p.end,
+                      "Auto-scheduled (overflow) from Notion" if p.overflow else "Auto-scheduled from Notion",
+                      p.request.key, new_event_id())
+            for p in placed
+        ]
+        spans, lo = [], 0
+        for _, page, edited, placements in group:
+            spans.append((page, edited, lo, lo + len(placements)))
+            lo += len(placements)
+        # Intent first, under the ids the inserts will carry: if we die before hearing back,
+        # the next poll finds these pending rows and asks the calendar what became of them
+        await run_blocking(begin_booking, cfg.gcal_id, [
+            (page["id"], notion.title_of(page), notion.due_of(page), page["id"] in resumed,
+             [(slots[i].event_id, placed[i].request.seq, slots[i].title, slots[i].start, slots[i].end)
+              for i in range(a, b)])
+            for page, _, a, b in spans
+        ])
+        results = await run_blocking(create_events, service, cfg.gcal_id, slots, tz=cfg.tz)
+
+        async def finish(page, edited, a: int, b: int) -> dict:
+            page_id, title = page["id"], notion.title_of(page)
+            created = [(results[i][0], placed[i].request.seq) for i in range(a, b) if results[i][0]]
+            created_ids = [eid for eid, _ in created]
+            errors = [str(results[i][1]) for i in range(a, b) if results[i][1] is not None]
+            # a rejected insert made no event; one that may have landed (5xx, timeout) stays pending
+            rejected = [slots[i].event_id for i in range(a, b)
+                        if results[i][1] is not None and not is_retryable(results[i][1])]
+            # Write-through before touching Notion, so a crash here can't cause duplicate events.
+            # Events that did get created stay: a partial booking is resumed, not redone.
+            await run_blocking(settle_booking, page_id, created_ids, rejected, not errors)
+            if errors:
+                # leave the page unplanned so the next poll books the missing subtasks
+                log.warning("Event insert failed for page %s: %s", page_id, errors)
+                if edited:
+                    failed.append(edited)
+                return {"page_id": page_id, "title": title, "events": created_ids, "errors": errors}
+            by_seq = {**resumed.get(page_id, {}), **{seq: eid for eid, seq in created}}
+            await tell_notion(page_id, [by_seq[seq] for seq in sorted(by_seq)])
+            return {"page_id": page_id, "title": title, "events": created_ids}
+
+        return list(await asyncio.gather(*(finish(page, edited, a, b) for page, edited, a, b in spans)))
+
+    async def commit() -> None:
+        stop = False
+        while not stop:
+            item = await commit_q.get()
+            if item is None:
+                return
+            group, n = [item], len(item[3] or ())
+            while n < BATCH_LIMIT and not commit_q.empty():
+                item = commit_q.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                group.append(item)
+                n += len(item[3] or ())
+            recovers = [page for kind, page, _, _ in group if kind == "recover"]
+            books = [g for g in group if g[0] == "book"]
+            if dry_run:
+                planned_out.extend(
+                    {"page_id": page["id"], "title": notion.title_of(page),
+                     "slots": [{"title": p.request.title, "start": p.start.isoformat(),
+                                "end": p.end.isoformat(), "overflow": p.overflow} for p in placements]}
+                    for _, page, _, placements in books)
+                continue
+            if guard is not None and not await guard():
+                raise CycleAborted(f"guard refused the commit of {len(group)} pages")
+            with span("commit", pages=len(group), events=n):
+                done = list(await asyncio.gather(*(resync(page) for page in recovers)))
+                if books:
+                    done.extend(await book(books))
+            processed.extend(done)
+            if progress is not None:
+                await progress(done)
+
+    try:
+        await _run_stages(fetch(), *(plan() for _ in range(planners)), allocate_stage(),
+                          *(commit() for _ in range(committers)))
+    finally:
+        for t in prefetch:
+            t.cancel()
+
+    if dry_run:
+        return {"dry_run": True, "pages_fetched": counts["pages_fetched"], "plan": planned_out}
+
+    await run_blocking(mark_synced, synced)
+    if page_ids is None:
+        await run_blocking(_save_watermark, cfg, started, is_full, seen, min(failed, default=None), since)
+
+    created_total = sum(len(p["events"]) for p in processed if not p.get("recovered"))
+    return {"pages_fetched": counts["pages_fetched"], "events_created": created_total,
+            "skipped": counts["skipped"], "processed": processed}
 
 
 def start_scheduler():
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
     cfg = load_config()
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(run_once, "interval", seconds=cfg.poll_interval_sec, id="poller", max_instances=1, coalesce=True)
+    if cfg.multi_tenant:
+        # tenants come from the tenants table; leases split them across replicas
+        from app.tenants import tick, heartbeat
+        scheduler.add_job(tick, "interval", seconds=cfg.poll_interval_sec, id="tenants", max_instances=1,
+                          coalesce=True, next_run_time=datetime.now())
+        scheduler.add_job(heartbeat, "interval", seconds=max(1, cfg.lease_ttl_sec // 3), id="heartbeat",
+                          max_instances=1, coalesce=True)
+    elif cfg.push_mode:
+        # webhooks drive scheduling; poll rarely to catch missed notifications and renew watch channels
+        from app.push import reconcile
+        scheduler.add_job(reconcile, "interval", seconds=cfg.reconcile_interval_sec, id="reconcile",
+                          max_instances=1, coalesce=True, next_run_time=datetime.now())
+    else:
+        # through the run coordinator, so a poll and a manual /trigger never run back to back for nothing
+        from app.runs import poll
+        scheduler.add_job(poll, "interval", seconds=cfg.poll_interval_sec, id="poller", max_instances=1, coalesce=True)
+        if cfg.replan:
+            from app.replan import replan
+            scheduler.add_job(replan, "interval", seconds=cfg.poll_interval_sec, id="replan", max_instances=1, coalesce=True)
     scheduler.start()
     return scheduler
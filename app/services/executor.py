@@ -0,0 +1,51 @@
+from __future__ import annotations
+import asyncio, contextvars, logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+# Bounded pools for the blocking SDKs so they never run on the event loop. Gemini calls
+# get a pool of their own: slow LLM calls must not take the threads that FreeBusy,
+# batch inserts and ledger writes need, or committing would wait on planning.
+
+log = logging.getLogger("executor")
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_sizes: Dict[str, int] = {"io": 8, "plan": 8}
+
+def configure_pools(io_workers: int, plan_workers: int | None = None) -> None:
+    """Size the pools from config; call at startup, before anything runs on them."""
+    for name, size in (("io", io_workers), ("plan", plan_workers)):
+        if size is None:
+            continue
+        if name in _pools and size != _sizes[name]:
+            log.warning("%s pool already started with %d workers; %d applies on restart", name, _sizes[name], size)
+            continue
+        _sizes[name] = size
+
+def _pool(name: str) -> ThreadPoolExecutor:
+    pool = _pools.get(name)
+    if pool is None:
+        pool = _pools[name] = ThreadPoolExecutor(max_workers=_sizes[name], thread_name_prefix=name)
+    return pool
+
+def io_pool() -> ThreadPoolExecutor:
+    return _pool("io")
+
+async def _run_in(name: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    # carry contextvars (e.g. the active trace) into the worker thread, like asyncio.to_thread
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_pool(name), ctx.run, partial(fn, *args, **kwargs))
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Calendar, Notion and SQLite calls."""
+    return await _run_in("io", fn, *args, **kwargs)
+
+async def run_planning(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Gemini breakdowns (and their plan-cache reads/writes)."""
+    return await _run_in("plan", fn, *args, **kwargs)
+
+def shutdown_io_pool() -> None:
+    for name in list(_pools):
+        _pools.pop(name).shutdown(wait=False, cancel_futures=True)
@@ -1,17 +1,53 @@
 from __future__ import annotations
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import List, Tuple, Optional
-import os, json
+from functools import lru_cache
+from typing import List, Tuple, Optional, Sequence, TYPE_CHECKING
+import os, json, logging, threading, time, uuid
 
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+from app.metrics import observe
+from app.services.ratelimit import GCAL, for_key, is_retryable, is_throttle
 
 
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+log = logging.getLogger("gcal")
+
+# The Google client libraries are imported where they're first needed, so importing
+# this module (and starting the app) doesn't pay for them.
+
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
+@lru_cache(maxsize=1)
+def _discovery_doc() -> dict | None:
+    """Calendar v3 discovery document bundled with googleapiclient, parsed once per process."""
+    from googleapiclient.discovery_cache import get_static_doc
+    doc = get_static_doc("calendar", "v3")
+    return json.loads(doc) if doc else None
+
+def _build_calendar(http):
+    from googleapiclient.discovery import build, build_from_document
+    doc = _discovery_doc()
+    if doc is None:  # very old googleapiclient without bundled documents
+        return build("calendar", "v3", http=http, cache_discovery=False)
+    return build_from_document(doc, http=http)
+
+class CredentialsUnusable(RuntimeError):
+    """The stored Google token can't be used or refreshed, and there is nowhere to run the browser consent flow."""
+
+def _refresh(creds: Credentials, request) -> None:
+    from google.auth.exceptions import RefreshError
+    try:
+        creds.refresh(request)
+    except RefreshError as e:
+        if getattr(e, "retryable", False):
+            raise
+        raise CredentialsUnusable(f"Google token was rejected: {e}") from e
+
 def _load_creds(oauth_client_file: str | None, token_file: str | None, oauth_client_json: dict | None, token_json: dict | None) -> Credentials:
+    from google.oauth2.credentials import Credentials
+    from google.auth.transport.requests import Request
     creds = None
     if token_json:
         creds = Credentials.from_authorized_user_info(token_json, SCOPES)
@@ -19,8 +55,13 @@ def _load_creds(oauth_client_file: str | None, token_file: str | None, oauth_cli
         creds = Credentials.from_authorized_user_file(token_file, SCOPES)
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+            _refresh(creds, Request())
+        elif not token_file:
+            # The consent flow waits on a local browser forever; without a token file to
+            # save into, this is a headless deployment or a tenant, so fail instead.
+            raise CredentialsUnusable("No usable Google token; authorize again and store a new one")
         else:
+            from google_auth_oauthlib.flow import InstalledAppFlow
             if oauth_client_json:
                 flow = InstalledAppFlow.from_client_config(oauth_client_json, SCOPES)
             elif oauth_client_file:
@@ -34,45 +75,301 @@ def _load_creds(oauth_client_file: str | None, token_file: str | None, oauth_cli
                 f.write(creds.to_json())
     return creds
 
+class CalendarClient:
+    """
+    Long-lived Calendar handle: credentials are loaded once and refreshed ahead of
+    expiry, and every I/O thread keeps its own discovery client over a keep-alive
+    httplib2 connection (httplib2.Http is not thread-safe). It proxies the service
+    resource methods, so it can be passed anywhere a `service` is expected.
+    """
+    REFRESH_MARGIN = timedelta(minutes=5)
+
+    def __init__(self, oauth_client_file: str | None, token_file: str | None,
+                 oauth_client_json: dict | None, token_json: dict | None, limiter=GCAL):
+        self.limiter = limiter  # Calendar quota is per Google account, so each client has its own
+        self._source = (oauth_client_file, token_file, oauth_client_json, token_json)
+        self._token_file = token_file
+        self._creds: Credentials | None = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._refresh_request = None  # one pooled requests.Session for token refreshes, made on first use
+
+    def credentials(self) -> Credentials:
+        with self._lock:
+            if self._creds is None:
+                self._creds = _load_creds(*self._source)
+            elif self._creds.refresh_token and (
+                not self._creds.valid
+                or (self._creds.expiry and self._creds.expiry - datetime.utcnow() < self.REFRESH_MARGIN)
+            ):
+                if self._refresh_request is None:
+                    from google.auth.transport.requests import Request
+                    self._refresh_request = Request()
+                with observe("gcal", "token_refresh"):
+                    _refresh(self._creds, self._refresh_request)
+                if self._token_file:
+                    with open(self._token_file, "w") as f:
+                        f.write(self._creds.to_json())
+            return self._creds
+
+    def service(self):
+        creds = self.credentials()
+        svc = getattr(self._local, "service", None)
+        if svc is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            svc = _build_calendar(AuthorizedHttp(creds, http=httplib2.Http()))
+            self._local.service = svc
+        return svc
+
+    def freebusy(self):
+        return self.service().freebusy()
+
+    def events(self):
+        return self.service().events()
+
+    def channels(self):
+        return self.service().channels()
+
+    def new_batch_http_request(self, *args, **kwargs):
+        return self.service().new_batch_http_request(*args, **kwargs)
+
+_clients: dict[str, CalendarClient] = {}
+_clients_lock = threading.Lock()
+
 def build_service(oauth_client_file: str | None, token_file: str | None, oauth_client_json: dict | None, token_json: dict | None):
-    creds = _load_creds(oauth_client_file, token_file, oauth_client_json, token_json)
-    return build("calendar", "v3", credentials=creds, cache_discovery=False)
+    """Return the process-wide CalendarClient for these credentials, creating it on first use."""
+    key = json.dumps([oauth_client_file, token_file, oauth_client_json, token_json], sort_keys=True)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = CalendarClient(oauth_client_file, token_file, oauth_client_json, token_json,
+                                                    for_key(GCAL, key))
+    client.credentials()
+    return client
 
 from datetime import datetime
 from typing import List, Tuple
 import pytz  # add this import
 
-def freebusy(service, calendar_id: str, start: datetime, end: datetime, tz: str = "UTC") -> List[Tuple[datetime, datetime]]:
+def _limiter(service):
+    # stand-in services without a limiter of their own share the default
+    return getattr(service, "limiter", GCAL)
+
+# FreeBusy accepts at most 50 calendars per query
+FREEBUSY_LIMIT = 50
+
+def merge_intervals(intervals: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    """Sort and coalesce overlapping/touching intervals (O(n log n))."""
+    out: List[Tuple[datetime, datetime]] = []
+    for s, e in sorted(intervals):
+        if out and s <= out[-1][1]:
+            if e > out[-1][1]:
+                out[-1] = (out[-1][0], e)
+        else:
+            out.append((s, e))
+    return out
+
+def subtract_intervals(intervals: List[Tuple[datetime, datetime]],
+                       remove: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    """Parts of the (merged) intervals not covered by any interval in remove."""
+    out: List[Tuple[datetime, datetime]] = []
+    cuts = merge_intervals(remove)
+    for s, e in intervals:
+        for cs, ce in cuts:
+            if ce <= s or cs >= e:
+                continue
+            if cs > s:
+                out.append((s, cs))
+            s = max(s, ce)
+            if s >= e:
+                break
+        if s < e:
+            out.append((s, e))
+    return out
+
+def freebusy(service, calendar_id: str | Sequence[str], start: datetime, end: datetime, tz: str = "UTC") -> List[Tuple[datetime, datetime]]:
+    """
+    Busy periods across one or more calendars, merged into a single sorted,
+    non-overlapping list. Calendars are queried together, FREEBUSY_LIMIT per request.
+    """
     # Ensure start/end are tz-aware
     if start.tzinfo is None or end.tzinfo is None:
         raise ValueError("freebusy requires tz-aware datetimes")
-    body = {
-        "timeMin": start.isoformat(),
-        "timeMax": end.isoformat(),
-        "timeZone": tz,
-        "items": [{"id": calendar_id}],
-    }
-    resp = service.freebusy().query(body=body).execute()
-    periods = resp["calendars"][calendar_id].get("busy", [])
+    ids = [calendar_id] if isinstance(calendar_id, str) else list(dict.fromkeys(calendar_id))
     out = []
     local_tz = pytz.timezone(tz)
-    for p in periods:
-        # Google returns ISO with tz; normalize to local tz for comparisons
-        s = datetime.fromisoformat(p["start"]).astimezone(local_tz)
-        e = datetime.fromisoformat(p["end"]).astimezone(local_tz)
-        out.append((s, e))
-    return out
+    for lo in range(0, len(ids), FREEBUSY_LIMIT):
+        chunk = ids[lo:lo + FREEBUSY_LIMIT]
+        body = {
+            "timeMin": start.isoformat(),
+            "timeMax": end.isoformat(),
+            "timeZone": tz,
+            "items": [{"id": cid} for cid in chunk],
+        }
+        resp = _limiter(service).call("freebusy", service.freebusy().query(body=body).execute)
+        for cid in chunk:
+            cal = resp["calendars"].get(cid, {})
+            if cal.get("errors"):
+                log.warning("FreeBusy errors for calendar %s: %s", cid, cal["errors"])
+            for p in cal.get("busy", []):
+                # Google returns ISO with tz; normalize to local tz for comparisons
+                s = datetime.fromisoformat(p["start"]).astimezone(local_tz)
+                e = datetime.fromisoformat(p["end"]).astimezone(local_tz)
+                out.append((s, e))
+    return merge_intervals(out)
 
-def create_event(service, calendar_id: str, title: str,
-                 start: datetime, end: datetime,
-                 description: str = "", tz: str = "UTC") -> str:
+# Private extended property marking events this app created (readable from events.list deltas)
+APP_TAG = "task2cal"
+
+def new_event_id() -> str:
+    """Client-chosen event id: 32 lowercase hex digits, a subset of the base32hex Calendar accepts."""
+    return uuid.uuid4().hex
+
+def _is_duplicate(err: Exception) -> bool:
+    # 409 on an id we generated: an earlier attempt that looked failed had gone through
+    return getattr(getattr(err, "resp", None), "status", None) == 409
+
+def _event_body(title: str, start: datetime, end: datetime, description: str, tz: str,
+                page_id: str | None = None, event_id: str | None = None) -> dict:
     if start.tzinfo is None or end.tzinfo is None:
         raise ValueError("create_event requires tz-aware datetimes")
+    # Inserts carry their own id so a retry after a timeout or 5xx can't book the event twice
     body = {
+        "id": event_id or new_event_id(),
         "summary": title,
         "description": description,
         "start": {"dateTime": start.isoformat(), "timeZone": tz},
         "end":   {"dateTime": end.isoformat(),   "timeZone": tz},
     }
-    ev = service.events().insert(calendarId=calendar_id, body=body).execute()
+    if page_id:
+        body["extendedProperties"] = {"private": {APP_TAG: "1", "page_id": page_id}}
+    return body
+
+def is_ours(event: dict) -> bool:
+    return ((event.get("extendedProperties") or {}).get("private") or {}).get(APP_TAG) == "1"
+
+def create_event(service, calendar_id: str, title: str,
+                 start: datetime, end: datetime,
+                 description: str = "", tz: str = "UTC") -> str:
+    body = _event_body(title, start, end, description, tz)
+    try:
+        ev = _limiter(service).call("insert", service.events().insert(calendarId=calendar_id, body=body).execute)
+    except Exception as e:
+        if _is_duplicate(e):
+            return body["id"]
+        raise
     return ev["id"]
+
+# Calendar API accepts up to 50 calls per batch request
+BATCH_LIMIT = 50
+
+@dataclass
+class EventSlot:
+    title: str
+    start: datetime
+    end: datetime
+    description: str = ""
+    page_id: str | None = None
+    event_id: str | None = None  # generated by create_events when not set
+
+def create_events(service, calendar_id: str, slots: List[EventSlot],
+                  tz: str = "UTC", chunk_size: int = BATCH_LIMIT) -> List[Tuple[Optional[str], Optional[Exception]]]:
+    """
+    Insert many events with HTTP batch requests, `chunk_size` inserts per round trip.
+    Returns one (event_id, error) pair per slot, in input order; exactly one side is set.
+    Every insert carries a client id, so resending one that did land answers 409 and
+    counts as created; that makes retrying a failed batch or item safe.
+    """
+    bodies = [_event_body(s.title, s.start, s.end, s.description, tz, s.page_id, s.event_id) for s in slots]
+    results: List[Tuple[Optional[str], Optional[Exception]]] = [(None, None)] * len(bodies)
+
+    def _collect(request_id, response, exception):
+        i = int(request_id)
+        if exception is not None and _is_duplicate(exception):
+            results[i] = (bodies[i]["id"], None)
+        else:
+            results[i] = (None, exception) if exception is not None else (response["id"], None)
+
+    limiter = _limiter(service)
+    pending = list(range(len(bodies)))
+    for attempt in range(limiter.max_retries + 1):
+        for lo in range(0, len(pending), chunk_size):
+            batch = service.new_batch_http_request(callback=_collect)
+            for i in pending[lo:lo + chunk_size]:
+                batch.add(service.events().insert(calendarId=calendar_id, body=bodies[i]), request_id=str(i))
+            limiter.call("batch_insert", batch.execute)
+        # items inside a batch fail individually (e.g. 429); resend only those
+        retry = [i for i in pending if results[i][1] is not None and is_retryable(results[i][1])]
+        if not retry or attempt == limiter.max_retries:
+            break
+        throttled = [results[i][1] for i in retry if is_throttle(results[i][1])]
+        if throttled:
+            limiter.note_throttle(throttled[0])
+        time.sleep(limiter.backoff(attempt, throttled[0] if throttled else None))
+        pending = retry
+    return results
+
+def existing_events(service, calendar_id: str, event_ids: List[str]) -> List[str]:
+    """Which of these event ids exist (and aren't cancelled); used to settle inserts whose outcome was lost."""
+    found = []
+    for eid in event_ids:
+        try:
+            ev = _limiter(service).call("get", service.events().get(calendarId=calendar_id, eventId=eid).execute)
+        except Exception as e:
+            if getattr(getattr(e, "resp", None), "status", None) in (404, 410):
+                continue
+            raise
+        if ev.get("status") != "cancelled":
+            found.append(eid)
+    return found
+
+# Push notifications: events.watch channels live at most ~7 days and must be renewed
+WATCH_TTL_SEC = 7 * 24 * 3600
+
+def watch_events(service, calendar_id: str, channel_id: str, address: str,
+                 token: str | None = None, ttl_sec: int = WATCH_TTL_SEC) -> dict:
+    """Open a web_hook channel for calendar_id; returns {"id", "resourceId", "expiration" (epoch ms)}."""
+    body = {"id": channel_id, "type": "web_hook", "address": address, "params": {"ttl": str(ttl_sec)}}
+    if token:
+        body["token"] = token
+    resp = _limiter(service).call("watch", service.events().watch(calendarId=calendar_id, body=body).execute)
+    return {"id": resp["id"], "resourceId": resp["resourceId"], "expiration": int(resp.get("expiration", 0))}
+
+def stop_channel(service, channel_id: str, resource_id: str) -> None:
+    _limiter(service).call("stop_channel", service.channels().stop(body={"id": channel_id, "resourceId": resource_id}).execute)
+
+# --------- Incremental sync ---------
+class SyncTokenExpired(Exception):
+    """Calendar answered 410 Gone: the sync token is invalid and a full sync is needed."""
+
+def list_changes(service, calendar_id: str, sync_token: str | None,
+                 time_min: datetime | None = None) -> Tuple[List[dict], str]:
+    """
+    Events changed since sync_token (cancelled ones included), plus the next token.
+    Without a token this is the initial full listing from time_min, which only
+    exists to obtain a token.
+    """
+    params = {"calendarId": calendar_id, "maxResults": 2500, "singleEvents": True, "showDeleted": True}
+    if sync_token:
+        params["syncToken"] = sync_token
+    elif time_min is not None:
+        params["timeMin"] = time_min.isoformat()
+    items: List[dict] = []
+    page_token = None
+    while True:
+        try:
+            resp = _limiter(service).call("list", service.events().list(**params, **({"pageToken": page_token} if page_token else {})).execute)
+        except Exception as e:
+            if getattr(getattr(e, "resp", None), "status", None) == 410:
+                raise SyncTokenExpired(calendar_id) from e
+            raise
+        items.extend(resp.get("items", []))
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            return items, resp["nextSyncToken"]
+
+def patch_event(service, calendar_id: str, event_id: str, start: datetime, end: datetime, tz: str = "UTC") -> dict:
+    body = {"start": {"dateTime": start.isoformat(), "timeZone": tz},
+            "end": {"dateTime": end.isoformat(), "timeZone": tz}}
+    return _limiter(service).call("patch", service.events().patch(calendarId=calendar_id, eventId=event_id, body=body).execute)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+import importlib, os
+from typing import Dict, Optional, Protocol
+
+from app.services import storage
+
+# Lease store used to split tenants between replicas. The default keeps leases in the
+# shared SQL database (DATABASE_URL); set LEASE_STORE="package.module:factory" to plug
+# in another backend (e.g. Redis or etcd) implementing the same four methods.
+
+class LeaseStore(Protocol):
+    def acquire(self, name: str, owner: str, ttl_sec: float) -> bool:
+        """Take `name` if free, expired or already ours, extending it by ttl_sec."""
+
+    def renew(self, name: str, owner: str, ttl_sec: float) -> bool:
+        """Extend a lease we still hold; False if it expired or changed hands."""
+
+    def release(self, name: str, owner: str) -> None: ...
+
+    def live(self, prefix: str) -> Dict[str, str]:
+        """Unexpired leases under prefix, as name -> owner."""
+
+class SqlLeaseStore:
+    def __init__(self, url: str = storage.DATABASE_URL):
+        self.url = url
+
+    def acquire(self, name: str, owner: str, ttl_sec: float) -> bool:
+        return storage.acquire_lease(name, owner, ttl_sec, url=self.url)
+
+    def renew(self, name: str, owner: str, ttl_sec: float) -> bool:
+        return storage.renew_lease(name, owner, ttl_sec, url=self.url)
+
+    def release(self, name: str, owner: str) -> None:
+        storage.release_lease(name, owner, url=self.url)
+
+    def live(self, prefix: str) -> Dict[str, str]:
+        return storage.live_leases(prefix, url=self.url)
+
+_store: Optional[LeaseStore] = None
+
+def lease_store() -> LeaseStore:
+    global _store
+    if _store is None:
+        spec = os.getenv("LEASE_STORE")
+        if spec:
+            module, _, attr = spec.partition(":")
+            _store = getattr(importlib.import_module(module), attr)()
+        else:
+            _store = SqlLeaseStore()
+    return _store
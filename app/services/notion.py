@@ -1,6 +1,11 @@
 from __future__ import annotations
-from typing import List, Dict, Any
-from notion_client import Client
+import asyncio, weakref
+from typing import List, Dict, Any, Iterator, AsyncIterator, Optional, TYPE_CHECKING
+
+from app.services.ratelimit import NOTION, for_key
+
+if TYPE_CHECKING:
+    from notion_client import Client, AsyncClient
 
 PLANNED_PROP = "Planned?"
 DUE_PROP = "Due"
@@ -10,23 +15,76 @@ BREAKDOWN_PROP = "Breakdown Needed?"
 EST_MIN_PROP = "Estimated mins"
 NOTES_PROP = "Notes"
 
+PAGE_SIZE = 100  # Notion's maximum for databases.query
+
+# Clients are reused across polls so their httpx pools keep connections (and TLS sessions) warm.
+# Async clients are bound to the event loop they were first used on, so they're cached per loop.
+# notion_client (and httpx under it) is imported on first use to keep startup light.
+_sync_clients: Dict[str, "Client"] = {}
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, "AsyncClient"]] = weakref.WeakKeyDictionary()
+
+def _client(token: str) -> "Client":
+    if token not in _sync_clients:
+        from notion_client import Client
+        _sync_clients[token] = Client(auth=token)
+    return _sync_clients[token]
+
+def _async_client(token: str) -> "AsyncClient":
+    per_loop = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    if token not in per_loop:
+        from notion_client import AsyncClient
+        per_loop[token] = AsyncClient(auth=token)
+    return per_loop[token]
+
 class NotionTasks:
-    def __init__(self, token: str, database_id: str):
-        self.client = Client(auth=token)
+    def __init__(self, token: str | None, database_id: str):
+        # without a token only the property helpers work (e.g. reading an export)
+        self.client = _client(token) if token else None
         self.db = database_id
+        self.limiter = for_key(NOTION, token)  # Notion's rate limit is per integration token
 
-    def fetch_new(self) -> List[Dict[str,Any]]:
-        res = self.client.databases.query(
-            **{
-                "database_id": self.db,
-                "filter": {"and": [
-                    {"property": PLANNED_PROP, "checkbox": {"equals": False}},
-                    {"property": DUE_PROP, "date": {"is_not_empty": True}},
-                ]},
-                "page_size": 50,
-            }
-        )
-        return res.get("results", [])
+    def _new_query(self, since: Optional[str] = None, cursor: Optional[str] = None) -> Dict[str,Any]:
+        conds = [
+            {"property": PLANNED_PROP, "checkbox": {"equals": False}},
+            {"property": DUE_PROP, "date": {"is_not_empty": True}},
+        ]
+        if since:
+            # Notion rounds last_edited_time to the minute, so on_or_after can't miss an edit
+            conds.append({"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}})
+        # earliest due first, so the pipeline can place pages as they stream in
+        query = {"database_id": self.db, "filter": {"and": conds}, "page_size": PAGE_SIZE,
+                 "sorts": [{"property": DUE_PROP, "direction": "ascending"}]}
+        if cursor:
+            query["start_cursor"] = cursor
+        return query
+
+    def iter_new(self, since: Optional[str] = None) -> Iterator[Dict[str,Any]]:
+        """Yield every unplanned page (edited on/after `since`, if given), following next_cursor."""
+        cursor = None
+        while True:
+            res = self.limiter.call("query", self.client.databases.query, **self._new_query(since, cursor))
+            yield from res.get("results", [])
+            if not res.get("has_more"):
+                return
+            cursor = res.get("next_cursor")
+
+    def fetch_new(self, since: Optional[str] = None) -> List[Dict[str,Any]]:
+        return list(self.iter_new(since))
+
+    def iter_pages(self, page_ids: List[str]) -> Iterator[Dict[str,Any]]:
+        """Retrieve specific pages, yielding the ones that are still pending in this database."""
+        for page_id in page_ids:
+            page = self._retrieve(page_id)
+            if page is not None and self.is_pending(page):
+                yield page
+
+    def _retrieve(self, page_id: str) -> Optional[Dict[str,Any]]:
+        try:
+            return self.limiter.call("retrieve", self.client.pages.retrieve, page_id=page_id)
+        except Exception as e:
+            if getattr(e, "status", None) == 404:  # deleted, or not shared with the integration
+                return None
+            raise
 
     def title_of(self, page: Dict[str,Any]) -> str:
         title = page["properties"][TITLE_PROP]["title"]
@@ -47,14 +105,69 @@ class NotionTasks:
         rich = prop.get("rich_text", [])
         return "".join([r.get("plain_text", "") for r in rich]) or None
     
+    def edited_of(self, page: Dict[str,Any]) -> str | None:
+        return page.get("last_edited_time")
+
+    def is_pending(self, page: Dict[str,Any]) -> bool:
+        """Same test as _new_query, for pages fetched one by one (e.g. from a webhook)."""
+        parent = (page.get("parent") or {}).get("database_id", "")
+        if parent.replace("-", "") != self.db.replace("-", "") or page.get("archived") or page.get("in_trash"):
+            return False
+        props = page.get("properties", {})
+        return not props.get(PLANNED_PROP, {}).get("checkbox") and bool(props.get(DUE_PROP, {}).get("date"))
+
     def needs_breakdown(self, page: Dict[str,Any]) -> bool:
         return bool(page["properties"].get(BREAKDOWN_PROP, {}).get("checkbox"))
 
+    def planned_properties(self, event_ids: list[str]) -> Dict[str,Any]:
+        return {
+            PLANNED_PROP: {"checkbox": True},
+            EVENT_IDS_PROP: {"rich_text":[{"type":"text","text":{"content":",".join(event_ids)}}]},
+        }
+
+    def update_properties(self, page_id: str, properties: Dict[str,Any]) -> None:
+        self.limiter.call("update", self.client.pages.update, page_id=page_id, properties=properties)
+
     def mark_planned(self, page_id: str, event_ids: list[str]) -> None:
-        self.client.pages.update(**{
-            "page_id": page_id,
-            "properties": {
-                PLANNED_PROP: {"checkbox": True},
-                EVENT_IDS_PROP: {"rich_text":[{"type":"text","text":{"content":",".join(event_ids)}}]},
-            }
-        })
+        self.update_properties(page_id, self.planned_properties(event_ids))
+
+
+class AsyncNotionTasks(NotionTasks):
+    """Same property helpers as NotionTasks, but API calls are awaitable (httpx AsyncClient)."""
+    def __init__(self, token: str, database_id: str):
+        # must be constructed inside the running loop that will use it
+        self.client = _async_client(token)
+        self.db = database_id
+        self.limiter = for_key(NOTION, token)
+
+    async def iter_new(self, since: Optional[str] = None) -> AsyncIterator[Dict[str,Any]]:
+        cursor = None
+        while True:
+            res = await self.limiter.acall("query", self.client.databases.query, **self._new_query(since, cursor))
+            for page in res.get("results", []):
+                yield page
+            if not res.get("has_more"):
+                return
+            cursor = res.get("next_cursor")
+
+    async def fetch_new(self, since: Optional[str] = None) -> List[Dict[str,Any]]:
+        return [page async for page in self.iter_new(since)]
+
+    async def iter_pages(self, page_ids: List[str]) -> AsyncIterator[Dict[str,Any]]:
+        for page in await asyncio.gather(*(self._aretrieve(pid) for pid in page_ids)):
+            if page is not None and self.is_pending(page):
+                yield page
+
+    async def _aretrieve(self, page_id: str) -> Optional[Dict[str,Any]]:
+        try:
+            return await self.limiter.acall("retrieve", self.client.pages.retrieve, page_id=page_id)
+        except Exception as e:
+            if getattr(e, "status", None) == 404:
+                return None
+            raise
+
+    async def update_properties(self, page_id: str, properties: Dict[str,Any]) -> None:
+        await self.limiter.acall("update", self.client.pages.update, page_id=page_id, properties=properties)
+
+    async def mark_planned(self, page_id: str, event_ids: list[str]) -> None:
+        await self.update_properties(page_id, self.planned_properties(event_ids))
@@ -0,0 +1,132 @@
+from __future__ import annotations
+import asyncio, hashlib, logging, weakref
+from typing import Any, Dict
+
+from app.services.executor import run_blocking
+from app.services.ratelimit import NOTION, is_retryable
+from app.services.notion import PLANNED_PROP
+from app.services.storage import enqueue_update, due_updates, complete_update, retry_update, mark_synced, pending_updates
+from app.metrics import Counter
+
+# Write-behind for Notion page updates. The poller enqueues property updates into the
+# notion_outbox table (coalesced per page) and moves on; a background task per event
+# loop sends them through the token's Notion limiter and retries failures with backoff, so a
+# restart or a Notion outage only delays the writes.
+
+log = logging.getLogger("outbox")
+
+OUTBOX_FLUSHED = Counter("notion_outbox_flushed_total", "Outbox page updates sent to Notion by outcome")
+
+MAX_ATTEMPTS = 10      # after this many failed flushes a row is parked (next_attempt_at = NULL)
+FLUSH_INTERVAL = 5.0   # seconds between sweeps for rows whose backoff has expired
+BATCH = 100
+
+class NotionWriter:
+    """Background flusher for the Notion outbox, bound to the event loop that started it."""
+    def __init__(self, notion, owner: str = "", concurrency: int | None = None,
+                 interval: float = FLUSH_INTERVAL):
+        self.notion = notion  # anything with an async update_properties(page_id, properties)
+        self.owner = owner    # rows are only sent with the token that queued them
+        self.limiter = getattr(notion, "limiter", NOTION)  # the token's own limiter
+        self.concurrency = concurrency or self.limiter.max_concurrency
+        self.interval = interval
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def enqueue(self, page_id: str, properties: Dict[str, Any]) -> None:
+        await run_blocking(enqueue_update, page_id, properties, self.owner)
+        self.wake()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="notion-outbox")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Outbox flush failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def flush(self) -> int:
+        """Send every row that is due now; returns how many were written to Notion."""
+        limit = asyncio.Semaphore(self.concurrency)
+        sent = 0
+        while rows := await run_blocking(due_updates, BATCH, self.owner):
+            async def send(row) -> bool:
+                async with limit:
+                    return await self._send(*row)
+            results = await asyncio.gather(*(send(row) for row in rows))
+            sent += sum(results)
+            if not any(results):
+                break  # everything in this batch failed and was rescheduled
+        return sent
+
+    async def _send(self, page_id: str, properties: Dict[str, Any], version: int, attempts: int) -> bool:
+        try:
+            await self.notion.update_properties(page_id, properties)
+        except Exception as e:
+            give_up = attempts + 1 >= MAX_ATTEMPTS or not is_retryable(e)
+            delay = None if give_up else self.limiter.backoff(attempts, e) + self.interval
+            await run_blocking(retry_update, page_id, version, str(e), delay)
+            OUTBOX_FLUSHED.inc(outcome="parked" if give_up else "retry")
+            log.warning("Notion update for page %s failed (attempt %d%s): %s",
+                        page_id, attempts + 1, ", giving up" if give_up else "", e)
+            return False
+        await run_blocking(complete_update, page_id, version)
+        if properties.get(PLANNED_PROP, {}).get("checkbox"):
+            await run_blocking(mark_synced, [page_id])
+        OUTBOX_FLUSHED.inc(outcome="ok")
+        return True
+
+    async def drain(self, timeout: float) -> int:
+        """Flush until the outbox is empty or `timeout` passes; returns the rows left pending."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (left := await run_blocking(pending_updates, self.owner)) and loop.time() < deadline:
+            if not await self.flush():
+                await asyncio.sleep(min(0.5, max(0.0, deadline - loop.time())))
+        return left
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+_writers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, NotionWriter]] = weakref.WeakKeyDictionary()
+
+def token_owner(token: str) -> str:
+    # the single-tenant deployment keeps owner "" so rows queued before tenants existed still flush
+    return hashlib.sha256(token.encode()).hexdigest()[:16] if token else ""
+
+def writer_for(token: str, notion, tenant_id: str | None = None) -> NotionWriter:
+    """The running loop's writer for this integration token, started on first use."""
+    per_loop = _writers.setdefault(asyncio.get_running_loop(), {})
+    writer = per_loop.get(token)
+    if writer is None:
+        writer = per_loop[token] = NotionWriter(notion, token_owner(token) if tenant_id else "")
+    writer.notion = notion
+    writer.start()
+    return writer
+
+async def drain_all(timeout: float = 10.0) -> int:
+    """Flush and stop this loop's writers (app shutdown); returns updates still pending."""
+    left = 0
+    for writer in list(_writers.get(asyncio.get_running_loop(), {}).values()):
+        await writer.stop()
+        left += await writer.drain(timeout)
+    if left:
+        log.warning("%d Notion updates still queued at shutdown; they'll be sent on next start", left)
+    return left
@@ -1,13 +1,27 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
+from functools import lru_cache
 from typing import List, Optional
-import os, re, json, logging
-
-# Optional: Gemini AI
-try:
-    import google.generativeai as genai  # pip install google-generativeai
-except Exception:  # pragma: no cover
-    genai = None
+import os, re, json, logging, hashlib
+
+from app.services.executor import run_planning
+from app.services.storage import load_plan, save_plan
+from app.metrics import observe, PLANNER_FALLBACKS, PLAN_CACHE
+
+# Optional: Gemini AI. The SDK takes about a second to import, so it is loaded on the
+# first breakdown rather than at startup; assign `genai` to swap in a stand-in.
+genai = None
+_genai_missing = False
+
+def _load_genai():
+    global genai, _genai_missing
+    if genai is None and not _genai_missing:
+        try:
+            import google.generativeai as _genai  # pip install google-generativeai
+            genai = _genai
+        except Exception:  # pragma: no cover
+            _genai_missing = True
+    return genai
 
 log = logging.getLogger("planner")
 
@@ -37,90 +51,95 @@ def _fallback_breakdown(task_title: str, breakdown_needed: bool, override: Optio
     return [Subtask(p, _estimate_minutes_rule(p, override)) for p in parts]
 
 # --------- Gemini-backed planner ---------
-def _call_gemini(task_title: str,
-                 breakdown_needed: bool,
-                 override: Optional[int],
-                 notes: Optional[str] = None,
-                 max_subtasks: int = 6) -> List[Subtask]:
-    """
-    Ask Gemini for a JSON plan. Returns Subtask[].
-    Falls back to heuristics if API key missing, errors, or bad output.
-    """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key or genai is None:
-        return _fallback_breakdown(task_title, breakdown_needed, override)
-
-    try:
-        genai.configure(api_key=api_key)
-        # choose a stable, capable model; change if you prefer a different one
-        model = genai.GenerativeModel("gemini-1.5-pro")
-
-        # System/style guidance
-        sys = (
-            "You are a time-planning assistant. "
-            "Given a task (and optional notes), decide whether to split it and estimate how long each subtask should take. "
-            "Return JSON only, no prose, in the format: "
-            "{\"subtasks\":[{\"title\":\"...\",\"minutes\":45}, ...]}. "
-            "Constrain each 'minutes' to 15..120. Prefer splitting deep work into 25–60 minute chunks. "
-            f"Limit subtasks to at most {max_subtasks}. "
-            "If the user didn't request a breakdown, you may still adjust the single estimate but keep one item."
-        )
-
-        user_payload = {
-            "task_title": task_title,
-            "breakdown_requested": bool(breakdown_needed),
-            "estimate_override_minutes": int(override) if override else None,
-            "notes": (notes or "").strip(),
-        }
-
-        prompt = (
-            f"{sys}\n\n"
-            f"INPUT:\n{json.dumps(user_payload, ensure_ascii=False)}\n\n"
-            "OUTPUT JSON ONLY:\n"
-            "{\"subtasks\":[{\"title\":\"...\",\"minutes\":45}]}"
-        )
-
+# choose a stable, capable model; change if you prefer a different one
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
+# bump whenever the prompt or output post-processing changes, to invalidate cached plans
+PROMPT_VERSION = 1
+
+@lru_cache(maxsize=4)
+def _model(api_key: str, model_name: str):
+    sdk = _load_genai()
+    sdk.configure(api_key=api_key)
+    return sdk.GenerativeModel(model_name)
+
+def plan_key(task_title: str, notes: Optional[str], breakdown_needed: bool, override: Optional[int]) -> str:
+    """Content address of a Gemini plan: same inputs, model and prompt version => same plan."""
+    payload = [task_title, (notes or "").strip(), bool(breakdown_needed),
+               int(override) if override else None, MODEL_NAME, PROMPT_VERSION]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode()).hexdigest()
+
+def _ask_gemini(api_key: str,
+                task_title: str,
+                breakdown_needed: bool,
+                override: Optional[int],
+                notes: Optional[str] = None,
+                max_subtasks: int = 6) -> List[Subtask]:
+    """Ask Gemini for a JSON plan. Raises on API errors or unusable output."""
+    model = _model(api_key, MODEL_NAME)
+
+    # System/style guidance
+    sys = (
+        "You are a time-planning assistant. "
+        "Given a task (and optional notes), decide whether to split it and estimate how long each subtask should take. "
+        "Return JSON only, no prose, in the format: "
+        "{\"subtasks\":[{\"title\":\"...\",\"minutes\":45}, ...]}. "
+        "Constrain each 'minutes' to 15..120. Prefer splitting deep work into 25–60 minute chunks. "
+        f"Limit subtasks to at most {max_subtasks}. "
+        "If the user didn't request a breakdown, you may still adjust the single estimate but keep one item."
+    )
+
+    user_payload = {
+        "task_title": task_title,
+        "breakdown_requested": bool(breakdown_needed),
+        "estimate_override_minutes": int(override) if override else None,
+        "notes": (notes or "").strip(),
+    }
+
+    prompt = (
+        f"{sys}\n\n"
+        f"INPUT:\n{json.dumps(user_payload, ensure_ascii=False)}\n\n"
+        "OUTPUT JSON ONLY:\n"
+        "{\"subtasks\":[{\"title\":\"...\",\"minutes\":45}]}"
+    )
+
+    with observe("gemini", "generate"):
         resp = model.generate_content(prompt)
-        text = (resp.candidates[0].content.parts[0].text if resp and resp.candidates else "").strip()
-
-        # Extract JSON block
-        start = text.find("{")
-        end = text.rfind("}")
-        if start == -1 or end == -1:
-            raise ValueError("Gemini did not return JSON")
-        data = json.loads(text[start:end+1])
-        items = data.get("subtasks", [])
-        if not isinstance(items, list) or not items:
-            raise ValueError("No subtasks in JSON")
-
-        out: List[Subtask] = []
-        for it in items[:max_subtasks]:
-            title = str(it.get("title", "")).strip() or task_title
-            # minutes with bounds + override respected
-            try:
-                minutes = int(it.get("minutes", 0))
-            except Exception:
-                minutes = 0
-            if override:
-                minutes = max(15, min(int(override), 120))
-            else:
-                minutes = max(15, min(minutes, 120))
-            out.append(Subtask(title=title, minutes=minutes))
-
-        if not out:
-            return _fallback_breakdown(task_title, breakdown_needed, override)
-
-        # Respect user's checkbox: if breakdown not requested, collapse to a single estimate
-        if not breakdown_needed and len(out) > 1:
-            # choose the longest suggested chunk as the single focused block (or just first)
-            out.sort(key=lambda s: s.minutes, reverse=True)
-            return [out[0]]
-
-        return out
-
-    except Exception as e:
-        log.warning("Gemini plan failed; using fallback. err=%s", e)
-        return _fallback_breakdown(task_title, breakdown_needed, override)
+    text = (resp.candidates[0].content.parts[0].text if resp and resp.candidates else "").strip()
+
+    # Extract JSON block
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end == -1:
+        raise ValueError("Gemini did not return JSON")
+    data = json.loads(text[start:end+1])
+    items = data.get("subtasks", [])
+    if not isinstance(items, list) or not items:
+        raise ValueError("No subtasks in JSON")
+
+    out: List[Subtask] = []
+    for it in items[:max_subtasks]:
+        title = str(it.get("title", "")).strip() or task_title
+        # minutes with bounds + override respected
+        try:
+            minutes = int(it.get("minutes", 0))
+        except Exception:
+            minutes = 0
+        if override:
+            minutes = max(15, min(int(override), 120))
+        else:
+            minutes = max(15, min(minutes, 120))
+        out.append(Subtask(title=title, minutes=minutes))
+
+    if not out:
+        raise ValueError("No usable subtasks in JSON")
+
+    # Respect user's checkbox: if breakdown not requested, collapse to a single estimate
+    if not breakdown_needed and len(out) > 1:
+        # choose the longest suggested chunk as the single focused block (or just first)
+        out.sort(key=lambda s: s.minutes, reverse=True)
+        return [out[0]]
+
+    return out
 
 # --------- Public API (used by scheduler) ---------
 def estimate_minutes(title: str, override: Optional[int]) -> int:
@@ -130,12 +149,51 @@ def estimate_minutes(title: str, override: Optional[int]) -> int:
 def breakdown(task_title: str,
               breakdown_needed: bool,
               override: Optional[int],
-              notes: Optional[str] = None) -> List[Subtask]:
+              notes: Optional[str] = None,
+              dry_run: bool = False) -> List[Subtask]:
     """
     Prefer Gemini; fallback to rules.
     - task_title: Notion 'Task' title
     - breakdown_needed: your 'Breakdown Needed?' checkbox
     - override: Notion 'Estimated mins' if present
     - notes: Notion 'Notes' rich_text (plain text), optional
+    Gemini plans are cached in the DB by plan_key(); heuristic fallbacks are never cached.
+    With dry_run=True the cache is read but not written.
     """
-    return _call_gemini(task_title, breakdown_needed, override, notes=notes)
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key or _load_genai() is None:
+        PLANNER_FALLBACKS.inc(reason="unconfigured")
+        return _fallback_breakdown(task_title, breakdown_needed, override)
+
+    key = plan_key(task_title, notes, breakdown_needed, override)
+    try:
+        cached = load_plan(key)
+    except Exception as e:
+        log.warning("Plan cache read failed. err=%s", e)
+        cached = None
+    if cached:
+        PLAN_CACHE.inc(result="hit")
+        return [Subtask(**it) for it in cached]
+    PLAN_CACHE.inc(result="miss")
+
+    try:
+        subs = _ask_gemini(api_key, task_title, breakdown_needed, override, notes)
+    except Exception as e:
+        log.warning("Gemini plan failed; using fallback. err=%s", e)
+        PLANNER_FALLBACKS.inc(reason="error")
+        return _fallback_breakdown(task_title, breakdown_needed, override)
+    if dry_run:
+        return subs
+    try:
+        save_plan(key, [asdict(s) for s in subs])
+    except Exception as e:
+        log.warning("Plan cache write failed. err=%s", e)
+    return subs
+
+async def abreakdown(task_title: str,
+                     breakdown_needed: bool,
+                     override: Optional[int],
+                     notes: Optional[str] = None,
+                     dry_run: bool = False) -> List[Subtask]:
+    """breakdown() on the planning pool, so the Gemini call doesn't block the event loop."""
+    return await run_planning(breakdown, task_title, breakdown_needed, override, notes=notes, dry_run=dry_run)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+import asyncio, hashlib, os, random, threading, time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.metrics import observe, Counter, Gauge
+
+# Client-side throttling shared by every wrapper that talks to an upstream:
+# a token bucket caps the request rate, an AIMD window caps requests in flight
+# (halved on throttling, grown slowly on success), and retryable failures are
+# retried with full-jitter exponential backoff that honors Retry-After.
+# Notion and Google enforce quotas per credential, so each integration token or
+# Google account gets its own limiter (for_key); NOTION/GCAL are the unkeyed defaults.
+
+RETRIES = Counter("upstream_retries_total", "Retried calls by upstream and reason")
+CONCURRENCY = Gauge("upstream_concurrency_limit", "Current adaptive in-flight limit per upstream")
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+def _status(err: Exception) -> Optional[int]:
+    # notion_client.APIResponseError has .status; googleapiclient HttpError has .resp.status
+    status = getattr(err, "status", None)
+    if status is None:
+        status = getattr(getattr(err, "resp", None), "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _retry_after(err: Exception) -> Optional[float]:
+    headers = getattr(err, "headers", None) or getattr(err, "resp", None)
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_throttle(err: Exception) -> bool:
+    status = _status(err)
+    if status == 429:
+        return True
+    # Calendar reports quota exhaustion as 403 with a rateLimitExceeded reason
+    return status == 403 and any(r in str(err) for r in RATE_LIMIT_REASONS)
+
+def is_retryable(err: Exception) -> bool:
+    if is_throttle(err) or _status(err) in RETRYABLE_STATUS:
+        return True
+    return isinstance(err, (TimeoutError, ConnectionError)) or type(err).__name__ in ("RequestTimeoutError", "TimeoutException")
+
+class Upstream:
+    """Rate limit, adaptive concurrency and retry policy for one external API."""
+    def __init__(self, name: str, rate: float, burst: int, max_concurrency: int,
+                 max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 30.0, scope: str = ""):
+        self.name = name
+        self.scope = scope  # hash of the credential this limiter is for ("" for the shared default)
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._report()
+
+    def _report(self) -> None:
+        CONCURRENCY.set(self._limit, upstream=self.name, **({"scope": self.scope} if self.scope else {}))
+
+    # --- admission ---
+    def _try_admit(self) -> float:
+        """Take a token and an in-flight slot; return 0, or how long to wait before retrying."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._in_flight >= int(self._limit):
+                return 0.01
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+            self._in_flight += 1
+            return 0.0
+
+    def _release(self, err: Optional[Exception] = None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if err is None:
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+                self._report()
+        if err is not None and is_throttle(err):
+            self.note_throttle(err)
+
+    def note_throttle(self, err: Exception) -> None:
+        """Multiplicative decrease, and pause every caller for Retry-After if the upstream sent one."""
+        retry_after = _retry_after(err)
+        with self._lock:
+            self._limit = max(1.0, self._limit / 2)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._report()
+
+    def backoff(self, attempt: int, err: Optional[Exception] = None) -> float:
+        """Delay before retry `attempt` (0-based): Retry-After if given, else full-jitter exponential."""
+        hinted = _retry_after(err) if err is not None else None
+        if hinted is not None:
+            return min(hinted, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _after_failure(self, err: Exception, attempt: int) -> Optional[float]:
+        """Record a failed attempt; return the delay before retrying, or None to give up."""
+        self._release(err)
+        if attempt >= self.max_retries or not is_retryable(err):
+            return None
+        RETRIES.inc(upstream=self.name, reason="throttled" if is_throttle(err) else "error")
+        return self.backoff(attempt, err)
+
+    # --- calls ---
+    def call(self, op: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        for attempt in range(self.max_retries + 1):
+            while (wait := self._try_admit()) > 0:
+                time.sleep(wait)
+            try:
+                with observe(self.name, op):
+                    result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._after_failure(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._release()
+            return result
+
+    async def acall(self, op: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        for attempt in range(self.max_retries + 1):
+            while (wait := self._try_admit()) > 0:
+                await asyncio.sleep(wait)
+            try:
+                with observe(self.name, op):
+                    result = await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._after_failure(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._release()
+            return result
+
+# Notion documents an average of 3 requests/second per integration
+NOTION = Upstream("notion", rate=float(os.getenv("NOTION_RPS", "3")), burst=3,
+                  max_concurrency=int(os.getenv("NOTION_MAX_CONCURRENCY", "3")))
+GCAL = Upstream("gcal", rate=float(os.getenv("GCAL_RPS", "10")), burst=10,
+                max_concurrency=int(os.getenv("GCAL_MAX_CONCURRENCY", "8")))
+
+_keyed: Dict[Tuple[str, str], Upstream] = {}
+_keyed_lock = threading.Lock()
+
+def for_key(base: Upstream, key: str | None) -> Upstream:
+    """The limiter for one credential, with base's settings; no key means base itself."""
+    if not key:
+        return base
+    scope = hashlib.sha256(key.encode()).hexdigest()[:12]  # never put the credential in a label
+    with _keyed_lock:
+        limiter = _keyed.get((base.name, scope))
+        if limiter is None:
+            limiter = _keyed[(base.name, scope)] = Upstream(
+                base.name, base.rate, base.burst, base.max_concurrency,
+                base.max_retries, base.base_delay, base.max_delay, scope=scope)
+        return limiter
@@ -1,26 +1,577 @@
 from __future__ import annotations
-from sqlalchemy import create_engine, Column, String, DateTime, Boolean
+from sqlalchemy import (create_engine, event, inspect, text, update, delete, select, func, or_,
+                        Column, String, DateTime, Boolean, Text, Integer, Index)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base, sessionmaker
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+import json, os, threading
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///app.db")
 
 Base = declarative_base()
 
 class Item(Base):
+    """A Notion page we have booked. planned = events exist; synced = Notion was told."""
     __tablename__ = "items"
     page_id = Column(String, primary_key=True)
     title = Column(String)
     due = Column(String)
     planned = Column(Boolean, default=False)
+    synced = Column(Boolean, default=False, index=True)
+    synced_at = Column(DateTime)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
 class Event(Base):
+    """Every calendar event we created; start/end are naive UTC."""
     __tablename__ = "events"
+    __table_args__ = (Index("ix_events_calendar_start", "calendar_id", "start"),)
     event_id = Column(String, primary_key=True)
     page_id = Column(String, index=True)
+    seq = Column(Integer)  # which subtask of the page's plan; NULL on rows from before it was kept
+    calendar_id = Column(String)
+    title = Column(String)
     start = Column(DateTime)
     end = Column(DateTime)
+    pending = Column(Boolean)  # recorded before the insert; True until we know whether it was created
+    deleted_at = Column(DateTime)  # the event was cancelled on the calendar (the row stays as history)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class EventMove(Base):
+    """History of blocks we re-timed (or saw the user re-time), newest last per event."""
+    __tablename__ = "event_moves"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_id = Column(String, index=True)
+    page_id = Column(String, index=True)
+    old_start = Column(DateTime)
+    old_end = Column(DateTime)
+    new_start = Column(DateTime)
+    new_end = Column(DateTime)
+    reason = Column(String)  # "collision" | "user"
+    moved_at = Column(DateTime, default=datetime.utcnow)
+
+class PlanCache(Base):
+    """Gemini breakdowns keyed by a content hash of everything that shaped the prompt."""
+    __tablename__ = "plan_cache"
+    key = Column(String, primary_key=True)
+    subtasks = Column(Text)  # JSON list of {"title", "minutes"}
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SyncState(Base):
+    """Small key/value store for sync cursors (e.g. the Notion last_edited_time watermark)."""
+    __tablename__ = "sync_state"
+    key = Column(String, primary_key=True)
+    value = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class NotionOutbox(Base):
+    """
+    Pending Notion property updates, one row per page. Re-enqueueing a page merges
+    its properties into the pending row and bumps `version`, so repeated updates
+    coalesce and a flush of an older version never deletes a newer one.
+    """
+    __tablename__ = "notion_outbox"
+    page_id = Column(String, primary_key=True)
+    owner = Column(String, default="", index=True)  # which integration token may send it (hash)
+    properties = Column(Text)  # JSON object of Notion property values
+    version = Column(Integer, default=1)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, index=True)  # NULL once we've given up
+    last_error = Column(Text)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class Tenant(Base):
+    """One user's Notion database + Google calendars, polled by whichever replica holds its lease."""
+    __tablename__ = "tenants"
+    id = Column(String, primary_key=True)
+    notion_token = Column(Text)  # secret columns are sealed with TENANT_SECRET_KEY when it is set (see seal())
+    notion_db_id = Column(String)
+    gcal_id = Column(String)
+    block_calendar_ids = Column(Text)  # JSON list; gcal_id is always included
+    tz = Column(String)
+    work_start = Column(String)  # "HH:MM"
+    work_end = Column(String)
+    oauth_client_json = Column(Text)  # JSON; falls back to the deployment's client when empty
+    token_json = Column(Text)  # JSON authorized-user token for the tenant's Google account
+    enabled = Column(Boolean, default=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class Lease(Base):
+    """Named, expiring ownership record shared by all replicas (see app.services.leases)."""
+    __tablename__ = "leases"
+    name = Column(String, primary_key=True)
+    owner = Column(String, index=True)
+    expires_at = Column(DateTime, index=True)
+    heartbeat_at = Column(DateTime)
+
+class Run(Base):
+    """One scheduling cycle started by /trigger or the poller; triggers that arrive while it is queued join it."""
+    __tablename__ = "runs"
+    id = Column(String, primary_key=True)
+    tenant_id = Column(String, index=True)
+    source = Column(String)     # "trigger" | "poll"
+    status = Column(String, index=True)  # queued | running | ok | error | cancelled
+    requests = Column(Integer, default=1)  # how many requests this run absorbed
+    pages_fetched = Column(Integer)
+    pages_done = Column(Integer, default=0)
+    events_created = Column(Integer, default=0)
+    skipped = Column(Integer)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class RunPage(Base):
+    """Per-page outcome of a run, appended as pages are committed."""
+    __tablename__ = "run_pages"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(String, index=True)
+    page_id = Column(String)
+    title = Column(String)
+    event_ids = Column(Text)  # JSON list
+    errors = Column(Text)     # JSON list, NULL when the page booked cleanly
+    recovered = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
-def make_session(url: str = "sqlite:///app.db"):
+_init_lock = threading.Lock()
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    # WAL lets the poller write while request handlers read
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.close()
+
+def _add_missing_columns(engine) -> None:
+    """
+    create_all() won't touch existing tables; add the columns and indexes
+    introduced since the DB was created.
+    """
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            have = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in have:
+                    ddl = col.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{col.name}" {ddl}'))
+            for idx in table.indexes:
+                idx.create(conn, checkfirst=True)
+
+@lru_cache(maxsize=None)
+def _sessionmaker(url: str):
     engine = create_engine(url, echo=False, future=True)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _sqlite_pragmas)
     Base.metadata.create_all(engine)
-    return sessionmaker(bind=engine, expire_on_commit=False)()
+    _add_missing_columns(engine)
+    return sessionmaker(bind=engine, expire_on_commit=False)
+
+def _get_sessionmaker(url: str):
+    # lru_cache doesn't stop two pool threads from racing create_all on first use
+    with _init_lock:
+        return _sessionmaker(url)
+
+def make_session(url: str = DATABASE_URL):
+    return _get_sessionmaker(url)()
+
+def _utc(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+def load_plan(key: str, url: str = DATABASE_URL) -> list[dict] | None:
+    with make_session(url) as session:
+        row = session.get(PlanCache, key)
+        return json.loads(row.subtasks) if row else None
+
+def save_plan(key: str, subtasks: list[dict], url: str = DATABASE_URL) -> None:
+    with make_session(url) as session:
+        session.merge(PlanCache(key=key, subtasks=json.dumps(subtasks), created_at=datetime.utcnow()))
+        session.commit()
+
+def get_state(key: str, url: str = DATABASE_URL) -> str | None:
+    with make_session(url) as session:
+        row = session.get(SyncState, key)
+        return row.value if row else None
+
+def set_state(key: str, value: str, url: str = DATABASE_URL) -> None:
+    with make_session(url) as session:
+        session.merge(SyncState(key=key, value=value, updated_at=datetime.utcnow()))
+        session.commit()
+
+# --------- Event ledger ---------
+def load_items(page_ids: Iterable[str], url: str = DATABASE_URL) -> Dict[str, Item]:
+    ids = list(page_ids)
+    if not ids:
+        return {}
+    with make_session(url) as session:
+        return {it.page_id: it for it in session.scalars(select(Item).where(Item.page_id.in_(ids)))}
+
+def _current_booking(session, page_id: str):
+    """The page's latest booking: rows created since its item was (re)booked; older bookings stay in the ledger."""
+    item = session.get(Item, page_id)
+    if item is None:
+        return None
+    return select(Event).where(Event.page_id == page_id, Event.created_at >= item.updated_at,
+                               Event.deleted_at.is_(None))
+
+_confirmed = or_(Event.pending.is_(None), Event.pending.is_(False))
+
+def page_event_ids(page_id: str, url: str = DATABASE_URL) -> List[str]:
+    """Event ids from the page's latest booking."""
+    with make_session(url) as session:
+        q = _current_booking(session, page_id)
+        if q is None:
+            return []
+        return list(session.scalars(q.where(_confirmed).with_only_columns(Event.event_id).order_by(Event.start)))
+
+def booked_seqs(page_id: str, include_pending: bool = False, url: str = DATABASE_URL) -> Dict[int, str]:
+    """seq -> event_id for the subtasks the page's latest (possibly partial) booking already has."""
+    with make_session(url) as session:
+        q = _current_booking(session, page_id)
+        if q is None:
+            return {}
+        q = q.where(Event.seq.is_not(None))
+        if not include_pending:
+            q = q.where(_confirmed)
+        return {ev.seq: ev.event_id for ev in session.scalars(q)}
+
+def pending_events(page_id: str, url: str = DATABASE_URL) -> List[str]:
+    """Inserts of the page's latest booking whose outcome was never recorded (crash, or an ambiguous error)."""
+    with make_session(url) as session:
+        q = _current_booking(session, page_id)
+        if q is None:
+            return []
+        return list(session.scalars(q.where(Event.pending.is_(True)).with_only_columns(Event.event_id)))
+
+def booked_between(calendar_id: str, start: datetime, end: datetime,
+                   url: str = DATABASE_URL) -> List[Tuple[datetime, datetime]]:
+    """Blocks we created on calendar_id overlapping [start, end), as tz-aware UTC intervals."""
+    with make_session(url) as session:
+        rows = session.execute(
+            select(Event.start, Event.end)
+            .where(Event.calendar_id == calendar_id, Event.deleted_at.is_(None),
+                   Event.start < _utc(end), Event.end > _utc(start))
+        )
+        return [(s.replace(tzinfo=timezone.utc), e.replace(tzinfo=timezone.utc)) for s, e in rows]
+
+def ledger_events(event_ids: Iterable[str], url: str = DATABASE_URL) -> Dict[str, Event]:
+    ids = list(event_ids)
+    if not ids:
+        return {}
+    with make_session(url) as session:
+        return {ev.event_id: ev for ev in session.scalars(select(Event).where(Event.event_id.in_(ids)))}
+
+def events_overlapping(calendar_id: str, intervals: Iterable[Tuple[datetime, datetime]],
+                       url: str = DATABASE_URL) -> List[Event]:
+    """Our blocks on calendar_id that overlap any of the (tz-aware) intervals."""
+    found: Dict[str, Event] = {}
+    with make_session(url) as session:
+        for s, e in intervals:
+            # pending blocks may not exist, so there is nothing to move yet
+            for ev in session.scalars(select(Event).where(Event.calendar_id == calendar_id, _confirmed,
+                                                          Event.deleted_at.is_(None),
+                                                          Event.start < _utc(e), Event.end > _utc(s))):
+                found[ev.event_id] = ev
+    return sorted(found.values(), key=lambda ev: ev.start)
+
+def record_move(event_id: str, start: datetime, end: datetime, reason: str, url: str = DATABASE_URL) -> None:
+    """Re-time a ledger event and append the change to its move history."""
+    with make_session(url) as session:
+        ev = session.get(Event, event_id)
+        if ev is None:
+            return
+        session.add(EventMove(event_id=event_id, page_id=ev.page_id, old_start=ev.start, old_end=ev.end,
+                              new_start=_utc(start), new_end=_utc(end), reason=reason, moved_at=datetime.utcnow()))
+        ev.start, ev.end = _utc(start), _utc(end)
+        session.commit()
+
+def mark_deleted(event_ids: Iterable[str], url: str = DATABASE_URL) -> int:
+    """Flag ledger events that were cancelled on the calendar; returns how many were still live."""
+    ids = list(event_ids)
+    if not ids:
+        return 0
+    with make_session(url) as session:
+        res = session.execute(update(Event).where(Event.event_id.in_(ids), Event.deleted_at.is_(None))
+                              .values(deleted_at=datetime.utcnow()))
+        session.commit()
+        return res.rowcount
+
+def event_moves(event_ids: Iterable[str], url: str = DATABASE_URL) -> List[EventMove]:
+    ids = list(event_ids)
+    with make_session(url) as session:
+        return list(session.scalars(select(EventMove).where(EventMove.event_id.in_(ids)).order_by(EventMove.id)))
+
+def begin_booking(calendar_id: str,
+                  bookings: Iterable[Tuple[str, str, str | None, bool, Iterable[Tuple[str, int, str, datetime, datetime]]]],
+                  url: str = DATABASE_URL) -> None:
+    """
+    Record intent before inserting: for each (page_id, title, due, resume, events) store
+    the page's (event_id, seq, title, start, end) as pending rows under the client ids the
+    inserts will carry, all in one transaction. A crash after the inserts then leaves rows
+    the next poll can check against the calendar instead of events nobody knows about.
+    resume=True adds to the page's current booking; otherwise a new booking starts.
+    """
+    now = datetime.utcnow()
+    with make_session(url) as session:
+        for page_id, title, due, resume, events in bookings:
+            session.add_all([
+                Event(event_id=eid, page_id=page_id, seq=seq, calendar_id=calendar_id, title=t,
+                      start=_utc(s), end=_utc(e), pending=True, created_at=now)
+                for eid, seq, t, s, e in events
+            ])
+            item = session.get(Item, page_id)
+            started = item.updated_at if resume and item is not None else now
+            session.merge(Item(page_id=page_id, title=title, due=due, planned=False,
+                               synced=False, synced_at=None, updated_at=started))
+        session.commit()
+
+def settle_booking(page_id: str, created: Iterable[str], failed: Iterable[str], planned: bool,
+                   url: str = DATABASE_URL) -> None:
+    """
+    Write-through once the inserts have answered: created rows stop being pending, failed
+    ones (definitely not created) are dropped, and rows in neither stay pending for the
+    next poll. planned=False leaves a partial booking for the next poll to resume.
+    """
+    created, failed = list(created), list(failed)
+    with make_session(url) as session:
+        if created:
+            session.execute(update(Event).where(Event.event_id.in_(created)).values(pending=False))
+        if failed:
+            session.execute(delete(Event).where(Event.event_id.in_(failed)))
+        session.execute(update(Item).where(Item.page_id == page_id).values(planned=planned, synced=False, synced_at=None))
+        session.commit()
+
+def mark_synced(page_ids: Iterable[str], url: str = DATABASE_URL) -> None:
+    ids = list(page_ids)
+    if not ids:
+        return
+    now = datetime.utcnow()
+    with make_session(url) as session:
+        session.execute(update(Item).where(Item.page_id.in_(ids)).values(synced=True, synced_at=now))
+        session.commit()
+
+# --------- Notion outbox ---------
+def enqueue_update(page_id: str, properties: Dict[str, Any], owner: str = "", url: str = DATABASE_URL) -> None:
+    now = datetime.utcnow()
+    with make_session(url) as session:
+        row = session.get(NotionOutbox, page_id)
+        if row is None:
+            session.add(NotionOutbox(page_id=page_id, owner=owner, properties=json.dumps(properties), version=1,
+                                     attempts=0, next_attempt_at=now, updated_at=now))
+        else:
+            merged = {**json.loads(row.properties), **properties}
+            row.properties = json.dumps(merged)
+            row.owner = owner
+            row.version += 1
+            row.attempts = 0
+            row.next_attempt_at = now
+            row.last_error = None
+            row.updated_at = now
+        session.commit()
+
+def due_updates(limit: int = 100, owner: str = "", url: str = DATABASE_URL) -> List[Tuple[str, Dict[str, Any], int, int]]:
+    """(page_id, properties, version, attempts) ready to send, oldest first."""
+    with make_session(url) as session:
+        rows = session.scalars(
+            select(NotionOutbox)
+            .where(NotionOutbox.owner == owner, NotionOutbox.next_attempt_at <= datetime.utcnow())
+            .order_by(NotionOutbox.next_attempt_at)
+            .limit(limit)
+        )
+        return [(r.page_id, json.loads(r.properties), r.version, r.attempts) for r in rows]
+
+def complete_update(page_id: str, version: int, url: str = DATABASE_URL) -> None:
+    with make_session(url) as session:
+        session.execute(delete(NotionOutbox).where(NotionOutbox.page_id == page_id,
+                                                   NotionOutbox.version == version))
+        session.commit()
+
+def retry_update(page_id: str, version: int, error: str, delay_sec: float | None,
+                 url: str = DATABASE_URL) -> None:
+    """Schedule another attempt in delay_sec, or park the row (delay_sec=None) for inspection."""
+    with make_session(url) as session:
+        session.execute(
+            update(NotionOutbox)
+            .where(NotionOutbox.page_id == page_id, NotionOutbox.version == version)
+            .values(attempts=NotionOutbox.attempts + 1, last_error=error[:2000],
+                    next_attempt_at=None if delay_sec is None else datetime.utcnow() + timedelta(seconds=delay_sec))
+        )
+        session.commit()
+
+def pending_updates(owner: str = "", url: str = DATABASE_URL) -> int:
+    with make_session(url) as session:
+        return session.scalar(select(func.count()).select_from(NotionOutbox)
+                              .where(NotionOutbox.owner == owner, NotionOutbox.next_attempt_at.is_not(None))) or 0
+
+# --------- Tenants ---------
+# Credentials in the tenants table are encrypted at rest when TENANT_SECRET_KEY holds a
+# Fernet key (`cryptography` package). Sealed values carry a prefix, so rows written
+# before the key was set still read as plaintext.
+SECRET_FIELDS = ("notion_token", "oauth_client_json", "token_json")
+_SEALED = "fernet:"
+
+def _fernet():
+    key = os.getenv("TENANT_SECRET_KEY")
+    if not key:
+        return None
+    from cryptography.fernet import Fernet  # pip install cryptography
+    return Fernet(key.encode())
+
+def seal(value: str | None) -> str | None:
+    """Encrypt a tenant secret for storage; unchanged when TENANT_SECRET_KEY is unset."""
+    f = _fernet()
+    if not value or f is None or value.startswith(_SEALED):
+        return value
+    return _SEALED + f.encrypt(value.encode()).decode()
+
+def unseal(value: str | None) -> str | None:
+    """Plaintext of a stored tenant secret. Raises ValueError if it can't be decrypted."""
+    if not value or not value.startswith(_SEALED):
+        return value
+    f = _fernet()
+    if f is None:
+        raise ValueError("tenant secret is encrypted but TENANT_SECRET_KEY is unset")
+    from cryptography.fernet import InvalidToken
+    try:
+        return f.decrypt(value[len(_SEALED):].encode()).decode()
+    except InvalidToken:
+        raise ValueError("tenant secret doesn't decrypt with TENANT_SECRET_KEY") from None
+
+def list_tenants(enabled_only: bool = True, url: str = DATABASE_URL) -> List[Tenant]:
+    with make_session(url) as session:
+        q = select(Tenant).order_by(Tenant.id)
+        if enabled_only:
+            q = q.where(Tenant.enabled.is_(True))
+        return list(session.scalars(q))
+
+def get_tenant(tenant_id: str, url: str = DATABASE_URL) -> Tenant | None:
+    with make_session(url) as session:
+        return session.get(Tenant, tenant_id)
+
+def upsert_tenant(tenant_id: str, *, url: str = DATABASE_URL, **fields) -> None:
+    """Create or update a tenant; list/dict fields are stored as JSON, credentials sealed."""
+    for key in ("block_calendar_ids", "oauth_client_json", "token_json"):
+        if fields.get(key) is not None and not isinstance(fields[key], str):
+            fields[key] = json.dumps(fields[key])
+    for key in SECRET_FIELDS:
+        if key in fields:
+            fields[key] = seal(fields[key])
+    now = datetime.utcnow()
+    with make_session(url) as session:
+        row = session.get(Tenant, tenant_id)
+        if row is None:
+            row = Tenant(id=tenant_id, created_at=now)
+            session.add(row)
+        for key, value in fields.items():
+            setattr(row, key, value)
+        row.updated_at = now
+        session.commit()
+
+# --------- Leases ---------
+def acquire_lease(name: str, owner: str, ttl_sec: float, url: str = DATABASE_URL) -> bool:
+    """Take or extend `name` for owner; succeeds only if it is free, expired or already ours."""
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=ttl_sec)
+    with make_session(url) as session:
+        # one conditional UPDATE, so two replicas can't both win an expired lease
+        res = session.execute(
+            update(Lease)
+            .where(Lease.name == name, or_(Lease.owner == owner, Lease.expires_at < now))
+            .values(owner=owner, expires_at=expires, heartbeat_at=now)
+        )
+        if res.rowcount:
+            session.commit()
+            return True
+        try:
+            session.add(Lease(name=name, owner=owner, expires_at=expires, heartbeat_at=now))
+            session.commit()
+            return True
+        except IntegrityError:
+            session.rollback()
+            return False
+
+def renew_lease(name: str, owner: str, ttl_sec: float, url: str = DATABASE_URL) -> bool:
+    """Heartbeat: extend a lease we still hold; False means it was lost."""
+    now = datetime.utcnow()
+    with make_session(url) as session:
+        res = session.execute(
+            update(Lease)
+            .where(Lease.name == name, Lease.owner == owner, Lease.expires_at >= now)
+            .values(expires_at=now + timedelta(seconds=ttl_sec), heartbeat_at=now)
+        )
+        session.commit()
+        return bool(res.rowcount)
+
+def release_lease(name: str, owner: str, url: str = DATABASE_URL) -> None:
+    with make_session(url) as session:
+        session.execute(delete(Lease).where(Lease.name == name, Lease.owner == owner))
+        session.commit()
+
+def live_leases(prefix: str, url: str = DATABASE_URL) -> Dict[str, str]:
+    """Unexpired leases whose name starts with prefix, as name -> owner."""
+    with make_session(url) as session:
+        rows = session.execute(select(Lease.name, Lease.owner)
+                               .where(Lease.name.startswith(prefix), Lease.expires_at >= datetime.utcnow()))
+        return {name: owner for name, owner in rows}
+
+# --------- Run history ---------
+def create_run(run_id: str, source: str, tenant_id: str | None = None, url: str = DATABASE_URL) -> None:
+    with make_session(url) as session:
+        session.add(Run(id=run_id, tenant_id=tenant_id, source=source, status="queued", requests=1,
+                        pages_done=0, events_created=0, created_at=datetime.utcnow()))
+        session.commit()
+
+def join_run(run_id: str, url: str = DATABASE_URL) -> None:
+    with make_session(url) as session:
+        session.execute(update(Run).where(Run.id == run_id).values(requests=Run.requests + 1))
+        session.commit()
+
+def start_run(run_id: str, url: str = DATABASE_URL) -> None:
+    with make_session(url) as session:
+        session.execute(update(Run).where(Run.id == run_id).values(status="running", started_at=datetime.utcnow()))
+        session.commit()
+
+def add_run_pages(run_id: str, results: Iterable[Dict[str, Any]], url: str = DATABASE_URL) -> None:
+    """Append per-page results ({"page_id", "title", "events", "errors"?, "recovered"?}) and bump progress."""
+    rows = [RunPage(run_id=run_id, page_id=r["page_id"], title=r.get("title"), event_ids=json.dumps(r.get("events", [])),
+                    errors=json.dumps(r["errors"]) if r.get("errors") else None,
+                    recovered=bool(r.get("recovered")), created_at=datetime.utcnow()) for r in results]
+    if not rows:
+        return
+    created = sum(len(r.get("events", [])) for r in results if not r.get("recovered"))
+    with make_session(url) as session:
+        session.add_all(rows)
+        session.execute(update(Run).where(Run.id == run_id)
+                        .values(pages_done=Run.pages_done + len(rows), events_created=Run.events_created + created))
+        session.commit()
+
+def finish_run(run_id: str, status: str, pages_fetched: int | None = None, skipped: int | None = None,
+               error: str | None = None, url: str = DATABASE_URL) -> None:
+    with make_session(url) as session:
+        session.execute(update(Run).where(Run.id == run_id).values(
+            status=status, pages_fetched=pages_fetched, skipped=skipped,
+            error=error[:2000] if error else None, finished_at=datetime.utcnow()))
+        session.commit()
+
+def get_run(run_id: str, url: str = DATABASE_URL) -> Tuple[Run | None, List[RunPage]]:
+    with make_session(url) as session:
+        run = session.get(Run, run_id)
+        if run is None:
+            return None, []
+        return run, list(session.scalars(select(RunPage).where(RunPage.run_id == run_id).order_by(RunPage.id)))
+
+def prune_runs(keep: int, url: str = DATABASE_URL) -> None:
+    """Keep only the newest `keep` finished runs (and their pages)."""
+    with make_session(url) as session:
+        cutoff = session.scalar(select(Run.created_at).where(Run.finished_at.is_not(None))
+                                .order_by(Run.created_at.desc()).offset(keep).limit(1))
+        if cutoff is None:
+            return
+        old = select(Run.id).where(Run.finished_at.is_not(None), Run.created_at <= cutoff)
+        session.execute(delete(RunPage).where(RunPage.run_id.in_(old)))
+        session.execute(delete(Run).where(Run.id.in_(old)))
+        session.commit()
@@ -0,0 +1,158 @@
+"""
+Offline what-if planner: place a Notion export's tasks around a busy-calendar
+snapshot with the live allocator and the heuristic breakdown. No API is called.
+
+    python -m app.simulate tasks.json --busy busy.ics > plan.jsonl
+    python -m app.simulate tasks.json --busy busy.ics --format ics -o plan.ics --start 2025-01-06T08:00
+
+tasks.json is a databases.query response (or a list of its pages). JSONL output has
+one line per placed subtask, ordered by start, then a {"summary": ...} line; the
+summary (overflow, lateness, utilization) is also printed to stderr. With a fixed
+--start the output is deterministic, so it can serve as a regression oracle.
+"""
+from __future__ import annotations
+import argparse, json, sys, time as _time
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+import pytz
+from dateutil import parser as dtparser
+
+from app import ics
+from app.allocator import SlotRequest, Placement, FreeTime, allocate, horizon_for
+from app.config import Config, load_config, _parse_time
+from app.scheduler import _parse_due
+from app.services.notion import NotionTasks, PLANNED_PROP, DUE_PROP
+from app.services.planner import _fallback_breakdown
+
+@dataclass
+class Simulation:
+    placements: List[Placement]  # ordered by start
+    dues: Dict[str, datetime]
+    start: datetime
+    summary: Dict[str, Any]
+
+def load_pages(data: Any) -> List[Dict[str, Any]]:
+    return data.get("results", []) if isinstance(data, dict) else list(data)
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def simulate(pages: List[Dict[str, Any]], busy_ics: Optional[str], cfg: Config, start: Optional[datetime] = None,
+             include_planned: bool = False, strategy: str = "first", slack_days: int = 7) -> Simulation:
+    t0 = _time.perf_counter()
+    tz = pytz.timezone(cfg.tz)
+    start = start.astimezone(tz) if start else datetime.now(tz)
+    notion = NotionTasks(None, cfg.notion_db_id)
+
+    requests: List[SlotRequest] = []
+    dues: Dict[str, datetime] = {}
+    skipped = {"no_due": 0, "planned": 0}
+    for page in pages:
+        if page.get("archived") or page.get("in_trash"):
+            continue
+        props = page.get("properties", {})
+        if not include_planned and props.get(PLANNED_PROP, {}).get("checkbox"):
+            skipped["planned"] += 1
+            continue
+        due_iso = notion.due_of(page) if DUE_PROP in props else None
+        if not due_iso:
+            skipped["no_due"] += 1
+            continue
+        due = _parse_due(due_iso, tz)  # same reading of date-only dues as the live poller
+        dues[page["id"]] = due
+        title = notion.title_of(page)
+        for seq, sub in enumerate(_fallback_breakdown(title, notion.needs_breakdown(page), notion.est_of(page))):
+            requests.append(SlotRequest(page["id"], f"{title} — {sub.title}", sub.minutes, due, seq))
+
+    if not requests:
+        return Simulation([], dues, start, {"tasks": len(dues), "subtasks": 0, "skipped": skipped})
+
+    horizon_end = horizon_for(dues.values(), cfg.work_start, cfg.work_end, cfg.tz, slack=timedelta(days=slack_days))
+    busy = ics.parse_busy(busy_ics, cfg.tz, start, horizon_end) if busy_ics else []
+    free = FreeTime.from_busy(busy, start, horizon_end, cfg.work_start, cfg.work_end, cfg.tz)
+    capacity = sum(e - s for s, e in zip(free.starts, free.ends))
+    placements = sorted(allocate(requests, free, start, horizon_end, cfg.work_start, cfg.tz, strategy),
+                        key=lambda p: (p.start, p.request.key, p.request.seq))
+
+    lateness = [(p.end - p.request.due).total_seconds() / 60 for p in placements if p.end > p.request.due]
+    booked = sum(p.request.minutes for p in placements)
+    summary = {
+        "tasks": len(dues),
+        "subtasks": len(placements),
+        "skipped": skipped,
+        "busy_intervals": len(busy),
+        "minutes": booked,
+        "capacity_min": capacity,
+        "utilization": round(booked / capacity, 4) if capacity else None,
+        "overflow": sum(p.overflow for p in placements),
+        "late_subtasks": len(lateness),
+        "late_tasks": len({p.request.key for p in placements if p.end > p.request.due}),
+        "lateness_min": {"p50": round(_pct(lateness, 0.5), 1), "p95": round(_pct(lateness, 0.95), 1),
+                         "max": round(max(lateness, default=0.0), 1)},
+        "start": start.isoformat(),
+        "finish": placements[-1].end.isoformat() if placements else None,
+        "horizon_end": horizon_end.isoformat(),
+        "elapsed_ms": round((_time.perf_counter() - t0) * 1000, 1),
+    }
+    return Simulation(placements, dues, start, summary)
+
+def iter_jsonl(sim: Simulation) -> Iterator[str]:
+    for p in sim.placements:
+        late = max(0.0, (p.end - p.request.due).total_seconds() / 60)
+        yield json.dumps({"page_id": p.request.key, "seq": p.request.seq, "title": p.request.title,
+                          "start": p.start.isoformat(), "end": p.end.isoformat(),
+                          "due": p.request.due.isoformat(), "overflow": p.overflow,
+                          "late_min": round(late, 1)}, ensure_ascii=False) + "\n"
+    yield json.dumps({"summary": sim.summary}) + "\n"
+
+def iter_ics(sim: Simulation) -> Iterator[str]:
+    yield ics.CALENDAR_HEADER
+    for p in sim.placements:
+        title = f"⚠️ {p.request.title}" if p.overflow else p.request.title
+        yield ics.vevent(f"{p.request.key}-{p.request.seq}@task2cal-sim", title, p.start, p.end,
+                         f"Simulated; due {p.request.due.isoformat()}", stamp=sim.start)
+    yield ics.CALENDAR_FOOTER
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(prog="python -m app.simulate", description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("tasks", help="Notion export (databases.query JSON), '-' for stdin")
+    ap.add_argument("--busy", help="ICS snapshot of busy time")
+    ap.add_argument("--format", choices=("jsonl", "ics"), default="jsonl")
+    ap.add_argument("-o", "--output", help="write here instead of stdout")
+    ap.add_argument("--start", help="simulate as if now were this ISO time (default: now)")
+    ap.add_argument("--tz")
+    ap.add_argument("--work-start")
+    ap.add_argument("--work-end")
+    ap.add_argument("--strategy", choices=("first", "best"), default="first")
+    ap.add_argument("--slack-days", type=int, default=7, help="room after the last due for overflow")
+    ap.add_argument("--include-planned", action="store_true", help="also place pages already marked Planned?")
+    args = ap.parse_args(argv)
+
+    cfg = load_config()
+    cfg = replace(cfg, tz=args.tz or cfg.tz,
+                  work_start=_parse_time(args.work_start) if args.work_start else cfg.work_start,
+                  work_end=_parse_time(args.work_end) if args.work_end else cfg.work_end)
+    pages = load_pages(json.load(sys.stdin if args.tasks == "-" else open(args.tasks, encoding="utf-8")))
+    busy = open(args.busy, encoding="utf-8").read() if args.busy else None
+    start = dtparser.isoparse(args.start) if args.start else None
+    if start is not None and start.tzinfo is None:
+        start = pytz.timezone(cfg.tz).localize(start)
+
+    sim = simulate(pages, busy, cfg, start, args.include_planned, args.strategy, args.slack_days)
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        for chunk in (iter_ics(sim) if args.format == "ics" else iter_jsonl(sim)):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps(sim.summary, indent=2), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
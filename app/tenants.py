@@ -0,0 +1,215 @@
+from __future__ import annotations
+import argparse, asyncio, json, logging, math, sys
+from functools import partial
+from typing import Dict, List, Optional
+
+from app.config import Config, load_config, config_for_tenant
+from app.services.executor import run_blocking
+from app.services.gcal import CredentialsUnusable
+from app.services.leases import LeaseStore, lease_store
+from app.services.storage import list_tenants, upsert_tenant
+from app.metrics import Gauge, Counter
+
+# Multi-tenant polling. Every replica heartbeats a "replica:<id>" lease; tenants are
+# claimed through "tenant:<id>" leases, each replica taking at most its fair share
+# (ceil(tenants / live replicas)), so N replicas split the tenants without overlap and
+# a dead replica's tenants are picked up once its leases expire. A lease is never handed
+# back while its tenant's cycle is running, a cycle whose lease is lost is cancelled, and
+# each commit re-checks the lease first, so two replicas never write for one tenant.
+
+log = logging.getLogger("tenants")
+
+TENANTS_OWNED = Gauge("tenants_owned", "Tenants leased by this replica")
+TENANT_CYCLES = Counter("tenant_cycles_total", "Per-tenant cycles by outcome")
+
+REPLICA_PREFIX = "replica:"
+TENANT_PREFIX = "tenant:"
+
+class TenantPool:
+    """Claims a fair share of tenants and runs their cycles on a bounded set of workers."""
+    def __init__(self, cfg: Config, store: LeaseStore | None = None):
+        self.cfg = cfg
+        self.store = store or lease_store()
+        self.owner = cfg.replica_id
+        self.ttl = cfg.lease_ttl_sec
+        self.owned: set[str] = set()
+        self._limit = asyncio.Semaphore(cfg.tenant_workers)
+        self._running: Dict[str, asyncio.Task] = {}
+
+    # --- leases (blocking; called through run_blocking) ---
+    def heartbeat(self) -> set[str]:
+        """Keep this replica and its tenants alive; drop and return tenants whose lease was lost."""
+        self.store.acquire(REPLICA_PREFIX + self.owner, self.owner, self.ttl)
+        lost = set()
+        for tid in list(self.owned):
+            if not self.store.renew(TENANT_PREFIX + tid, self.owner, self.ttl):
+                log.warning("Lost lease for tenant %s", tid)
+                self.owned.discard(tid)
+                lost.add(tid)
+        TENANTS_OWNED.set(len(self.owned))
+        return lost
+
+    def rebalance(self, tenant_ids: List[str], busy: frozenset[str] = frozenset()) -> set[str]:
+        """Claim free tenants up to our share and hand back any excess that isn't mid-cycle (`busy`)."""
+        self.heartbeat()
+        replicas = max(1, len(self.store.live(REPLICA_PREFIX)))
+        share = math.ceil(len(tenant_ids) / replicas)
+        held = self.store.live(TENANT_PREFIX)
+        wanted = set(tenant_ids)
+        for tid in list(self.owned - busy):
+            if tid not in wanted:  # deleted or disabled
+                self.store.release(TENANT_PREFIX + tid, self.owner)
+                self.owned.discard(tid)
+        # busy tenants are handed back on a later tick, once their cycle is done
+        while len(self.owned) > share and self.owned - busy:
+            tid = max(self.owned - busy)
+            self.store.release(TENANT_PREFIX + tid, self.owner)
+            self.owned.discard(tid)
+        for tid in tenant_ids:
+            if len(self.owned) >= share:
+                break
+            if tid not in self.owned and TENANT_PREFIX + tid not in held:
+                if self.store.acquire(TENANT_PREFIX + tid, self.owner, self.ttl):
+                    self.owned.add(tid)
+        TENANTS_OWNED.set(len(self.owned))
+        return set(self.owned)
+
+    def release_all(self) -> None:
+        for tid in list(self.owned):
+            self.store.release(TENANT_PREFIX + tid, self.owner)
+        self.owned.clear()
+        self.store.release(REPLICA_PREFIX + self.owner, self.owner)
+        TENANTS_OWNED.set(0)
+
+    # --- cycles ---
+    def _busy(self) -> frozenset[str]:
+        return frozenset(tid for tid, task in self._running.items() if not task.done())
+
+    async def _stop(self, tenant_ids) -> None:
+        """Cancel the cycles of tenants we no longer own and wait until they have unwound."""
+        tasks = [t for tid in tenant_ids if (t := self._running.get(tid)) is not None and not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def beat(self) -> None:
+        """Heartbeat job: renew the leases, cancelling any cycle whose lease was lost."""
+        await self._stop(await run_blocking(self.heartbeat))
+
+    async def _still_owned(self, tenant_id: str) -> bool:
+        # renewing doubles as the check: it only succeeds while the lease is still ours
+        if await run_blocking(self.store.renew, TENANT_PREFIX + tenant_id, self.owner, self.ttl):
+            return True
+        log.warning("Lost lease for tenant %s; abandoning its cycle", tenant_id)
+        self.owned.discard(tenant_id)
+        return False
+
+    async def tick(self) -> Dict[str, str]:
+        """Rebalance, then start a cycle for every owned tenant that isn't already running one."""
+        tenants = {t.id: t for t in await run_blocking(list_tenants)}
+        owned = await run_blocking(self.rebalance, sorted(tenants), self._busy())
+        await self._stop(self._busy() - owned)  # leases lost during the rebalance
+        started = {}
+        for tid in sorted(owned):
+            task = self._running.get(tid)
+            if task is not None and not task.done():
+                started[tid] = "busy"
+                continue
+            if tid not in tenants:
+                continue  # disabled mid-cycle; its lease goes back on the next tick
+            try:
+                cfg = config_for_tenant(tenants[tid], self.cfg)
+            except ValueError as e:
+                log.error("Skipping tenant %s: %s", tid, e)
+                started[tid] = "error"
+                continue
+            self._running[tid] = asyncio.create_task(self._cycle(cfg), name=f"tenant-{tid}")
+            started[tid] = "started"
+        return started
+
+    async def _cycle(self, cfg: Config) -> None:
+        from app.scheduler import run_once, CycleAborted
+        from app.replan import replan
+        async with self._limit:
+            tid = cfg.tenant_id
+            if tid not in self.owned:
+                return  # lease lost while queued for a worker
+            guard = partial(self._still_owned, tid)
+            try:
+                if cfg.replan and await guard():
+                    await replan(cfg)
+                await run_once(cfg=cfg, guard=guard)
+                TENANT_CYCLES.inc(outcome="ok")
+            except CycleAborted:
+                TENANT_CYCLES.inc(outcome="lease_lost")
+            except asyncio.CancelledError:
+                TENANT_CYCLES.inc(outcome="cancelled")
+                raise
+            except CredentialsUnusable as e:
+                # retrying every tick can't fix a revoked or missing token; `add` re-enables it
+                TENANT_CYCLES.inc(outcome="bad_credentials")
+                log.error("Disabling tenant %s until its Google token is replaced: %s", tid, e)
+                await run_blocking(upsert_tenant, tid, enabled=False)
+            except Exception:
+                TENANT_CYCLES.inc(outcome="error")
+                log.exception("Cycle failed for tenant %s", cfg.tenant_id)
+
+    async def close(self, timeout: float = 10.0) -> None:
+        running = [t for t in self._running.values() if not t.done()]
+        if running:
+            await asyncio.wait(running, timeout=timeout)
+        await self._stop(list(self._running))  # never hand a lease back under a live cycle
+        await run_blocking(self.release_all)
+
+_pool: Optional[TenantPool] = None
+
+def get_pool(cfg: Config | None = None) -> TenantPool:
+    global _pool
+    if _pool is None:
+        _pool = TenantPool(cfg or load_config())
+    return _pool
+
+async def tick() -> Dict[str, str]:
+    return await get_pool().tick()
+
+async def heartbeat() -> None:
+    await get_pool().beat()
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+# --------- CLI ---------
+def main(argv=None) -> None:
+    """
+    python -m app.tenants add TENANT_ID tenant.json   # fields of the tenants table, as JSON
+    python -m app.tenants list
+    python -m app.tenants disable TENANT_ID
+    """
+    ap = argparse.ArgumentParser(prog="python -m app.tenants")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    add = sub.add_parser("add", help="create or update a tenant from a JSON file ('-' for stdin)")
+    add.add_argument("tenant_id")
+    add.add_argument("file")
+    sub.add_parser("list")
+    dis = sub.add_parser("disable")
+    dis.add_argument("tenant_id")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "add":
+        fields = json.load(sys.stdin if args.file == "-" else open(args.file))
+        calendars = [fields.get("gcal_id"), *fields.get("block_calendar_ids", [])]
+        if not fields.get("gcal_id") or "primary" in calendars:
+            # ledger rows and sync state are keyed by calendar id, so aliases would collide across tenants
+            ap.error("gcal_id and block_calendar_ids must be explicit calendar ids, not 'primary'")
+        upsert_tenant(args.tenant_id, enabled=True, **fields)
+    elif args.cmd == "disable":
+        upsert_tenant(args.tenant_id, enabled=False)
+    else:
+        for t in list_tenants(enabled_only=False):
+            print(f"{t.id}\t{'enabled' if t.enabled else 'disabled'}\t{t.notion_db_id}\t{t.gcal_id}\t{t.tz or ''}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+from __future__ import annotations
+import asyncio, json, random, threading, time, uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.services.notion import (NotionTasks, PAGE_SIZE, TITLE_PROP, DUE_PROP, PLANNED_PROP,
+                                 BREAKDOWN_PROP, EST_MIN_PROP, NOTES_PROP)
+
+# In-process stand-ins for Notion, Google Calendar and Gemini. Each one sleeps for a
+# configurable latency per request and counts its calls, so run_once can be driven
+# offline with realistic round-trip costs.
+
+class CallLog:
+    """Thread-safe call counter shared by the fakes of one benchmark run."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Counter = Counter()
+
+    def hit(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    def total(self, prefix: str = "") -> int:
+        return sum(n for k, n in self.counts.items() if k.startswith(prefix))
+
+TITLES = ["Write report and review notes", "Email vendor", "Design onboarding flow",
+          "Research pricing; draft proposal", "Clean up backlog", "Study for exam and outline essay"]
+
+def make_pages(n: int, now: datetime, horizon_days: int = 21, seed: int = 0, tag: str = "") -> List[Dict[str, Any]]:
+    """n unplanned Notion pages shaped like databases.query results; `tag` keeps titles unique per run."""
+    rnd = random.Random(seed)
+    pages = []
+    for i in range(n):
+        due = (now + timedelta(days=rnd.randint(1, horizon_days))).date().isoformat()
+        pages.append({
+            "id": f"page{tag}-{i:05d}",
+            "parent": {"type": "database_id", "database_id": "fake-db"},
+            "last_edited_time": now.strftime("%Y-%m-%dT%H:%M:00.000Z"),
+            "properties": {
+                TITLE_PROP: {"title": [{"plain_text": f"{rnd.choice(TITLES)} #{tag}{i}"}]},
+                DUE_PROP: {"date": {"start": due}},
+                PLANNED_PROP: {"checkbox": False},
+                BREAKDOWN_PROP: {"checkbox": rnd.random() < 0.5},
+                EST_MIN_PROP: {"number": None},
+                NOTES_PROP: {"rich_text": []},
+            },
+        })
+    return pages
+
+class FakeNotion(NotionTasks):
+    """AsyncNotionTasks stand-in: paginated queries and page updates with latency."""
+    def __init__(self, pages: List[Dict[str, Any]], log: CallLog, latency: float = 0.15):
+        self.pages = pages
+        self.log = log
+        self.latency = latency
+        self.db = "fake-db"
+        self.planned_at: Dict[str, float] = {}
+
+    async def iter_new(self, since: Optional[str] = None):
+        # like the real query: unplanned pages, earliest due first
+        pending = sorted((p for p in self.pages if p["id"] not in self.planned_at), key=self.due_of)
+        for lo in range(0, max(len(pending), 1), PAGE_SIZE):
+            self.log.hit("notion.query")
+            await asyncio.sleep(self.latency)
+            for page in pending[lo:lo + PAGE_SIZE]:
+                yield page
+
+    async def fetch_new(self, since: Optional[str] = None):
+        return [p async for p in self.iter_new(since)]
+
+    async def iter_pages(self, page_ids: List[str]):
+        wanted = set(page_ids)
+        for page in self.pages:
+            if page["id"] in wanted and page["id"] not in self.planned_at:
+                self.log.hit("notion.retrieve")
+                await asyncio.sleep(self.latency)
+                yield page
+
+    async def update_properties(self, page_id: str, properties: Dict[str, Any]) -> None:
+        self.log.hit("notion.update")
+        await asyncio.sleep(self.latency)
+        self.planned_at[page_id] = time.perf_counter()
+
+    async def mark_planned(self, page_id: str, event_ids: List[str]) -> None:
+        # inline path (NOTION_WRITE_BEHIND=0); the inherited one is the sync client's
+        await self.update_properties(page_id, self.planned_properties(event_ids))
+
+class FakeHttpError(Exception):
+    """Shaped like googleapiclient's HttpError as far as app.services.ratelimit looks (.resp.status)."""
+    class _Resp(dict):
+        def __init__(self, status: int):
+            super().__init__()
+            self.status = status
+
+    def __init__(self, status: int, reason: str = ""):
+        super().__init__(f"HTTP {status} {reason}".strip())
+        self.resp = self._Resp(status)
+
+class _Call:
+    def __init__(self, log: CallLog, name: str, latency: float, fn, cal: "FakeCalendar | None" = None):
+        self.log, self.name, self.latency, self.fn, self.cal = log, name, latency, fn, cal
+
+    def run(self):
+        # an injected fault either replaces the call or, with after=True, is raised once it has taken effect
+        fault = self.cal._fault(self.name) if self.cal is not None else None
+        if fault is not None and not fault[1]:
+            raise fault[0]
+        result = self.fn()
+        if fault is not None:
+            raise fault[0]
+        return result
+
+    def execute(self, http=None, num_retries=0):
+        self.log.hit(self.name)
+        time.sleep(self.latency)
+        return self.run()
+
+class _Batch:
+    def __init__(self, cal: "FakeCalendar", callback):
+        self.cal, self.callback, self.calls = cal, callback, []
+
+    def add(self, request: _Call, request_id: str, callback=None):
+        self.calls.append((request, request_id))
+
+    def execute(self, http=None):
+        self.cal.log.hit("gcal.batch")
+        time.sleep(self.cal.latency)
+        fault = self.cal._fault("gcal.batch")
+        if fault is not None and not fault[1]:
+            raise fault[0]
+        for req, rid in self.calls:
+            try:
+                response, error = req.run(), None
+            except Exception as e:
+                response, error = None, e
+            self.callback(rid, response, error)
+        if fault is not None:
+            raise fault[0]
+
+class FakeCalendar:
+    """
+    Calendar service stand-in for freebusy()/events()/new_batch_http_request().
+    `density` is the fraction of each day covered by pre-existing meetings.
+    Inserts honor a client-supplied id and answer 409 when it already exists;
+    fail() injects errors into the next calls of one kind.
+    """
+    def __init__(self, log: CallLog, latency: float = 0.12, density: float = 0.4, seed: int = 0):
+        self.log = log
+        self.latency = latency
+        self.density = density
+        self.rnd = random.Random(seed)
+        self._ids = 0
+        self._prefix = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self.store: Dict[str, Dict[str, Any]] = {}  # event id -> body, with a change sequence for sync tokens
+        self._seq = 0
+        self._faults: List[List[Any]] = []  # [call name, error, after, remaining]
+
+    def fail(self, call: str, status: int, times: int = 1, after: bool = False) -> None:
+        """Make the next `times` calls named `call` (e.g. "gcal.insert", "gcal.batch") raise HTTP `status`;
+        with after=True the call takes effect first, like a response lost on the way back."""
+        with self._lock:
+            self._faults.append([call, FakeHttpError(status), after, times])
+
+    def _fault(self, call: str):
+        with self._lock:
+            for f in self._faults:
+                if f[0] == call and f[3] > 0:
+                    f[3] -= 1
+                    return f[1], f[2]
+        return None
+
+    def _busy(self, start: datetime, end: datetime) -> List[Dict[str, str]]:
+        out = []
+        cur = start
+        while cur < end:
+            length = timedelta(minutes=self.rnd.choice([30, 45, 60, 90]))
+            if self.rnd.random() < self.density:
+                out.append({"start": cur.isoformat(), "end": min(cur + length, end).isoformat()})
+            cur += length
+        return out
+
+    def freebusy(self):
+        cal = self
+
+        class _FreeBusy:
+            def query(self, body):
+                start = datetime.fromisoformat(body["timeMin"])
+                end = datetime.fromisoformat(body["timeMax"])
+                return _Call(cal.log, "gcal.freebusy", cal.latency, lambda: {
+                    "calendars": {it["id"]: {"busy": cal._busy(start, end)} for it in body["items"]}
+                })
+        return _FreeBusy()
+
+    def _save(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._seq += 1
+            self.store[event["id"]] = {**event, "_seq": self._seq}
+            return event
+
+    def _new_event(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            eid = body.get("id")
+            if eid is None:
+                self._ids += 1
+                eid = f"evt-{self._prefix}-{self._ids}"
+            elif eid in self.store:
+                raise FakeHttpError(409, "duplicate")
+        return self._save({**body, "id": eid, "status": "confirmed"})
+
+    def cancel(self, event_id: str) -> None:
+        """Someone deletes an event; like Calendar, it stays in deltas with status "cancelled"."""
+        self._save({**self.store[event_id], "status": "cancelled"})
+
+    def add_meeting(self, start: datetime, end: datetime, summary: str = "Meeting") -> Dict[str, Any]:
+        """Someone else books time (shows up in the next events.list delta)."""
+        return self._new_event({"summary": summary, "start": {"dateTime": start.isoformat()},
+                                "end": {"dateTime": end.isoformat()}})
+
+    def _changes(self, sync_token: Optional[str]) -> Dict[str, Any]:
+        since = int(sync_token or 0)
+        with self._lock:
+            items = [{k: v for k, v in ev.items() if k != "_seq"} for ev in self.store.values() if ev["_seq"] > since]
+            return {"items": items, "nextSyncToken": str(self._seq)}
+
+    def events(self):
+        cal = self
+
+        class _Events:
+            def insert(self, calendarId, body):
+                return _Call(cal.log, "gcal.insert", cal.latency, lambda: cal._new_event(body), cal)
+
+            def get(self, calendarId, eventId):
+                def fn():
+                    if eventId not in cal.store:
+                        raise FakeHttpError(404, "notFound")
+                    return {k: v for k, v in cal.store[eventId].items() if k != "_seq"}
+                return _Call(cal.log, "gcal.get", cal.latency, fn, cal)
+
+            def list(self, calendarId, syncToken=None, **params):
+                return _Call(cal.log, "gcal.list", cal.latency, lambda: cal._changes(syncToken), cal)
+
+            def patch(self, calendarId, eventId, body):
+                return _Call(cal.log, "gcal.patch", cal.latency,
+                             lambda: cal._save({**cal.store[eventId], **body}), cal)
+        return _Events()
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+class FakeGenAI:
+    """Drop-in for the google.generativeai module used by app.services.planner."""
+    def __init__(self, log: CallLog, latency: float = 1.5):
+        self.log = log
+        self.latency = latency
+
+    def configure(self, api_key: str) -> None:
+        pass
+
+    def GenerativeModel(self, name: str):
+        genai = self
+
+        class _Model:
+            def generate_content(self, prompt: str):
+                genai.log.hit("gemini.generate")
+                time.sleep(genai.latency)
+                payload = json.loads(prompt.split("INPUT:\n", 1)[1].split("\n\n", 1)[0])
+                n = 3 if payload["breakdown_requested"] else 1
+                text = json.dumps({"subtasks": [{"title": f"part {i + 1}", "minutes": 45} for i in range(n)]})
+                part = type("Part", (), {"text": text})
+                content = type("Content", (), {"parts": [part]})
+                return type("Resp", (), {"candidates": [type("Cand", (), {"content": content})]})
+        return _Model()
@@ -0,0 +1,98 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import the app, to answer
+/healthz under uvicorn, and to build its first Calendar client.
+
+    python -m bench.startup --runs 5
+
+Each measurement runs in a new interpreter so nothing is warm. It also lists any
+heavy SDK that got imported at startup (they should all load lazily).
+
+Notes: what `import app.main` still pays for (python -X importtime, about 1 s total):
+- FastAPI/Starlette/pydantic, about 0.5 s. The app can't start without them.
+- SQLAlchemy, about 0.3 s, plus 0.05 s to declare the ORM models in app.services.storage.
+  Nearly every module imports storage at the top (scheduler, runs, outbox, push, tenants,
+  planner), and the lifespan, the first poll and GET /runs all need the database, so
+  deferring it would move the cost to the first request, not remove it. It stays eager.
+- NumPy (about 0.1 s, app.freetime) loads with the first cycle, not at import.
+"""
+from __future__ import annotations
+import argparse, json, os, socket, statistics, subprocess, sys, tempfile, time, urllib.request
+
+HEAVY = ("google.generativeai", "googleapiclient", "google_auth_oauthlib", "notion_client", "apscheduler", "httplib2",
+         "numpy")
+
+IMPORT_PROBE = f"""
+import json, sys, time
+t = time.perf_counter()
+import app.main
+print(json.dumps({{"import_s": time.perf_counter() - t,
+                  "heavy": [m for m in {HEAVY!r} if m in sys.modules]}}))
+"""
+
+CALENDAR_PROBE = """
+import json, time
+t = time.perf_counter()
+import httplib2
+from app.services.gcal import _build_calendar
+_build_calendar(httplib2.Http())
+print(json.dumps({"calendar_build_s": time.perf_counter() - t}))
+"""
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.update(DATABASE_URL=f"sqlite:///{tempfile.mkdtemp(prefix='startup-')}/bench.db",
+               PUSH_MODE="0", MULTI_TENANT="0", POLL_INTERVAL_SEC="3600")
+    return env
+
+def _probe(code: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", code], env=_env(), capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _time_to_healthz(timeout: float = 60.0) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+                            env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError("uvicorn never answered /healthz")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    imports = [_probe(IMPORT_PROBE) for _ in range(args.runs)]
+    calendar = [_probe(CALENDAR_PROBE)["calendar_build_s"] for _ in range(args.runs)]
+    healthz = [_time_to_healthz() for _ in range(args.runs)]
+    row = {
+        "import_s": round(statistics.median(r["import_s"] for r in imports), 3),
+        "healthz_s": round(statistics.median(healthz), 3),
+        "calendar_build_s": round(statistics.median(calendar), 3),
+        "heavy_at_startup": sorted({m for r in imports for m in r["heavy"]}),
+    }
+    if args.json:
+        print(json.dumps(row))
+        return
+    print(f"import app.main      {row['import_s']:>7} s (median of {args.runs})")
+    print(f"first /healthz       {row['healthz_s']:>7} s")
+    print(f"first Calendar build {row['calendar_build_s']:>7} s")
+    print(f"heavy SDKs at start  {', '.join(row['heavy_at_startup']) or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os, tempfile
+
+# storage binds DATABASE_URL at import time, so point it at a scratch database first;
+# no Gemini key means the planner uses its heuristic breakdown
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='task2cal-tests-')}/test.db"
+os.environ["GEMINI_API_KEY"] = ""
+
+import dataclasses, uuid
+from datetime import time
+
+import pytest
+
+from app.config import load_config
+from app.services.ratelimit import GCAL
+from app.services.notion import TITLE_PROP, DUE_PROP, PLANNED_PROP, BREAKDOWN_PROP, EST_MIN_PROP, NOTES_PROP
+from bench.fakes import CallLog, FakeCalendar, FakeNotion
+
+def make_page(title: str, due: str, minutes: int = 60, page_id: str | None = None) -> dict:
+    return {
+        "id": page_id or f"page-{uuid.uuid4().hex[:12]}",
+        "parent": {"type": "database_id", "database_id": "fake-db"},
+        "last_edited_time": "2025-01-01T00:00:00.000Z",
+        "properties": {
+            TITLE_PROP: {"title": [{"plain_text": title}]},
+            DUE_PROP: {"date": {"start": due}},
+            PLANNED_PROP: {"checkbox": False},
+            BREAKDOWN_PROP: {"checkbox": False},
+            EST_MIN_PROP: {"number": minutes},
+            NOTES_PROP: {"rich_text": []},
+        },
+    }
+
+@pytest.fixture
+def cfg():
+    """Offline config: UTC, a 1-hour workday (00:00-01:00), a calendar id no other test uses."""
+    cal = f"cal-{uuid.uuid4().hex[:8]}"
+    return dataclasses.replace(load_config(), tz="UTC", work_start=time(0, 0), work_end=time(1, 0),
+                               gcal_id=cal, block_calendar_ids=(cal,), notion_sync="full",
+                               notion_write_behind=False, replan=False, plan_concurrency=4)
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(GCAL, "base_delay", 0.0)
+
+@pytest.fixture
+def calls():
+    return CallLog()
+
+@pytest.fixture
+def calendar(calls):
+    return FakeCalendar(calls, latency=0, density=0)
+
+def fake_notion(pages, calls) -> FakeNotion:
+    return FakeNotion(pages, calls, latency=0)
@@ -0,0 +1,54 @@
+from datetime import datetime, time, timedelta
+
+import pytz
+
+from app.allocator import FreeTime, SlotRequest, allocate
+
+UTC = pytz.utc
+MON = datetime(2030, 1, 7, tzinfo=UTC)  # a Monday
+
+def _at(day: int, hour: int, minute: int = 0) -> datetime:
+    return MON + timedelta(days=day, hours=hour, minutes=minute)
+
+def _free(busy=(), days=7):
+    # work hours 09:00-12:00 UTC
+    return FreeTime.from_busy(list(busy), MON, MON + timedelta(days=days), time(9), time(12), "UTC")
+
+def _allocate(requests, free, days=7):
+    return {p.request.key: p for p in allocate(requests, free, MON, MON + timedelta(days=days), time(9), "UTC")}
+
+def test_earliest_due_goes_first_whatever_the_input_order():
+    later = SlotRequest("later", "later", 60, _at(4, 11))
+    urgent = SlotRequest("urgent", "urgent", 60, _at(0, 11))
+    placed = _allocate([later, urgent], _free())
+    assert placed["urgent"].start == _at(0, 9) and not placed["urgent"].overflow
+    assert placed["later"].start == _at(0, 10, 5)  # after urgent plus the 5-minute buffer
+    assert placed["later"].end <= later.due
+
+def test_busy_time_and_buffer_are_respected():
+    placed = _allocate([SlotRequest("a", "a", 30, _at(0, 11))], _free(busy=[(_at(0, 9), _at(0, 10))]))
+    assert placed["a"].start == _at(0, 10, 5)
+
+def test_request_that_cannot_meet_its_due_overflows_after_it():
+    # 150 minutes due Monday 11:00, with two free hours before then
+    placed = _allocate([SlotRequest("big", "big", 150, _at(0, 11))], _free())
+    p = placed["big"]
+    assert p.overflow
+    assert p.start == _at(1, 9)  # Monday's 3-hour window can't hold it from 11:00 either
+
+def test_without_free_time_blocks_are_forced_onto_the_day_after_due_and_stack():
+    free = _free(busy=[(MON, MON + timedelta(days=7))])
+    requests = [SlotRequest("a", "a", 30, _at(1, 11)), SlotRequest("b", "b", 45, _at(1, 11))]
+    placed = _allocate(requests, free)
+    assert placed["a"].overflow and placed["b"].overflow
+    assert placed["a"].start == _at(2, 9)
+    assert placed["b"].start == placed["a"].end + timedelta(minutes=free.buffer_min)
+
+def test_allocating_in_batches_continues_on_the_same_free_time():
+    free = _free()
+    first = _allocate([SlotRequest("a", "a", 60, _at(0, 12))], free)
+    second = _allocate([SlotRequest("b", "b", 60, _at(0, 12))], free)
+    third = _allocate([SlotRequest("c", "c", 60, _at(0, 12))], free)
+    assert first["a"].start == _at(0, 9)
+    assert second["b"].start == _at(0, 10, 5) and not second["b"].overflow
+    assert third["c"].overflow and third["c"].start == _at(1, 9)
@@ -0,0 +1,41 @@
+from datetime import datetime, time
+
+import numpy as np
+import pytest
+import pytz
+
+from app.freetime import FreeGaps, free_gaps, work_windows
+
+NY = pytz.timezone("America/New_York")
+
+def _local(minutes, tz=NY):
+    return [datetime.fromtimestamp(int(m) * 60, tz) for m in minutes]
+
+@pytest.mark.parametrize("first, last", [
+    (datetime(2025, 3, 7), datetime(2025, 3, 11)),  # clocks go forward on Sunday 9 March
+    (datetime(2025, 10, 31), datetime(2025, 11, 4)),  # and back on Sunday 2 November
+])
+def test_work_windows_keep_local_hours_across_dst(first, last):
+    ws, we = work_windows(NY.localize(first), NY.localize(last), time(9), time(17), "America/New_York")
+    assert len(ws) == (last - first).days + 1
+    assert all((t.hour, t.minute) == (9, 0) for t in _local(ws))
+    assert all((t.hour, t.minute) == (17, 0) for t in _local(we))
+    assert set(we - ws) == {480}
+
+def test_free_gaps_cut_busy_time_plus_buffer():
+    ws, we = np.array([540]), np.array([1020])  # 09:00-17:00 on day zero
+    starts, ends = free_gaps(ws, we, np.array([600, 700]), np.array([660, 720]), buffer_min=5)
+    assert list(zip(starts, ends)) == [(540, 600), (665, 700), (725, 1020)]
+
+def test_free_gaps_merge_overlapping_busy_and_respect_not_before():
+    ws, we = np.array([540]), np.array([1020])
+    starts, ends = free_gaps(ws, we, np.array([600, 630]), np.array([700, 650]), buffer_min=0, not_before=560)
+    assert list(zip(starts, ends)) == [(560, 600), (700, 1020)]
+
+def test_gaps_on_the_dst_day_are_in_local_work_hours():
+    start = NY.localize(datetime(2025, 3, 9, 0, 0))
+    end = NY.localize(datetime(2025, 3, 9, 23, 0))
+    busy = [(NY.localize(datetime(2025, 3, 9, 12)), NY.localize(datetime(2025, 3, 9, 13)))]
+    gaps = FreeGaps.build(busy, start, end, time(9), time(17), "America/New_York", buffer_min=5)
+    got = [(s.strftime("%H:%M"), e.strftime("%H:%M")) for s, e in zip(_local(gaps.starts), _local(gaps.ends))]
+    assert got == [("09:00", "12:00"), ("13:05", "17:00")]
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import gcal
+from app.services.gcal import EventSlot, create_event, create_events
+
+pytestmark = pytest.mark.usefixtures("no_backoff")
+
+def _slots(n):
+    t = datetime(2030, 1, 7, 9, tzinfo=timezone.utc)
+    return [EventSlot(f"task {i}", t + timedelta(hours=i), t + timedelta(hours=i, minutes=30), "", "page-1")
+            for i in range(n)]
+
+def test_item_whose_response_was_lost_is_not_booked_twice(calendar):
+    calendar.fail("gcal.insert", 503, after=True)
+    results = create_events(calendar, "cal", _slots(3))
+    assert all(eid and err is None for eid, err in results)
+    assert len(calendar.store) == 3
+    assert {eid for eid, _ in results} == set(calendar.store)
+
+def test_batch_retried_after_ambiguous_failure_keeps_one_event_per_slot(calendar):
+    calendar.fail("gcal.batch", 503, after=True)
+    results = create_events(calendar, "cal", _slots(4))
+    assert [err for _, err in results] == [None] * 4
+    assert len(calendar.store) == 4
+
+def test_single_insert_retry_answers_with_the_client_id(calendar):
+    calendar.fail("gcal.insert", 500, after=True)
+    t = datetime(2030, 1, 7, 9, tzinfo=timezone.utc)
+    eid = create_event(calendar, "cal", "standup", t, t + timedelta(minutes=15))
+    assert list(calendar.store) == [eid]
+
+def test_client_ids_are_valid_calendar_ids():
+    eid = gcal.new_event_id()
+    assert 5 <= len(eid) <= 1024 and set(eid) <= set("0123456789abcdefghijklmnopqrstuv")
+
+class _FreeBusyService:
+    """Answers freebusy.query from a fixed calendar -> busy map and keeps every request body."""
+    def __init__(self, busy):
+        self.busy, self.bodies = busy, []
+
+    def freebusy(self):
+        svc = self
+
+        class _Query:
+            def query(self, body):
+                svc.bodies.append(body)
+                resp = {"calendars": {it["id"]: {"busy": svc.busy.get(it["id"], [])} for it in body["items"]}}
+                return type("Req", (), {"execute": lambda self: resp})()
+        return _Query()
+
+def _iso(h, m=0):
+    return datetime(2030, 1, 7, h, m, tzinfo=timezone.utc).isoformat()
+
+def test_freebusy_chunks_calendars_and_merges_their_busy_time():
+    n = 2 * gcal.FREEBUSY_LIMIT + 1
+    ids = [f"cal{i}" for i in range(n)]
+    svc = _FreeBusyService({
+        "cal0": [{"start": _iso(9), "end": _iso(10)}],
+        "cal1": [{"start": _iso(9, 30), "end": _iso(11)}],     # overlaps cal0
+        f"cal{n - 1}": [{"start": _iso(11), "end": _iso(12)},  # touches cal1, in the last chunk
+                        {"start": _iso(14), "end": _iso(15)}],
+    })
+    start = datetime(2030, 1, 7, tzinfo=timezone.utc)
+    busy = gcal.freebusy(svc, ids + ["cal0"], start, start + timedelta(days=1))
+
+    assert [len(b["items"]) for b in svc.bodies] == [gcal.FREEBUSY_LIMIT, gcal.FREEBUSY_LIMIT, 1]
+    assert [it["id"] for b in svc.bodies for it in b["items"]] == ids  # duplicates asked for once
+    assert [(s.isoformat(), e.isoformat()) for s, e in busy] == [(_iso(9), _iso(12)), (_iso(14), _iso(15))]
+
+def test_merge_intervals_coalesces_overlapping_and_touching_spans():
+    t = lambda h: datetime(2030, 1, 7, h, tzinfo=timezone.utc)
+    assert gcal.merge_intervals([(t(13), t(14)), (t(9), t(10)), (t(10), t(11)), (t(9), t(9)), (t(12), t(15))]) == [
+        (t(9), t(11)), (t(12), t(15))]
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytz
+
+from app.ics import parse_busy
+
+NY = pytz.timezone("America/New_York")
+
+def _cal(*events):
+    return "BEGIN:VCALENDAR\r\n" + "".join(f"BEGIN:VEVENT\r\n{e}\r\nEND:VEVENT\r\n" for e in events) + "END:VCALENDAR\r\n"
+
+def _busy(text, start, end):
+    return [(s.astimezone(NY), e.astimezone(NY)) for s, e in
+            sorted(parse_busy(text, "America/New_York", NY.localize(start), NY.localize(end)))]
+
+def test_weekly_rule_holds_wall_clock_time_across_dst_and_skips_exdates():
+    text = _cal("\r\n".join([
+        "DTSTART;TZID=America/New_York:20250303T090000",
+        "DTEND;TZID=America/New_York:20250303T100000",
+        "RRULE:FREQ=WEEKLY;BYDAY=MO;COUNT=4",
+        "EXDATE;TZID=America/New_York:20250317T090000",
+    ]))
+    busy = _busy(text, datetime(2025, 3, 1), datetime(2025, 4, 30))
+    # COUNT includes the excluded instance, so 3 March, 10 March and 24 March remain
+    assert [s.date().isoformat() for s, _ in busy] == ["2025-03-03", "2025-03-10", "2025-03-24"]
+    assert all((s.hour, e.hour) == (9, 10) for s, e in busy)  # 10 March is after the DST change
+
+def test_daily_rule_until_and_interval_clipped_to_the_window():
+    text = _cal("\r\n".join([
+        "DTSTART:20250106T140000Z",
+        "DURATION:PT30M",
+        "RRULE:FREQ=DAILY;INTERVAL=2;UNTIL=20250120T235959Z",
+    ]))
+    busy = _busy(text, datetime(2025, 1, 9), datetime(2025, 2, 1))
+    assert [s.day for s, _ in busy] == [10, 12, 14, 16, 18, 20]
+    assert all(int((e - s).total_seconds()) == 1800 for s, e in busy)
+
+def test_exdate_list_on_one_line():
+    text = _cal("\r\n".join([
+        "DTSTART;TZID=America/New_York:20250106T090000",
+        "DTEND;TZID=America/New_York:20250106T091500",
+        "RRULE:FREQ=DAILY;COUNT=5",
+        "EXDATE;TZID=America/New_York:20250107T090000,20250109T090000",
+    ]))
+    busy = _busy(text, datetime(2025, 1, 1), datetime(2025, 2, 1))
+    assert [s.day for s, _ in busy] == [6, 8, 10]
+
+def test_transparent_and_cancelled_events_are_not_busy():
+    text = _cal(
+        "DTSTART:20250106T140000Z\r\nDTEND:20250106T150000Z\r\nTRANSP:TRANSPARENT",
+        "DTSTART:20250106T160000Z\r\nDTEND:20250106T170000Z\r\nSTATUS:CANCELLED",
+        "DTSTART:20250106T180000Z\r\nDTEND:20250106T190000Z",
+    )
+    busy = _busy(text, datetime(2025, 1, 1), datetime(2025, 2, 1))
+    assert [(s.astimezone(pytz.utc).hour, e.astimezone(pytz.utc).hour) for s, e in busy] == [(18, 19)]
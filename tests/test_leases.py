@@ -0,0 +1,33 @@
+import threading, uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.storage import acquire_lease, renew_lease, release_lease, live_leases
+
+def _name(prefix="lease"):
+    return f"{prefix}:{uuid.uuid4().hex[:8]}"
+
+def test_exactly_one_contender_wins_a_free_lease():
+    name, n = _name(), 8
+    barrier = threading.Barrier(n)
+
+    def contend(i):
+        barrier.wait()
+        return acquire_lease(name, f"replica-{i}", 60)
+
+    with ThreadPoolExecutor(n) as pool:
+        wins = list(pool.map(contend, range(n)))
+    assert wins.count(True) == 1
+    winner = f"replica-{wins.index(True)}"
+    assert live_leases(name) == {name: winner}
+    assert acquire_lease(name, winner, 60)  # the holder may extend it
+
+def test_expired_lease_changes_hands_and_the_old_owner_cannot_renew():
+    name = _name()
+    assert acquire_lease(name, "a", -1)  # already expired
+    assert acquire_lease(name, "b", 60)
+    assert not renew_lease(name, "a", 60)
+    assert renew_lease(name, "b", 60)
+    release_lease(name, "a")  # not a's to release
+    assert live_leases(name) == {name: "b"}
+    release_lease(name, "b")
+    assert live_leases(name) == {}
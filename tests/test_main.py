@@ -0,0 +1,8 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+def test_trigger_is_refused_in_multi_tenant_mode(monkeypatch):
+    monkeypatch.setenv("MULTI_TENANT", "1")
+    resp = TestClient(app).post("/trigger")
+    assert resp.status_code == 409
@@ -0,0 +1,51 @@
+import re
+
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.main import app
+
+SAMPLE = re.compile(r'^([a-z_]+)(\{[a-z_]+="[^"]*"(?:,[a-z_]+="[^"]*")*\})? (\S+)$')
+
+def _scrape() -> str:
+    resp = TestClient(app).get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return resp.text
+
+def test_every_metric_has_help_and_type_before_its_samples():
+    metrics.UPSTREAM_CALLS.inc(upstream="test", op="scrape")
+    text = _scrape()
+    assert text.endswith("\n")
+    typed: dict[str, str] = {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name = line.split()[2]
+            assert name not in typed
+        elif line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            assert kind in ("counter", "gauge", "histogram")
+            typed[name] = kind
+        else:
+            m = SAMPLE.match(line)
+            assert m, line
+            name, stem = m.group(1), re.sub(r"_(bucket|sum|count)$", "", m.group(1))
+            float(m.group(3))
+            assert name in typed or typed.get(stem) == "histogram", line
+    assert {m.name for m in metrics.REGISTRY} == set(typed)
+    assert 'upstream_requests_total{op="scrape",upstream="test"} 1.0' in text
+
+def test_histogram_exposes_cumulative_buckets_sum_and_count():
+    for v in (0.07, 0.3, 400.0):
+        metrics.UPSTREAM_SECONDS.observe(v, upstream="test", op="histogram")
+    labels = 'op="histogram",upstream="test"'
+    lines = [l for l in _scrape().splitlines() if labels in l]
+    buckets = [(re.search(r'le="([^"]+)"', l).group(1), float(l.split()[-1]))
+               for l in lines if l.startswith("upstream_request_seconds_bucket")]
+    assert [le for le, _ in buckets] == [repr(b) for b in metrics.Histogram.DEFAULT_BUCKETS] + ["+Inf"]
+    counts = [n for _, n in buckets]
+    assert counts == sorted(counts)  # cumulative
+    assert dict(buckets)["0.05"] == 0 and dict(buckets)["0.1"] == 1 and dict(buckets)["0.5"] == 2
+    assert dict(buckets)["300.0"] == 2 and dict(buckets)["+Inf"] == 3
+    assert f"upstream_request_seconds_sum{{{labels}}} 400.37" in lines
+    assert f"upstream_request_seconds_count{{{labels}}} 3.0" in lines
@@ -0,0 +1,35 @@
+import uuid
+
+from app.services.storage import enqueue_update, due_updates, complete_update, retry_update, pending_updates
+
+def _name(prefix="page"):
+    return f"{prefix}:{uuid.uuid4().hex[:8]}"
+
+def test_outbox_coalesces_updates_per_page():
+    owner, page = _name("owner"), _name("page")
+    enqueue_update(page, {"Planned?": {"checkbox": True}}, owner)
+    enqueue_update(page, {"Calendar Event IDs": {"rich_text": []}}, owner)
+    [(page_id, props, version, attempts)] = due_updates(owner=owner)
+    assert page_id == page and version == 2 and attempts == 0
+    assert set(props) == {"Planned?", "Calendar Event IDs"}
+    assert due_updates(owner=_name("other")) == []
+
+def test_flushing_an_old_version_keeps_the_newer_update():
+    owner, page = _name("owner"), _name("page")
+    enqueue_update(page, {"a": 1}, owner)
+    [(_, _, sent_version, _)] = due_updates(owner=owner)
+    enqueue_update(page, {"b": 2}, owner)  # lands while version 1 is in flight
+    complete_update(page, sent_version)
+    retry_update(page, sent_version, "late failure", 60)  # also ignored: the row moved on
+    [(_, props, version, attempts)] = due_updates(owner=owner)
+    assert (props, version, attempts) == ({"a": 1, "b": 2}, 2, 0)
+    complete_update(page, version)
+    assert pending_updates(owner) == 0
+
+def test_failed_update_is_retried_later_or_parked():
+    owner, page = _name("owner"), _name("page")
+    enqueue_update(page, {"a": 1}, owner)
+    retry_update(page, 1, "503", 3600)
+    assert due_updates(owner=owner) == [] and pending_updates(owner) == 1
+    retry_update(page, 1, "400", None)
+    assert pending_updates(owner) == 0  # parked for inspection
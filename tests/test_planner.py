@@ -0,0 +1,30 @@
+import uuid
+
+import pytest
+
+from app.services import planner
+from app.services.storage import load_plan
+from bench.fakes import CallLog, FakeGenAI
+
+@pytest.fixture
+def gemini(monkeypatch):
+    log = CallLog()
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(planner, "genai", FakeGenAI(log, latency=0))
+    planner._model.cache_clear()
+    yield log
+    planner._model.cache_clear()
+
+def test_dry_run_reads_the_plan_cache_but_never_writes_it(gemini):
+    title = f"Write report {uuid.uuid4().hex[:8]}"
+    key = planner.plan_key(title, None, True, None)
+
+    subs = planner.breakdown(title, True, None, dry_run=True)
+    assert len(subs) == 3 and load_plan(key) is None
+
+    planner.breakdown(title, True, None)
+    assert load_plan(key) == [{"title": f"part {i}", "minutes": 45} for i in (1, 2, 3)]
+    assert gemini.counts["gemini.generate"] == 2
+
+    assert planner.breakdown(title, True, None, dry_run=True) == subs
+    assert gemini.counts["gemini.generate"] == 2  # served from the cache
@@ -0,0 +1,112 @@
+import asyncio, hashlib, hmac, json, uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.push import PushTrigger, _channel_key
+from app.services.storage import set_state
+
+SECRET = "secret_verification_token"
+DB = "1c6f2a3b-0000-4000-8000-00000000d00b"
+
+class _Recorder:
+    """Stands in for the loop's PushTrigger and keeps what the webhooks fed it."""
+    def __init__(self):
+        self.pages, self.calendars = [], []
+
+    def pages_changed(self, page_ids):
+        self.pages.extend(page_ids)
+
+    def calendars_changed(self, calendar_ids):
+        self.calendars.extend(calendar_ids)
+
+@pytest.fixture
+def trigger(monkeypatch):
+    monkeypatch.setenv("PUSH_MODE", "1")
+    monkeypatch.setenv("NOTION_WEBHOOK_SECRET", SECRET)
+    monkeypatch.setenv("NOTION_DATABASE_ID", DB)
+    recorder = _Recorder()
+    monkeypatch.setattr(main, "get_trigger", lambda cfg=None: recorder)
+    return recorder
+
+def _signed(payload) -> tuple[bytes, dict]:
+    body = json.dumps(payload).encode()
+    sig = "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return body, {"X-Notion-Signature": sig, "Content-Type": "application/json"}
+
+def _page_event(page_id: str, parent: str = DB, kind: str = "page.properties_updated") -> dict:
+    return {"type": kind, "entity": {"id": page_id, "type": "page"},
+            "data": {"parent": {"id": parent.replace("-", ""), "type": "database"}}}
+
+def test_signed_notion_event_queues_its_page(trigger):
+    body, headers = _signed(_page_event("page-1"))
+    resp = TestClient(main.app).post("/webhooks/notion", content=body, headers=headers)
+    assert resp.status_code == 200 and resp.json()["pages"] == ["page-1"]
+    assert trigger.pages == ["page-1"]
+
+def test_events_for_other_databases_and_non_pages_are_ignored(trigger):
+    client = TestClient(main.app)
+    for payload in (_page_event("page-2", parent="another-db"),
+                    {"type": "database.schema_updated", "entity": {"id": DB, "type": "database"}}):
+        body, headers = _signed(payload)
+        assert client.post("/webhooks/notion", content=body, headers=headers).json()["pages"] == []
+    assert trigger.pages == []
+
+def test_bad_signature_is_rejected_before_the_body_is_parsed(trigger):
+    client = TestClient(main.app)
+    body, headers = _signed(_page_event("page-3"))
+    headers["X-Notion-Signature"] = "sha256=" + "0" * 64
+    assert client.post("/webhooks/notion", content=body, headers=headers).status_code == 401
+    assert client.post("/webhooks/notion", content=b"{not json").status_code == 401  # unsigned, malformed
+    assert trigger.pages == []
+
+def test_signed_malformed_body_is_a_bad_request(trigger):
+    sig = "sha256=" + hmac.new(SECRET.encode(), b"{not json", hashlib.sha256).hexdigest()
+    resp = TestClient(main.app).post("/webhooks/notion", content=b"{not json", headers={"X-Notion-Signature": sig})
+    assert resp.status_code == 400
+
+def test_webhooks_are_not_found_without_push_mode(trigger, monkeypatch):
+    monkeypatch.setenv("PUSH_MODE", "0")
+    client = TestClient(main.app)
+    body, headers = _signed(_page_event("page-4"))
+    assert client.post("/webhooks/notion", content=body, headers=headers).status_code == 404
+    assert client.post("/webhooks/gcal", headers={"X-Goog-Channel-ID": "x"}).status_code == 404
+    assert trigger.pages == [] and trigger.calendars == []
+
+def test_gcal_notification_maps_its_channel_to_the_calendar(trigger, monkeypatch):
+    cal, other = f"cal-{uuid.uuid4().hex[:8]}", f"cal-{uuid.uuid4().hex[:8]}"
+    monkeypatch.setenv("GOOGLE_CALENDAR_ID", cal)
+    monkeypatch.setenv("BLOCKING_CALENDAR_IDS", other)
+    monkeypatch.setenv("GCAL_CHANNEL_TOKEN", "chan-token")
+    for cid in (cal, other):
+        set_state(_channel_key(cid), json.dumps({"id": f"chan-{cid}", "resourceId": "r", "expiration": 0}))
+    client = TestClient(main.app)
+
+    def notify(channel, state="exists", token="chan-token"):
+        return client.post("/webhooks/gcal", headers={"X-Goog-Channel-ID": channel, "X-Goog-Resource-State": state,
+                                                      "X-Goog-Channel-Token": token}).status_code
+
+    assert notify(f"chan-{other}") == 200
+    assert notify(f"chan-{cal}", state="sync") == 200  # channel confirmation
+    assert notify("chan-replaced-long-ago") == 200
+    assert notify(f"chan-{cal}", token="wrong") == 401
+    assert trigger.calendars == [other]
+
+def test_push_trigger_debounces_a_burst_into_one_run():
+    runs = []
+
+    async def run_pages(ids):
+        runs.append(ids)
+
+    async def burst():
+        trigger = PushTrigger(0.05, run_pages)
+        trigger.pages_changed(["b"])
+        trigger.pages_changed(["a", "b"])
+        await asyncio.sleep(0.1)
+        trigger.pages_changed(["c"])
+        await asyncio.sleep(0.1)
+        await trigger.stop()
+
+    asyncio.run(burst())
+    assert runs == [["a", "b"], ["c"]]
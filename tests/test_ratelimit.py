@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta, timezone
+
+from app.services.gcal import EventSlot, create_events
+from app.services.notion import NotionTasks
+from app.services.ratelimit import GCAL, NOTION, for_key
+
+def test_each_credential_gets_its_own_limiter():
+    assert for_key(NOTION, None) is NOTION and for_key(NOTION, "") is NOTION
+    assert for_key(NOTION, "secret_a") is for_key(NOTION, "secret_a")
+    assert for_key(NOTION, "secret_a") is not for_key(NOTION, "secret_b")
+    assert for_key(GCAL, "secret_a") is not for_key(NOTION, "secret_a")
+    assert "secret" not in for_key(NOTION, "secret_a").scope
+    assert NotionTasks("secret_a", "db").limiter is for_key(NOTION, "secret_a")
+
+def test_throttling_one_account_leaves_the_others_alone(calendar, monkeypatch):
+    mine, theirs = for_key(GCAL, "tenant-a-token"), for_key(GCAL, "tenant-b-token")
+    shared = GCAL._limit
+    monkeypatch.setattr(mine, "base_delay", 0.0)
+    calendar.limiter = mine
+    calendar.fail("gcal.insert", 429)
+    t = datetime(2030, 1, 7, 9, tzinfo=timezone.utc)
+    [(eid, err)] = create_events(calendar, "cal", [EventSlot("x", t, t + timedelta(minutes=30))])
+    assert eid and err is None
+    assert mine._limit < mine.max_concurrency
+    assert theirs._limit == theirs.max_concurrency and GCAL._limit == shared
@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import scheduler
+from app.replan import replan
+from app.services.planner import Subtask
+from app.services.ratelimit import GCAL
+from app.services.storage import booked_between, page_event_ids, events_overlapping
+from tests.conftest import make_page, fake_notion
+
+def test_deleted_block_frees_its_time(cfg, calls, calendar, monkeypatch):
+    due = (datetime.now(timezone.utc) + timedelta(days=5)).date()
+    page = make_page("write up", f"{due.isoformat()}T23:00:00+00:00")
+
+    async def breakdown(title, breakdown_needed, override, notes=None, dry_run=False):
+        return [Subtask("draft", 25), Subtask("edit", 25)]
+
+    monkeypatch.setattr(scheduler, "abreakdown", breakdown)
+    asyncio.run(scheduler.run_once(cfg=cfg, notion=fake_notion([page], calls), service=calendar))
+    asyncio.run(replan(cfg, service=calendar, calendar_ids=[cfg.gcal_id]))  # takes the first sync token
+
+    gone, kept = page_event_ids(page["id"])
+    interval = lambda eid: (datetime.fromisoformat(calendar.store[eid]["start"]["dateTime"]),
+                            datetime.fromisoformat(calendar.store[eid]["end"]["dateTime"]))
+    calendar.cancel(gone)
+
+    result = asyncio.run(replan(cfg, service=calendar, calendar_ids=[cfg.gcal_id]))
+    assert result["deleted"] == 1
+    assert page_event_ids(page["id"]) == [kept]
+    start, end = interval(gone)
+    assert booked_between(cfg.gcal_id, start, end) == []
+    assert [ev.event_id for ev in events_overlapping(cfg.gcal_id, [interval(gone), interval(kept)])] == [kept]
+
+@pytest.mark.usefixtures("no_backoff")
+def test_block_whose_move_failed_is_retried_on_the_next_run(cfg, calls, calendar, monkeypatch):
+    due = (datetime.now(timezone.utc) + timedelta(days=5)).date()
+    page = make_page("slides", f"{due.isoformat()}T23:00:00+00:00")
+
+    async def breakdown(title, breakdown_needed, override, notes=None, dry_run=False):
+        return [Subtask("slides", 30)]
+
+    monkeypatch.setattr(scheduler, "abreakdown", breakdown)
+    asyncio.run(scheduler.run_once(cfg=cfg, notion=fake_notion([page], calls), service=calendar))
+    asyncio.run(replan(cfg, service=calendar, calendar_ids=[cfg.gcal_id]))  # takes the first sync token
+
+    [block] = page_event_ids(page["id"])
+    start = datetime.fromisoformat(calendar.store[block]["start"]["dateTime"])
+    calendar.add_meeting(start, start + timedelta(minutes=30))
+    calendar.fail("gcal.patch", 503, times=GCAL.max_retries + 1)
+
+    first = asyncio.run(replan(cfg, service=calendar, calendar_ids=[cfg.gcal_id]))
+    assert [e["event_id"] for e in first["errors"]] == [block] and first["moved"] == []
+    assert datetime.fromisoformat(calendar.store[block]["start"]["dateTime"]) == start
+
+    second = asyncio.run(replan(cfg, service=calendar, calendar_ids=[cfg.gcal_id]))
+    assert second["errors"] == [] and [m["event_id"] for m in second["moved"]] == [block]
+    assert datetime.fromisoformat(calendar.store[block]["start"]["dateTime"]) >= start + timedelta(minutes=30)
+
+    # the collision is handled, so the token moved on
+    assert asyncio.run(replan(cfg, service=calendar, calendar_ids=[cfg.gcal_id]))["moved"] == []
@@ -0,0 +1,87 @@
+import asyncio
+
+from app.config import load_config
+from app.runs import RunCoordinator
+from app.services.storage import get_run
+
+class _Runner:
+    """Runs block until released, so the test decides when each one finishes."""
+    def __init__(self):
+        self.calls = 0
+        self.gates: list[asyncio.Event] = []
+
+    async def __call__(self, cfg, progress):
+        self.calls += 1
+        gate = asyncio.Event()
+        self.gates.append(gate)
+        await progress([{"page_id": f"p{self.calls}", "title": "t", "events": ["e"]}])
+        await gate.wait()
+        return {"pages_fetched": self.calls, "skipped": 0}
+
+async def _until(predicate):
+    while not predicate():
+        await asyncio.sleep(0.01)
+
+def test_requests_during_a_run_join_the_one_queued_behind_it():
+    async def scenario():
+        runner = _Runner()
+        coord = RunCoordinator(load_config(), runner)
+        first, joined0 = await coord.submit("trigger")
+        await _until(lambda: runner.calls == 1)
+        second, joined1 = await coord.submit("trigger")
+        third, joined2 = await coord.submit("trigger")
+        waiting = asyncio.ensure_future(coord.run("poll"))  # the poll job joins the queued run too
+        await asyncio.sleep(0.05)
+        assert runner.calls == 1  # nothing starts until the current run is done
+        runner.gates[0].set()
+        await _until(lambda: runner.calls == 2)
+        runner.gates[1].set()
+        result = await waiting
+        await coord.close()
+        return runner, (first, joined0), (second, joined1), (third, joined2), result
+
+    runner, first, second, third, result = asyncio.run(scenario())
+    assert first[1] is False and second[1] is False and third == (second[0], True)
+    assert runner.calls == 2 and result == {"pages_fetched": 2, "skipped": 0}
+    run, pages = get_run(second[0])
+    assert run.status == "ok" and run.requests == 3 and [p.page_id for p in pages] == ["p2"]
+    assert get_run(first[0])[0].requests == 1
+
+def test_failed_run_reaches_its_waiters_and_the_next_run_still_starts():
+    async def scenario():
+        calls = []
+
+        async def runner(cfg, progress):
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            return {"pages_fetched": 0, "skipped": 0}
+
+        coord = RunCoordinator(load_config(), runner)
+        try:
+            await coord.run("poll")
+        except RuntimeError as e:
+            failure = e
+        ok = await coord.run("poll")
+        await coord.close()
+        return failure, ok, len(calls)
+
+    failure, ok, calls = asyncio.run(scenario())
+    assert str(failure) == "boom" and ok["pages_fetched"] == 0 and calls == 2
+
+def test_close_cancels_the_queued_run():
+    async def scenario():
+        runner = _Runner()
+        coord = RunCoordinator(load_config(), runner)
+        await coord.submit("trigger")
+        await _until(lambda: runner.calls == 1)
+        queued, _ = await coord.submit("trigger")
+        closing = asyncio.ensure_future(coord.close(timeout=5))
+        await asyncio.sleep(0.05)
+        runner.gates[0].set()  # the in-flight run may finish; the queued one never starts
+        await closing
+        return queued, runner.calls
+
+    queued, calls = asyncio.run(scenario())
+    assert get_run(queued)[0].status == "cancelled"
+    assert calls == 1
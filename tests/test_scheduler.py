@@ -0,0 +1,182 @@
+import asyncio, dataclasses, uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import scheduler
+from app.services.ratelimit import GCAL
+from app.services.planner import Subtask
+from bench.fakes import FakeNotion
+from tests.conftest import make_page, fake_notion
+
+def _events_for(calendar, page_id):
+    return [ev for ev in calendar.store.values()
+            if ev.get("extendedProperties", {}).get("private", {}).get("page_id") == page_id]
+
+def _event_ids_for(calendar, page_id):
+    return sorted(ev["id"] for ev in _events_for(calendar, page_id))
+
+def _three_part_page(monkeypatch):
+    due = (datetime.now(timezone.utc) + timedelta(days=10)).date()
+
+    async def breakdown(title, breakdown_needed, override, notes=None, dry_run=False):
+        return [Subtask(f"part {i}", 20) for i in range(3)]
+
+    monkeypatch.setattr(scheduler, "abreakdown", breakdown)
+    return make_page("three parts", f"{due.isoformat()}T23:00:00+00:00", minutes=30)
+
+def test_slow_plan_for_urgent_page_still_gets_the_earlier_slot(cfg, calls, calendar, monkeypatch):
+    # one free hour a day; the urgent page's plan comes back last
+    now = datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).date()
+    urgent = make_page("urgent report", f"{tomorrow.isoformat()}T23:00:00+00:00")
+    later = make_page("someday cleanup", f"{(tomorrow + timedelta(days=19)).isoformat()}T23:00:00+00:00")
+
+    async def breakdown(title, breakdown_needed, override, notes=None, dry_run=False):
+        await asyncio.sleep(1.0 if "urgent" in title else 0)
+        return [Subtask(title, override)]
+
+    monkeypatch.setattr(scheduler, "abreakdown", breakdown)
+    result = asyncio.run(scheduler.run_once(cfg=cfg, notion=fake_notion([later, urgent], calls), service=calendar))
+
+    assert result["events_created"] == 2
+    [ev] = _events_for(calendar, urgent["id"])
+    assert not ev["summary"].startswith("⚠️")
+    assert datetime.fromisoformat(ev["end"]["dateTime"]) <= datetime.fromisoformat(f"{tomorrow}T23:00:00+00:00")
+    [other] = _events_for(calendar, later["id"])
+    assert other["start"]["dateTime"] > ev["start"]["dateTime"]
+
+def test_partial_booking_is_resumed_not_redone(cfg, calls, calendar, monkeypatch):
+    page = _three_part_page(monkeypatch)
+    notion = fake_notion([page], calls)
+    calendar.fail("gcal.insert", 400)  # not retryable: one of the three inserts fails for good
+
+    first = asyncio.run(scheduler.run_once(cfg=cfg, notion=notion, service=calendar))
+    assert first["events_created"] == 2 and first["processed"][0]["errors"]
+    assert page["id"] not in notion.planned_at
+
+    second = asyncio.run(scheduler.run_once(cfg=cfg, notion=notion, service=calendar))
+    assert second["events_created"] == 1
+    assert len(_events_for(calendar, page["id"])) == 3
+    assert sorted(ev["summary"] for ev in _events_for(calendar, page["id"])) == [
+        f"three parts — part {i}" for i in range(3)]
+    assert page["id"] in notion.planned_at
+    assert sorted(scheduler.page_event_ids(page["id"])) == _event_ids_for(calendar, page["id"])
+
+@pytest.mark.usefixtures("no_backoff")
+@pytest.mark.parametrize("landed", [True, False])
+def test_inserts_whose_outcome_was_lost_are_checked_before_rebooking(cfg, calls, calendar, monkeypatch, landed):
+    page = _three_part_page(monkeypatch)
+    notion = fake_notion([page], calls)
+    # every attempt of the batch errors out, after (or before) the calendar applied it
+    calendar.fail("gcal.batch", 503, times=GCAL.max_retries + 1, after=landed)
+    with pytest.raises(Exception):
+        asyncio.run(scheduler.run_once(cfg=cfg, notion=notion, service=calendar))
+    assert len(scheduler.pending_events(page["id"])) == 3
+    assert len(_events_for(calendar, page["id"])) == (3 if landed else 0)
+
+    result = asyncio.run(scheduler.run_once(cfg=cfg, notion=notion, service=calendar))
+    assert result["events_created"] == (0 if landed else 3)
+    assert len(_events_for(calendar, page["id"])) == 3
+    assert scheduler.pending_events(page["id"]) == []
+    assert sorted(scheduler.page_event_ids(page["id"])) == _event_ids_for(calendar, page["id"])
+    assert page["id"] in notion.planned_at
+
+def _watermark_run(cfg, notion, calendar, sinces):
+    inner = notion.iter_new
+
+    def iter_new(since=None):
+        sinces.append(since)
+        return inner(since)
+
+    notion.iter_new = iter_new
+    return asyncio.run(scheduler.run_once(cfg=cfg, notion=notion, service=calendar))
+
+def test_failed_page_holds_the_watermark_back_and_full_resync_runs_when_due(cfg, calls, calendar, monkeypatch):
+    async def breakdown(title, breakdown_needed, override, notes=None, dry_run=False):
+        return [Subtask(title, 20)]
+
+    monkeypatch.setattr(scheduler, "abreakdown", breakdown)
+    cfg = dataclasses.replace(cfg, notion_sync="incremental", notion_db_id=f"db-{uuid.uuid4().hex[:8]}",
+                              full_sync_interval_sec=3600, page_concurrency=1)  # commits in due order
+    due = (datetime.now(timezone.utc) + timedelta(days=5)).date()
+    failing = make_page("first", f"{due}T23:00:00+00:00")
+    newer = make_page("second", f"{due + timedelta(days=1)}T23:00:00+00:00")
+    failing["last_edited_time"] = "2025-01-01T10:00:00.000Z"
+    newer["last_edited_time"] = "2025-01-02T10:00:00.000Z"
+    notion, sinces = fake_notion([failing, newer], calls), []
+    calendar.fail("gcal.insert", 400)  # the earlier-due page's insert is rejected
+
+    first = _watermark_run(cfg, notion, calendar, sinces)
+    assert [bool(p.get("errors")) for p in first["processed"]] == [True, False]
+    assert sinces == [None]  # no full sync on record yet
+    # seen went up to the newer page, but the failed one must be fetched again
+    assert scheduler.get_state(f"notion_watermark:{cfg.notion_db_id}") == failing["last_edited_time"]
+
+    second = _watermark_run(cfg, notion, calendar, sinces)
+    assert sinces[-1] == failing["last_edited_time"]
+    assert second["events_created"] == 1 and failing["id"] in notion.planned_at
+
+    # once FULL_SYNC_INTERVAL_SEC has passed, the next poll ignores the watermark
+    stale = datetime.now(timezone.utc) - timedelta(seconds=cfg.full_sync_interval_sec + 1)
+    scheduler.set_state(f"notion_full_sync:{cfg.notion_db_id}", stale.isoformat())
+    _watermark_run(cfg, notion, calendar, sinces)
+    assert sinces[-1] is None
+    assert datetime.fromisoformat(scheduler.get_state(f"notion_full_sync:{cfg.notion_db_id}")) > stale
+
+class _CountingNotion(FakeNotion):
+    """FakeNotion that counts the pages it has handed out and can pause after the first."""
+    def __init__(self, pages, calls, after_first=None):
+        super().__init__(pages, calls, latency=0)
+        self.yielded = 0
+        self.after_first = after_first
+
+    async def iter_new(self, since=None):
+        async for page in super().iter_new(since):
+            self.yielded += 1
+            yield page
+            if self.yielded == 1 and self.after_first is not None:
+                await self.after_first()
+
+def _pages(n):
+    start = (datetime.now(timezone.utc) + timedelta(days=2)).date()
+    return [make_page(f"task {i}", f"{start + timedelta(days=i)}T23:00:00+00:00", minutes=15) for i in range(n)]
+
+def test_first_page_is_booked_while_the_rest_are_still_being_fetched(cfg, calls, calendar, monkeypatch):
+    async def breakdown(title, breakdown_needed, override, notes=None, dry_run=False):
+        return [Subtask(title, override)]
+
+    monkeypatch.setattr(scheduler, "abreakdown", breakdown)
+    pages = _pages(3)
+    booked_early = []
+
+    async def wait_for_first_booking():
+        for _ in range(200):
+            if _events_for(calendar, pages[0]["id"]):
+                booked_early.append(True)
+                return
+            await asyncio.sleep(0.01)
+
+    notion = _CountingNotion(pages, calls, after_first=wait_for_first_booking)
+    result = asyncio.run(scheduler.run_once(cfg=cfg, notion=notion, service=calendar))
+    assert booked_early and result["events_created"] == 3
+
+def test_slow_plan_holds_back_fetching_instead_of_buffering_the_backlog(cfg, calls, calendar, monkeypatch):
+    monkeypatch.setattr(scheduler, "PIPELINE_WINDOW", 4)
+    pages = _pages(12)
+    fetched_while_blocked = []
+
+    async def breakdown(title, breakdown_needed, override, notes=None, dry_run=False):
+        if title == "task 0":  # the earliest due: nothing after it can be placed yet
+            await asyncio.sleep(0.3)
+            fetched_while_blocked.append(notion.yielded)
+        return [Subtask(title, override)]
+
+    monkeypatch.setattr(scheduler, "abreakdown", breakdown)
+    notion = _CountingNotion(pages, calls)
+    result = asyncio.run(scheduler.run_once(cfg=cfg, notion=notion, service=calendar))
+    # the window's pages, plus the one fetch is holding while it waits for a slot
+    assert fetched_while_blocked == [scheduler.PIPELINE_WINDOW + 1]
+    assert result["events_created"] == 12
+    starts = [_events_for(calendar, p["id"])[0]["start"]["dateTime"] for p in pages]
+    assert starts == sorted(starts)  # still placed earliest-due-first
@@ -0,0 +1,33 @@
+import sqlite3
+
+from sqlalchemy import create_engine, inspect
+
+from app.services import storage
+
+# items/events exactly as the original release created them
+PRE_LEDGER_SCHEMA = """
+CREATE TABLE items (page_id VARCHAR NOT NULL, title VARCHAR, due VARCHAR, planned BOOLEAN,
+                    updated_at DATETIME, PRIMARY KEY (page_id));
+CREATE TABLE events (event_id VARCHAR NOT NULL, page_id VARCHAR, start DATETIME, "end" DATETIME,
+                     PRIMARY KEY (event_id));
+CREATE INDEX ix_events_page_id ON events (page_id);
+INSERT INTO items VALUES ('page-1', 'Old task', '2025-01-10', 1, '2025-01-01 00:00:00');
+INSERT INTO events VALUES ('evt-1', 'page-1', '2025-01-09 09:00:00', '2025-01-09 10:00:00');
+"""
+
+def test_upgrading_an_old_database_adds_the_ledger_columns_and_indexes(tmp_path):
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as db:
+        db.executescript(PRE_LEDGER_SCHEMA)
+    url = f"sqlite:///{path}"
+
+    storage.make_session(url).close()
+
+    insp = inspect(create_engine(url))
+    events = {ix["name"]: ix["column_names"] for ix in insp.get_indexes("events")}
+    items = {ix["name"]: ix["column_names"] for ix in insp.get_indexes("items")}
+    assert events["ix_events_calendar_start"] == ["calendar_id", "start"]
+    assert items["ix_items_synced"] == ["synced"]
+    assert {"seq", "calendar_id", "pending", "deleted_at"} <= {c["name"] for c in insp.get_columns("events")}
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT event_id, page_id, calendar_id FROM events").fetchall() == [("evt-1", "page-1", None)]
@@ -0,0 +1,102 @@
+import asyncio, dataclasses, uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine, text
+
+from app import scheduler
+from app.config import config_for_tenant
+from app.services import gcal
+from app.services.leases import SqlLeaseStore
+from app.services.storage import DATABASE_URL, get_tenant, upsert_tenant
+from app.tenants import TenantPool, TENANT_PREFIX, TENANT_CYCLES
+from tests.conftest import make_page, fake_notion
+
+def _pool(cfg, replica):
+    return TenantPool(dataclasses.replace(cfg, replica_id=replica, lease_ttl_sec=60), SqlLeaseStore())
+
+def _tenants(n):
+    tag = uuid.uuid4().hex[:6]
+    return [f"t{tag}-{i}" for i in range(n)]
+
+def test_busy_tenant_is_not_handed_back(cfg):
+    a, b = _pool(cfg, f"a-{uuid.uuid4().hex[:6]}"), _pool(cfg, f"b-{uuid.uuid4().hex[:6]}")
+    tenants = _tenants(2)
+    assert a.rebalance(tenants) == set(tenants)
+    b.rebalance(tenants)  # a second replica shows up: a's fair share drops to one
+    running = max(tenants)  # the one a would normally hand back
+    assert a.rebalance(tenants, busy=frozenset(tenants)) == set(tenants)
+    assert a.rebalance(tenants, busy=frozenset({running})) == {running}
+    assert a.store.live(TENANT_PREFIX)[TENANT_PREFIX + running] == a.owner
+    a.release_all()
+    b.release_all()
+
+def test_lost_lease_cancels_the_running_cycle(cfg):
+    pool = _pool(cfg, f"r-{uuid.uuid4().hex[:6]}")
+    [tid] = _tenants(1)
+    pool.rebalance([tid])
+
+    async def scenario():
+        cycle = asyncio.create_task(asyncio.sleep(30))
+        pool._running[tid] = cycle
+        pool.store.release(TENANT_PREFIX + tid, pool.owner)  # e.g. expired while we were stalled
+        await pool.beat()
+        return cycle
+
+    cycle = asyncio.run(scenario())
+    assert cycle.cancelled() and tid not in pool.owned
+
+def test_commit_stops_when_the_guard_says_the_lease_is_gone(cfg, calls, calendar):
+    due = (datetime.now(timezone.utc) + timedelta(days=3)).date()
+    page = make_page("guarded", f"{due.isoformat()}T23:00:00+00:00")
+
+    async def guard():
+        return False
+
+    with pytest.raises(scheduler.CycleAborted):
+        asyncio.run(scheduler.run_once(cfg=cfg, notion=fake_notion([page], calls), service=calendar, guard=guard))
+    assert calendar.store == {}
+
+def test_tenant_without_a_usable_google_token_is_disabled_not_prompted(cfg, monkeypatch):
+    def no_browser(*args, **kwargs):
+        raise AssertionError("tried to start the interactive OAuth flow")
+
+    monkeypatch.setattr("google_auth_oauthlib.flow.InstalledAppFlow.run_local_server", no_browser)
+    [tid] = _tenants(1)
+    upsert_tenant(tid, enabled=True, notion_token="secret_x", notion_db_id="db", gcal_id=f"{tid}@example.com",
+                  oauth_client_json={"installed": {"client_id": "c", "client_secret": "s",
+                                                   "auth_uri": "https://a", "token_uri": "https://t"}})
+    pool = _pool(cfg, f"r-{uuid.uuid4().hex[:6]}")
+    before = TENANT_CYCLES._values.get((("outcome", "bad_credentials"),), 0)
+
+    async def scenario():
+        assert (await pool.tick())[tid] == "started"
+        await pool._running[tid]
+
+    asyncio.run(scenario())
+    assert TENANT_CYCLES._values[(("outcome", "bad_credentials"),)] == before + 1
+    assert get_tenant(tid).enabled is False
+    with pytest.raises(gcal.CredentialsUnusable):
+        gcal._load_creds(None, None, None, {"client_id": "c", "client_secret": "s", "refresh_token": None,
+                                            "token": None})
+    pool.release_all()
+
+def test_tenant_credentials_are_encrypted_at_rest(cfg, monkeypatch):
+    monkeypatch.setenv("TENANT_SECRET_KEY", Fernet.generate_key().decode())
+    [tid] = _tenants(1)
+    token = {"client_id": "c", "client_secret": "s", "refresh_token": "refresh-me"}
+    upsert_tenant(tid, enabled=True, notion_token="secret_notion", notion_db_id="db", gcal_id=f"{tid}@example.com",
+                  token_json=token)
+
+    with create_engine(DATABASE_URL).connect() as conn:
+        raw = conn.execute(text("SELECT notion_token, token_json FROM tenants WHERE id = :id"), {"id": tid}).one()
+    assert all(v.startswith("fernet:") for v in raw)
+    assert "secret_notion" not in raw[0] and "refresh-me" not in raw[1]
+    tenant_cfg = config_for_tenant(get_tenant(tid), cfg)
+    assert tenant_cfg.notion_token == "secret_notion" and tenant_cfg.token_json == token
+
+    monkeypatch.setenv("TENANT_SECRET_KEY", Fernet.generate_key().decode())  # wrong key: skipped, not crashed
+    pool = _pool(cfg, f"r-{uuid.uuid4().hex[:6]}")
+    assert asyncio.run(pool.tick())[tid] == "error"
+    pool.release_all()